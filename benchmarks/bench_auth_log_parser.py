@@ -0,0 +1,169 @@
+"""Throughput benchmark of the auth.log parsing of get_authentication_failures.
+
+Compares the per-line re.match/re.search/strptime parsing that the decision tree
+used before with the single-pass tokenizer of examples/decisionTree.py, on
+synthetic auth.log lines mixing all the message classes. Both must detect
+exactly the same anomalies. --users and --ips add allow-listed users and IPs
+to the rules, to measure the cost of large rule sets.
+
+Usage:
+    python benchmarks/bench_auth_log_parser.py --lines 1000000 --repeat 3
+    python benchmarks/bench_auth_log_parser.py --lines 100000 --users 5000 --ips 5000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(".")
+sys.path.append("examples")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_param_serialization import best_time
+from decisionTree import get_authentication_failures, score_severity, tokenize_auth_log
+from rule_engine import compile_rules
+
+USERS = ["root", "admin", "user1", "malik", "ubuntu", "git"]
+RULES = {
+    "users": [
+        {"user": "malik", "time_ranges": [{"start_hour": 9, "end_hour": 17}]},
+        {"user": "user1", "time_ranges": [{"start_hour": 0, "end_hour": 24}]},
+    ],
+    "ips": ["127.0.0.1", "10.8.1.14", "10.11.250.251"],
+}
+TEMPLATES = [
+    "sshd[{pid}]: Failed password for {user} from {ip} port {port} ssh2",
+    "sshd[{pid}]: Failed password for invalid user {user} from {ip} port {port} ssh2",
+    "sshd[{pid}]: Accepted password for {user} from {ip} port {port} ssh2",
+    "sshd[{pid}]: Invalid user {user} from {ip} port {port}",
+    "sshd[{pid}]: pam_unix(sshd:auth): authentication failure; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip}  user={user}",
+    "sshd[{pid}]: PAM 2 more authentication failures; logname= uid=0 euid=0 tty=ssh ruser= rhost={ip}  user={user}",
+    "sshd[{pid}]: error: maximum authentication attempts exceeded for {user} from {ip} port {port} ssh2 [preauth]",
+    "sudo:    {user} : TTY=pts/0 ; PWD=/home/{user} ; USER=root ; COMMAND=/usr/bin/apt update",
+    "sudo:    {user} : user NOT in sudoers ; TTY=pts/1 ; PWD=/home/{user} ; USER=root ; COMMAND=/bin/bash",
+    "systemd-logind[{pid}]: Session 42 logged out. Waiting for processes to exit.",
+    "CRON[{pid}]: pam_unix(cron:session): session opened for user {user} by (uid=0)",
+]
+
+def synthetic_auth_log(lines: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    ips = ["127.0.0.1", "10.8.1.14"] + [f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(50)]
+    log = []
+    for _ in range(lines):
+        message = rng.choice(TEMPLATES).format(
+            pid=rng.randint(1000, 99999), user=rng.choice(USERS), ip=rng.choice(ips), port=rng.randint(1024, 65535)
+        )
+        log.append(f"Feb {rng.randint(1, 28)} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} rover {message}\n")
+    return log
+
+def scaled_rules(users: int, ips: int) -> dict:
+    """
+    RULES with extra users and IPs that do not appear in the synthetic log
+    """
+    return {
+        "users": [{"user": f"fleet{i}", "time_ranges": [{"start_hour": 6, "end_hour": 22}]} for i in range(users)]
+                 + RULES["users"],
+        "ips": [f"172.{16 + i // 65536 % 16}.{i // 256 % 256}.{i % 256}" for i in range(ips)] + RULES["ips"],
+    }
+
+def legacy_get_authentication_failures(log_content, rules):
+    """get_authentication_failures before the tokenizer: per-line re.match/re.search and strptime"""
+    timestamps, messages, users, ip_addresses = [], [], [], []
+    for line in log_content:
+        match = re.match(r"(\w+ \d+ \d+:\d+:\d+)", line)
+        if match:
+            timestamps.append(match.group(1))
+            messages.append(line.strip())
+            user_match = re.search(r"user (\w+)|for (\w+) from", line)
+            user = user_match.group(1) if user_match and user_match.group(1) else \
+                   user_match.group(2) if user_match and user_match.group(2) else "UNKNOWN"
+            users.append(user)
+            ip_match = re.search(r"rhost=(\d+\.\d+\.\d+\.\d+)|from (\d+\.\d+\.\d+\.\d+)", line)
+            ip = ip_match.group(1) if ip_match and ip_match.group(1) else \
+                 ip_match.group(2) if ip_match and ip_match.group(2) else "UNKNOWN"
+            ip_addresses.append(ip)
+    current_year = datetime.datetime.now().year
+    hours = [datetime.datetime.strptime(f"{current_year} {ts}", "%Y %b %d %H:%M:%S").hour for ts in timestamps]
+    anomalies = []
+    for i, timestamp in enumerate(timestamps):
+        severity, reason = legacy_severity(hours[i], users[i], ip_addresses[i], messages[i], rules)
+        if severity > 0:
+            anomalies.append({
+                "log_entry": messages[i],
+                "user": users[i] if users[i] != "UNKNOWN" else None,
+                "ip_address": ip_addresses[i] if ip_addresses[i] != "UNKNOWN" else None,
+                "timestamp": timestamp,
+                "severity": severity,
+                "reason": reason or "no specific reason",
+            })
+    return anomalies
+
+def legacy_severity(hour, user, ip_address, message, rules):
+    if re.search(r"logged out", message, re.IGNORECASE):
+        return 0, None
+    if re.search(r"sudo: ", message, re.IGNORECASE) and not re.search(r"user NOT in sudoers", message, re.IGNORECASE):
+        return 0, "Perhaps a privilege escalation attempts"
+    if re.search(r"Invalid user|multiple authentication failures|user NOT in sudoers", message, re.IGNORECASE):
+        if re.search(r"Invalid user", message, re.IGNORECASE):
+            return 3, "Failed authentication attempts (Invalid user)"
+        elif re.search(r"multiple authentication failures", message, re.IGNORECASE):
+            return 3, "Failed authentication attempts (repeated failures)"
+        return 3, "Privilege escalation attempts"
+    if re.search(r"pam_unix\(sshd:auth\): authentication failure|Failed password for", message, re.IGNORECASE):
+        if not any(u.get('user') == user for u in rules.get('users', [])):
+            return 3, "Failed authentication attempts (Invalid user)"
+        if re.search(r"Failed password for", message, re.IGNORECASE):
+            return 3, "Failed authentication attempts (repeated failures)"
+    for user_rule in rules.get('users', []):
+        if user == user_rule.get('user'):
+            for time_range in user_rule.get('time_ranges', []):
+                if hour < time_range.get('start_hour', 0) or hour > time_range.get('end_hour', 24):
+                    return 2, "Unusual access patterns or times"
+    if ip_address not in rules.get('ips', []):
+        return 1, "Network anomalies - unusua IP"
+    return 0, None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--users", type=int, default=0, help="Extra users in the rules")
+    parser.add_argument("--ips", type=int, default=0, help="Extra IPs in the rules")
+    args = parser.parse_args()
+
+    log = synthetic_auth_log(args.lines)
+    rules = scaled_rules(args.users, args.ips)
+    compiled_rules = compile_rules(rules)
+    legacy_s, legacy = best_time(lambda: legacy_get_authentication_failures(log, rules), args.repeat)
+    current_s, current = best_time(lambda: get_authentication_failures(log, compiled_rules), args.repeat)
+    tokenizer_s, _ = best_time(lambda: tokenize_auth_log(log), args.repeat)
+    compile_s, _ = best_time(lambda: compile_rules(rules), args.repeat)
+    columns = tokenize_auth_log(log)
+    scoring_s, _ = best_time(lambda: score_severity(columns, compiled_rules), args.repeat)
+    assert current["anomalies"] == legacy, "The tokenizer changed the detected anomalies"
+    assert get_authentication_failures(log, rules)["anomalies"] == legacy, "The compiled rules changed the detected anomalies"
+
+    results = {
+        "lines": args.lines,
+        "rule_users": len(rules["users"]),
+        "rule_ips": len(rules["ips"]),
+        "anomalies": len(legacy),
+        "legacy_s": round(legacy_s, 3),
+        "legacy_lines_per_s": round(args.lines / legacy_s),
+        "get_authentication_failures_s": round(current_s, 3),
+        "get_authentication_failures_lines_per_s": round(args.lines / current_s),
+        "tokenizer_s": round(tokenizer_s, 3),
+        "tokenizer_lines_per_s": round(args.lines / tokenizer_s),
+        "compile_rules_s": round(compile_s, 4),
+        "scoring_s": round(scoring_s, 4),
+        "scoring_lines_per_s": round(args.lines / scoring_s),
+        "speedup": round(legacy_s / current_s, 2),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""End-to-end benchmark of the Device Runtime against the local stand-in frontends.
+
+Drives DeviceRuntime.call() against cognit/test/stand_in_server.py and measures
+cold start to first result, steady-state calls per second, latency percentiles
+by payload size, calls per second of concurrent callers, recovery time after the
+token is revoked and after the requirements change, and memory per in-flight
+call (Python allocations traced while the calls are held by the server, which
+runs in the same process, so they are an upper bound of the client side). The
+in-flight calls are only counted as far as they overlapped: an overlap of 1 means
+the runtime ran them one after the other. The results are written as
+JSON, with the commit they were measured on, so runs can be compared:
+
+Usage:
+    python benchmarks/bench_device_runtime.py --output before.json
+    python benchmarks/bench_device_runtime.py --output after.json --baseline before.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict
+
+sys.path.append(".")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_param_serialization import synthetic_auth_lines
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._edge_cluster_frontend_client import ExecReturnCode
+from cognit.modules._logger import CognitLogger
+from cognit.test.stand_in_server import NetworkProfile, StandInServer
+
+REQS = {"FLAVOUR": "Energy"}
+NEW_REQS = {"FLAVOUR": "Energy", "MIN_ENERGY_RENEWABLE_USAGE": 90}
+# Metrics where a higher value is better, for the comparison with a baseline
+HIGHER_IS_BETTER = ("calls_per_s", "overlap")
+
+def echo(value):
+    return value
+
+def count_lines(lines):
+    return len(lines)
+
+def hold(lines, seconds):
+    import time
+    time.sleep(seconds)
+    return len(lines)
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def latency_summary(samples: list) -> dict:
+    return {
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+    }
+
+def checked_call(runtime: DeviceRuntime, function, *params, **kwargs):
+    ret_code, result = runtime.call(function, *params, **kwargs)
+    if ret_code != ExecReturnCode.SUCCESS:
+        raise RuntimeError(f"Offload failed with {ret_code}: {result}")
+    return result
+
+def call_until_success(runtime: DeviceRuntime, function, *params, timeout: float = 30.0, **kwargs) -> int:
+    """
+    Retries a call until it succeeds, returns the number of attempts
+    """
+    start = time.perf_counter()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            ret_code, _ = runtime.call(function, *params, **kwargs)
+            if ret_code == ExecReturnCode.SUCCESS:
+                return attempts
+        except Exception:
+            pass
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError(f"No successful call after {timeout}s")
+
+def bench_cold_start(config_path: str) -> dict:
+    start = time.perf_counter()
+    runtime = DeviceRuntime(config_path)
+    runtime.init(REQS)
+    init_s = time.perf_counter() - start
+    checked_call(runtime, echo, 1)
+    return {
+        "init_s": round(init_s, 4),
+        "first_result_s": round(time.perf_counter() - start, 4),
+    }
+
+def bench_steady_state(runtime: DeviceRuntime, calls: int) -> dict:
+    checked_call(runtime, echo, 0)
+    samples = []
+    start = time.perf_counter()
+    for i in range(calls):
+        call_start = time.perf_counter()
+        checked_call(runtime, echo, i)
+        samples.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    return {"calls": calls, "calls_per_s": round(calls / elapsed, 2), **latency_summary(samples)}
+
+def bench_concurrent_calls(runtime: DeviceRuntime, concurrency: int, calls: int) -> dict:
+    checked_call(runtime, echo, 0)
+    errors = []
+
+    def worker():
+        try:
+            for i in range(calls):
+                checked_call(runtime, echo, i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return {"concurrency": concurrency, "calls": calls * concurrency, "calls_per_s": round(calls * concurrency / elapsed, 2)}
+
+def bench_payloads(runtime: DeviceRuntime, sizes_kb: list, calls: int) -> list:
+    results = []
+    for size_kb in sizes_kb:
+        lines = synthetic_auth_lines(int(size_kb * 1024))
+        checked_call(runtime, count_lines, lines)
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            checked_call(runtime, count_lines, lines)
+            samples.append(time.perf_counter() - start)
+        results.append({"size_kb": size_kb, "calls": calls, **latency_summary(samples)})
+    return results
+
+def bench_reauth_recovery(runtime: DeviceRuntime, server: StandInServer) -> dict:
+    checked_call(runtime, echo, 0)
+    server.revoke_tokens()
+    start = time.perf_counter()
+    attempts = call_until_success(runtime, echo, 1)
+    return {"recovery_s": round(time.perf_counter() - start, 4), "attempts": attempts}
+
+def bench_requirements_recovery(runtime: DeviceRuntime) -> dict:
+    checked_call(runtime, echo, 0)
+    start = time.perf_counter()
+    attempts = call_until_success(runtime, echo, 1, new_reqs=NEW_REQS)
+    recovery_s = time.perf_counter() - start
+    # Back to the initial requirements for the following benchmarks
+    call_until_success(runtime, echo, 2, new_reqs=REQS)
+    return {"recovery_s": round(recovery_s, 4), "attempts": attempts}
+
+def bench_inflight_memory(runtime: DeviceRuntime, concurrency: int, size_kb: float, hold_s: float) -> dict:
+    lines = synthetic_auth_lines(int(size_kb * 1024))
+    checked_call(runtime, hold, lines, 0)
+    errors = []
+
+    def worker():
+        try:
+            checked_call(runtime, hold, lines, hold_s)
+        except Exception as e:
+            errors.append(e)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if errors:
+        raise errors[0]
+    # Calls held at the same time: concurrency if they all overlapped, 1 if they ran in turn
+    overlap = min(concurrency, max(1.0, hold_s * concurrency / wall_s))
+    return {
+        "concurrency": concurrency,
+        "size_kb": size_kb,
+        "wall_s": round(wall_s, 4),
+        "overlap": round(overlap, 2),
+        "bytes_per_call": int((peak - baseline) / overlap),
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def flatten(results, prefix: str = "") -> dict:
+    """
+    Numeric metrics of a result tree by path, list items keyed by their size
+    """
+    metrics = {}
+    if isinstance(results, dict):
+        for key, value in results.items():
+            metrics.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, list):
+        for i, value in enumerate(results):
+            key = value.get("size_kb", i) if isinstance(value, dict) else i
+            metrics.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(results, (int, float)) and not isinstance(results, bool):
+        metrics[prefix[:-1]] = results
+    return metrics
+
+def compare(baseline: dict, results: dict) -> dict:
+    """
+    Relative change of every metric, positive when the metric got worse
+    """
+    old = flatten(baseline["results"])
+    changes = {}
+    for name, value in flatten(results["results"]).items():
+        if name not in old or not old[name] or name.endswith((".calls", ".attempts", ".concurrency", ".size_kb")):
+            continue
+        change = (value - old[name]) / old[name]
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        changes[name] = round(change, 4)
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--sizes-kb", type=float, nargs="+", default=[1, 64, 1024])
+    parser.add_argument("--payload-calls", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--concurrent-calls", type=int, default=25, help="Calls of each concurrent caller")
+    parser.add_argument("--hold", type=float, default=0.2, help="Seconds each in-flight call is held by the server")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=None, help="Bytes per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file to write, stdout if not given")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    args = parser.parse_args()
+
+    CognitLogger().set_level(logging.CRITICAL)
+    profile = NetworkProfile(latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth, seed=args.seed)
+    with StandInServer(profile=profile, workers=max(4, args.concurrency)) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        config_path = server.write_config(os.path.join(tmp, "cognit.yml"))
+        cold_start = bench_cold_start(config_path)
+        runtime = DeviceRuntime(config_path)
+        runtime.init(REQS)
+        results = {
+            "cold_start": cold_start,
+            "steady_state": bench_steady_state(runtime, args.calls),
+            "payloads": bench_payloads(runtime, args.sizes_kb, args.payload_calls),
+            "concurrent": bench_concurrent_calls(runtime, args.concurrency, args.concurrent_calls),
+            "reauth": bench_reauth_recovery(runtime, server),
+            "requirements_change": bench_requirements_recovery(runtime),
+            "inflight_memory": bench_inflight_memory(runtime, args.concurrency, args.sizes_kb[0], args.hold),
+        }
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "profile": asdict(profile),
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_commit"] = baseline.get("commit")
+        report["regressions"] = compare(baseline, report)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Micro-benchmark of the Edge Cluster Frontend Client per-call overhead.
+
+The network is replaced by a canned response, so the figures only contain the
+client side work: request building, parameter serialization and response decoding.
+
+Usage:
+    python benchmarks/bench_ecf_client.py --calls 20000
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+
+sys.path.append(".")
+
+import pydantic
+import requests as req
+
+from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecutionMode
+from cognit.modules import _edge_cluster_frontend_client as ecf_module
+from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClient, decode_exec_response
+from cognit.modules._faas_parser import FaasParser
+from cognit.modules._logger import CognitLogger
+
+RESPONSE_BODY = json.dumps({"ret_code": 0, "res": FaasParser().serialize({"message": "ok"}), "err": None}).encode()
+
+class CannedResponse:
+    status_code = 200
+    content = RESPONSE_BODY
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+def canned_post(*args, **kwargs):
+    return CannedResponse()
+
+def per_call_us(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    CognitLogger().set_level(logging.INFO)
+    ecf_module.req.post = canned_post
+
+    client = EdgeClusterFrontendClient("token", "http://localhost:1339")
+    params = (["Feb 20 10:15:32 server sshd[12345]: Accepted password for user1"], {"ips": []})
+    data = json.loads(RESPONSE_BODY)
+
+    results = {
+        "execute_function_us": per_call_us(
+            lambda: client.execute_function(4079, 4123, ExecutionMode.SYNC, params), args.calls),
+        "decode_parse_obj_as_us": per_call_us(
+            lambda: pydantic.parse_obj_as(ExecResponse, data), args.calls),
+        "decode_fast_path_us": per_call_us(
+            lambda: decode_exec_response(data), args.calls),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark of the nearest-label search of classify_log_line.
+
+Compares the pure-Python cosine loop over the database rows that the embedding
+function used before with the float32 unit-norm matrix of
+examples/log_embedding_function.py, searched with one matrix-vector product.
+The embeddings are random unit vectors of the dimension of the MiniLM model.
+The legacy loop is only timed up to --legacy-max-rows rows, and the matrix is
+only built from JSON-like items up to --build-max-rows rows (a million rows
+of Python float lists take over 10 GB).
+
+Usage:
+    python benchmarks/bench_embedding_search.py --rows 10000 100000 1000000
+"""
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(".")
+sys.path.append("examples")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_param_serialization import best_time
+from log_embedding_function import build_embedding_matrix, nearest_rows
+
+DIM = 384
+
+def random_embeddings(rows: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((rows, DIM), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings
+
+def as_items(embeddings: np.ndarray) -> list:
+    """Database items as loaded from the .emb file"""
+    labels = ("normal", "anomalous")
+    return [{"label": labels[i % 2], "embedding": embedding} for i, embedding in enumerate(embeddings.round(6).tolist())]
+
+def legacy_cosine(a, b):
+    if not a or not b or len(a) != len(b):
+        return -1.0
+    dot = 0.0
+    na = 0.0
+    nb = 0.0
+    for x, y in zip(a, b):
+        dot += x * y
+        na += x * x
+        nb += y * y
+    denom = math.sqrt(na) * math.sqrt(nb) or 1.0
+    return dot / denom
+
+def legacy_search(items: list, query: list):
+    best_label = "unknown"
+    best_similarity = -2.0
+    best_row = -1
+    for row, item in enumerate(items):
+        similarity = legacy_cosine(query, item.get("embedding", []))
+        if similarity > best_similarity:
+            best_label = item.get("label", "unknown")
+            best_similarity = similarity
+            best_row = row
+    return best_label, best_similarity, best_row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--legacy-max-rows", type=int, default=10000)
+    parser.add_argument("--build-max-rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    queries = random_embeddings(args.queries, seed=1)
+    results = []
+    for rows in args.rows:
+        embeddings = random_embeddings(rows)
+        items = as_items(embeddings) if rows <= max(args.build_max_rows, args.legacy_max_rows) else None
+        if items is not None:
+            build_s, (matrix, _) = best_time(lambda: build_embedding_matrix(items), 1)
+        else:
+            build_s, matrix = None, embeddings
+        search_s, found = best_time(lambda: [nearest_rows(matrix, query) for query in queries], args.repeat)
+        top_k_s, _ = best_time(lambda: [nearest_rows(matrix, query, args.top_k) for query in queries], args.repeat)
+        result = {
+            "rows": rows,
+            "matrix_mb": round(matrix.nbytes / 2 ** 20, 1),
+            "build_s": round(build_s, 3) if build_s is not None else None,
+            "search_ms": round(search_s / args.queries * 1000, 3),
+            f"top_{args.top_k}_ms": round(top_k_s / args.queries * 1000, 3),
+        }
+        if rows <= args.legacy_max_rows:
+            legacy_queries = queries.tolist()
+            legacy_s, legacy = best_time(lambda: [legacy_search(items, query) for query in legacy_queries], 1)
+            assert [row for _, _, row in legacy] == [int(rows_found[0]) for rows_found, _ in found], \
+                "The matrix search found other rows"
+            result["legacy_search_ms"] = round(legacy_s / args.queries * 1000, 3)
+            result["speedup"] = round(legacy_s / search_s, 1)
+        results.append(result)
+        del items, matrix, embeddings
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
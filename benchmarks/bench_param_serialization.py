@@ -0,0 +1,75 @@
+"""Benchmark of the parameter serialization of offloaded functions on log batches.
+
+Compares the plain cloudpickle + base64 encoding with FaasParser.serialize_params
+(chunked zlib compression on the shared worker pool) for multi-MB auth.log batches.
+
+Usage:
+    python benchmarks/bench_param_serialization.py --sizes-mb 2 8 32 --repeat 5
+"""
+import argparse
+import base64 as b64
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(".")
+
+import cloudpickle as cp
+
+from cognit.modules._faas_parser import FaasParser
+
+USERS = ["root", "admin", "user1", "malik", "ubuntu"]
+
+def synthetic_auth_lines(size_bytes: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size_bytes:
+        line = (
+            f"Feb {rng.randint(1, 28):2d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} "
+            f"rover sshd[{rng.randint(1000, 99999)}]: Failed password for {rng.choice(USERS)} "
+            f"from 10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)} port {rng.randint(1024, 65535)} ssh2\n"
+        )
+        lines.append(line)
+        total += len(line)
+    return lines
+
+def legacy_serialize(params: tuple) -> list:
+    return [b64.b64encode(cp.dumps(param)).decode("utf-8") for param in params]
+
+def best_time(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    faas_parser = FaasParser(compress=True)
+    rules = {"users": [{"user": "user1", "time_ranges": [{"start_hour": 0, "end_hour": 24}]}], "ips": ["127.0.0.1"]}
+    results = {"cpu_count": os.cpu_count(), "batches": []}
+    for size_mb in args.sizes_mb:
+        params = (synthetic_auth_lines(int(size_mb * (1 << 20))), rules)
+        legacy_s, legacy_out = best_time(lambda: legacy_serialize(params), args.repeat)
+        pooled_s, pooled_out = best_time(lambda: faas_parser.serialize_params(params), args.repeat)
+        results["batches"].append({
+            "size_mb": size_mb,
+            "lines": len(params[0]),
+            "legacy_ms": round(legacy_s * 1000, 2),
+            "legacy_wire_bytes": sum(len(p) for p in legacy_out),
+            "serialize_params_ms": round(pooled_s * 1000, 2),
+            "serialize_params_wire_bytes": sum(len(p) for p in pooled_out),
+        })
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
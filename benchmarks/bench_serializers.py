@@ -0,0 +1,74 @@
+"""Benchmark matrix of the serializer registry codecs on typical UC4 payloads.
+
+Reports the encode/decode time and the encoded size of each codec able to handle
+each payload (auth.log batches, detection rules, embedding matrices and parsed
+log frames), and the codec selected by the default registry.
+
+Usage:
+    python benchmarks/bench_serializers.py --lines 100000 --repeat 5
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(".")
+
+from bench_param_serialization import best_time, synthetic_auth_lines
+
+from cognit.modules._serializers import ARROW, CLOUDPICKLE, JSON, MSGPACK, PICKLE5, default_registry
+
+def synthetic_rules(users: int) -> dict:
+    return {
+        "users": [{"user": f"user{i}", "time_ranges": [{"start_hour": 9, "end_hour": 17}]} for i in range(users)],
+        "ips": [f"10.{i // 255}.{i % 255}.1" for i in range(users * 2)],
+    }
+
+def payloads(lines: int) -> dict:
+    import numpy as np
+    auth_lines = synthetic_auth_lines(lines * 100)[:lines]
+    values = {
+        "auth_lines": auth_lines,
+        "rules": synthetic_rules(lines // 50),
+        "embeddings": np.random.default_rng(0).random((lines // 100, 384), dtype=np.float32),
+    }
+    try:
+        import pandas as pd
+        values["log_frame"] = pd.DataFrame({
+            "line": auth_lines,
+            "user": [line.split(" for ")[1].split(" ")[0] for line in auth_lines],
+            "hour": [int(line[7:9]) for line in auth_lines],
+        })
+    except ImportError:
+        pass
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registry = default_registry()
+    codecs = [registry.get(codec.name) for codec in (CLOUDPICKLE, PICKLE5, MSGPACK, JSON, ARROW)]
+    results = {"cpu_count": os.cpu_count(), "payloads": []}
+    for name, value in payloads(args.lines).items():
+        row = {"payload": name, "selected": registry.select(value).name, "codecs": {}}
+        for codec in codecs:
+            if codec is None or (codec is ARROW and not codec.accepts(value)):
+                continue
+            try:
+                encode_s, blob = best_time(lambda: registry.encode(value, codec), args.repeat)
+            except (TypeError, ValueError, OverflowError):
+                continue
+            decode_s, _ = best_time(lambda: registry.decode(blob), args.repeat)
+            row["codecs"][codec.name] = {
+                "encode_ms": round(encode_s * 1000, 2),
+                "decode_ms": round(decode_s * 1000, 2),
+                "bytes": len(blob),
+            }
+        results["payloads"].append(row)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,44 @@
+import threading
+import time
 from typing import Callable
 
+import requests as req
+
 from cognit.modules._device_runtime_state_machine import DeviceRuntimeStateMachine
+from cognit.modules._cognit_frontend_client import fc_hash
 from cognit.models._edge_cluster_frontend_client import ExecReturnCode
 from cognit.models._cognit_frontend_client import Scheduling
 from cognit.modules._logger import CognitLogger
-from cognit.modules._faas_parser import FaasParser
+from cognit.modules._deadline import Deadline, DeadlineExceeded
+from cognit.modules._execution_planner import ExecutionPlanner, ExecutionPolicy, ExecutionRoute, function_key
+from cognit.modules._faas_parser import FaasParser, ResultEncoding, result_encoding, get_result_encoding
+from cognit.modules._hedging import Hedger, HedgingBudget, idempotent, is_idempotent
+from cognit.modules._outbox import Outbox, OutboxDrainer, OutboxEntry, OutboxFullError
+from cognit.modules._requirements_coalescer import RequirementsCoalescer
+from cognit.modules._result_cache import ResultCache, pure, is_pure, hash_params
+from cognit.modules._scheduling_cache import SchedulingCache
 
 cognit_logger = CognitLogger()
 
 DEFAULT_CONFIG_PATH = "cognit/config/cognit_v2.yml"
+# State transitions tried by call() before queuing an offload in the outbox
+OUTBOX_MAX_TRANSITIONS = 10
 
 class DeviceRuntime:
     def __init__(
         self,
         config_path=DEFAULT_CONFIG_PATH,
+        min_update_interval: float = 0.0,
+        geolocation_threshold: float = 0.0,
+        latency_threshold: int = 0,
+        execution_policy: ExecutionPolicy = ExecutionPolicy.OFFLOAD,
+        result_cache: ResultCache = None,
+        outbox: Outbox = None,
+        on_queued_result: Callable = None,
+        outbox_concurrency: int = 2,
+        hedger: Hedger = None,
+        param_codecs: bool = False,
+        compress_params: bool = False,
     ) -> None:
         """
         Device Runtime creation based on the configuration file defined in cognit_path
@@ -21,10 +46,59 @@ class DeviceRuntime:
         Args:
             config_path (str): Path of the configuration to be applied to access
             the Cognit Frontend
+            min_update_interval (float): Minimum time in seconds between two requirement
+            updates sent by call(). Intermediate requirements are dropped.
+            geolocation_threshold (float): GEOLOCATION displacement in metres below which
+            a requirement change is ignored
+            latency_threshold (int): MAX_LATENCY delta in miliseconds below which
+            a requirement change is ignored
+            execution_policy (ExecutionPolicy): Whether call() offloads functions (OFFLOAD),
+            runs them on the device (LOCAL) or picks the fastest option for each function
+            based on measured costs, running them locally while the Edge Cluster
+            Frontend is unreachable (ADAPTIVE)
+            result_cache (ResultCache): Cache of the results of the functions marked
+            with @pure. Disabled if None.
+            outbox (Outbox): Durable queue of the offloads that cannot be sent because
+            the runtime is not connected. call() returns ExecReturnCode.QUEUED for them
+            and they are sent once the runtime is READY. Disabled if None.
+            on_queued_result (Callable): Called as on_queued_result(function, entry_id,
+            ret_code, result) when a queued offload has been executed. It runs on a
+            drainer thread (cognit-drainer), not on the thread that called call(),
+            and never concurrently with itself.
+            outbox_concurrency (int): Maximum number of functions whose queued
+            offloads are drained at the same time
+            hedger (Hedger): Duplicates the requests of the functions marked with
+            @idempotent to the second-best Edge Cluster Frontend when they take longer
+            than their observed p95 latency. Disabled if None.
+            param_codecs (bool): Encode large parameters with the codec of their type
+            (Arrow, pickle protocol 5 or msgpack) instead of cloudpickle. The serverless
+            runtime must then provide pyarrow and msgpack.
+            compress_params (bool): Compress the large parameters with zlib, trading
+            CPU time for bandwidth
         """
         self.config_path = config_path
-        self.faas_parser = FaasParser()
+        self.faas_parser = FaasParser(param_codecs=param_codecs, compress=compress_params)
         self.device_runtime_sm = None
+        self.scheduling_cache = SchedulingCache()
+        self.requirements_coalescer = RequirementsCoalescer(
+            min_update_interval,
+            geolocation_threshold,
+            latency_threshold
+        )
+        self.planner = ExecutionPlanner(execution_policy)
+        self.result_cache = result_cache
+        self.outbox = outbox
+        self.on_queued_result = on_queued_result
+        self.hedger = hedger
+        self._callback_lock = threading.Lock()
+        self.outbox_drainer = None
+        if outbox is not None:
+            self.outbox_drainer = OutboxDrainer(
+                outbox,
+                self._send_queued,
+                self._deliver_queued_result,
+                max_concurrency=outbox_concurrency
+            )
 
 
     def init(self, init_reqs: dict):
@@ -38,15 +112,16 @@ class DeviceRuntime:
         if init_reqs == None:
             raise TypeError
         # Convert requirements into a Scheduling Object
-        init_reqs = Scheduling(**init_reqs)
+        init_reqs = self.scheduling_cache.get(init_reqs)
         # State machine initialization
         if self.device_runtime_sm == None:
-            self.device_runtime_sm = DeviceRuntimeStateMachine(self.config_path)
+            self.device_runtime_sm = DeviceRuntimeStateMachine(self.config_path, self.hedger, self.faas_parser)
         # Upload initial requirements
-        self.device_runtime_sm.update_requirements(init_reqs)
+        if self.device_runtime_sm.update_requirements(init_reqs):
+            self.requirements_coalescer.mark_sent(init_reqs)
 
         
-    def call(self, function: Callable, *params, new_reqs: dict = None):
+    def call(self, function: Callable, *params, new_reqs: dict = None, timeout: float = None):
         """
         Initializes state machine, authorizes to the Cognit Frontend and upload the
         requirements to the Cognit Frontend. 
@@ -55,6 +130,12 @@ class DeviceRuntime:
             function (Callable): The target funtion to be offloaded
             new_reqs (dict): new requirements to be considered when offloading functions
             params (List[Any]): Arguments needed to call the function
+            timeout (float): Time in seconds given to the offload. By default it is
+            derived from the MAX_FUNCTION_EXECUTION_TIME and MAX_LATENCY requirements.
+            ExecReturnCode.TIMEOUT is returned once it expires. With an outbox, it starts
+            once the runtime is READY: the authentication and requirement uploads that
+            precede it are bounded by OUTBOX_MAX_TRANSITIONS instead. Without one, the
+            transitions made by the offload are taken from it.
         """
 
         # Check if the SM was initialized
@@ -62,13 +143,171 @@ class DeviceRuntime:
             raise Exception("call() function cannot be executed. DeviceRuntime has not been initialised.")
         # Update requirements if  provided
         if new_reqs is not None:
-            new_reqs = Scheduling(**new_reqs)
+            self.requirements_coalescer.submit(self.scheduling_cache.get(new_reqs))
+        # Only the latest significant requirements are sent once the minimum interval elapses
+        pending_reqs = self.requirements_coalescer.poll()
+        if pending_reqs is not None:
             cognit_logger.debug("Requirements provided. Updating requirements if they changed ...")
-            self.device_runtime_sm.update_requirements(new_reqs)
+            # Kept pending and sent again by the next call if the upload fails
+            if self.device_runtime_sm.update_requirements(pending_reqs):
+                self.requirements_coalescer.mark_sent(pending_reqs)
+        # Pure functions called again with the same inputs are not offloaded
+        cache_key = self._get_cache_key(function, params)
+        if cache_key is not None:
+            res = self.result_cache.get(cache_key)
+            if res is not None:
+                cognit_logger.debug("Result found in the result cache")
+                return ExecReturnCode.SUCCESS, self.faas_parser.deserialize(res, get_result_encoding(function))
+        route = self.planner.plan(function)
+        if route != ExecutionRoute.OFFLOAD:
+            return self._run_locally(function, params, route)
+        if self.outbox is not None:
+            self.drain_outbox(wait=False)
+            if self.outbox.has_pending(function_key(function)):
+                # Keep the order of the calls of each function
+                return self._enqueue(function, params)
         # Offloading provided function 
-        result = self.device_runtime_sm.offload_function(function, *params)
+        start = time.perf_counter()
+        deadline = None
+        try:
+            if self.outbox is not None and not self.device_runtime_sm.ensure_ready(OUTBOX_MAX_TRANSITIONS):
+                return self._enqueue(function, params)
+            # Started once READY, the wait for the transitions of other threads is not
+            # taken from the budget
+            deadline = Deadline.for_offload(self.device_runtime_sm.requirements, timeout)
+            result = self.device_runtime_sm.offload_function(function, *params, deadline=deadline)
+        except (DeadlineExceeded, req.exceptions.ReadTimeout) as e:
+            budget = f" after {deadline.budget:.3f}s" if deadline is not None else ""
+            cognit_logger.error(f"Offloading of {function_key(function)} timed out{budget}: {e}")
+            return ExecReturnCode.TIMEOUT, str(e)
+        except req.exceptions.RequestException as e:
+            if self.planner.can_fallback():
+                cognit_logger.warning(f"Offloading failed ({e}), running the function locally")
+                self.planner.record_unreachable()
+                return self._run_locally(function, params, ExecutionRoute.FALLBACK)
+            if self.outbox is None:
+                raise
+            cognit_logger.warning(f"Offloading failed ({e}), queuing it in the outbox")
+            return self._enqueue(function, params)
         # Return values depending on the execution status
         if result.ret_code == ExecReturnCode.SUCCESS:
-            return result.ret_code, self.faas_parser.deserialize(result.res)
+            value = self.faas_parser.deserialize(result.res, get_result_encoding(function))
+            ecf = self.device_runtime_sm.ecf
+            serialization_time = ecf.get_last_serialization_time() if ecf is not None else None
+            self.planner.record_offload(function, serialization_time, time.perf_counter() - start)
+            if cache_key is not None:
+                self.result_cache.put(cache_key, result.res)
+            return result.ret_code, value
+        else:
+            return result.ret_code, result.err
+
+    def _enqueue(self, function: Callable, params: tuple):
+        """
+        Stores an offload in the outbox
+        """
+        try:
+            # Queued as it is offloaded directly, so both ship the same function
+            entry_id = self.outbox.put(
+                function,
+                function_key(function),
+                self.faas_parser.serialize_params(params),
+                fc=self.faas_parser.serialize(function),
+                fc_hash=fc_hash(function),
+                imports=self.faas_parser.get_imports(function),
+                encoding=get_result_encoding(function).value
+            )
+        except OutboxFullError as e:
+            cognit_logger.error(str(e))
+            return ExecReturnCode.ERROR, str(e)
+        cognit_logger.info(f"Offload of {function_key(function)} queued in the outbox (entry {entry_id})")
+        return ExecReturnCode.QUEUED, entry_id
+
+    def drain_outbox(self, wait: bool = True):
+        """
+        Sends the offloads queued in the outbox if the runtime can reach READY
+
+        Args:
+            wait (bool): Wait until the queued offloads are sent or the sending fails
+        """
+        if self.outbox is None or not self.outbox.has_pending() or not self.outbox_drainer.should_retry():
+            return
+        try:
+            if not self.device_runtime_sm.ensure_ready(OUTBOX_MAX_TRANSITIONS):
+                self.outbox_drainer.last_failure = self.outbox_drainer.clock()
+                return
+        except req.exceptions.RequestException as e:
+            cognit_logger.warning(f"Runtime not connected, the outbox is not drained: {e}")
+            self.outbox_drainer.last_failure = self.outbox_drainer.clock()
+            return
+        if wait:
+            self.outbox_drainer.drain_and_wait()
+        else:
+            self.outbox_drainer.drain()
+
+    def _send_queued(self, entry: OutboxEntry):
+        return self.device_runtime_sm.offload_serialized_function(
+            entry.fc_hash,
+            entry.fc,
+            entry.imports,
+            entry.params,
+            max_transitions=OUTBOX_MAX_TRANSITIONS
+        )
+
+    def _deliver_queued_result(self, entry: OutboxEntry, result):
+        try:
+            function = entry.get_function()
+        except Exception:
+            # Dropped because it cannot be loaded, result holds the error
+            function = None
+        if isinstance(result, Exception):
+            ret_code, value = ExecReturnCode.ERROR, str(result)
+        elif result.ret_code == ExecReturnCode.SUCCESS:
+            ret_code, value = result.ret_code, self.faas_parser.deserialize(result.res, ResultEncoding(entry.encoding))
         else:
-            return result.ret_code, result.err
\ No newline at end of file
+            ret_code, value = result.ret_code, result.err
+        if self.on_queued_result is not None:
+            with self._callback_lock:
+                self.on_queued_result(function, entry.id, ret_code, value)
+
+    def _get_cache_key(self, function: Callable, params: tuple):
+        """
+        Result cache key of a call, None if its result must not be cached
+        """
+        if self.result_cache is None or not is_pure(function):
+            return None
+        params_hash = hash_params(params)
+        if params_hash is None:
+            return None
+        requirements = self.device_runtime_sm.requirements
+        reqs_digest = requirements.digest() if isinstance(requirements, Scheduling) else ""
+        fc_hash = self.result_cache.function_hash(function, self.faas_parser.serialize)
+        return self.result_cache.make_key(fc_hash, params_hash, reqs_digest)
+
+    def _run_locally(self, function: Callable, params: tuple, route: ExecutionRoute):
+        """
+        Runs the function on the device. Errors are returned as for offloaded functions.
+        """
+        start = time.perf_counter()
+        try:
+            value = function(*params)
+        except Exception as e:
+            cognit_logger.error(f"Local execution of {getattr(function, '__name__', function)} failed: {e}")
+            return ExecReturnCode.ERROR, str(e)
+        self.planner.record_local(function, time.perf_counter() - start, route)
+        return ExecReturnCode.SUCCESS, value
+
+    def get_execution_stats(self) -> dict:
+        """
+        Cost estimates and number of calls offloaded, run locally or run locally
+        after a failed offload, by function
+        """
+        return self.planner.stats()
+
+    def get_hedging_stats(self) -> dict:
+        """
+        Number of requests of idempotent functions, of hedged requests and of
+        hedged requests answered first
+        """
+        if self.hedger is None:
+            return {}
+        return self.hedger.stats()
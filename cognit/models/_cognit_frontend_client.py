@@ -1,7 +1,8 @@
+import hashlib
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 
@@ -22,6 +23,36 @@ class Scheduling(BaseModel): # Called 'class AppRequirements' in dann1 code
         default=None,
         description="Scheduling policy that applies to the requirement") 
 
+    # Lazily computed, Scheduling objects must not be modified once created
+    _digest: Optional[str] = PrivateAttr(default=None)
+    _body: Optional[str] = PrivateAttr(default=None)
+
+    def digest(self) -> str:
+        """
+        Stable hash of all the fields. Equal Scheduling objects share the same digest.
+        """
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.json(sort_keys=True).encode("utf-8")).hexdigest()
+        return self._digest
+
+    def body(self) -> str:
+        """
+        JSON body sent to the Cognit Frontend (only the fields explicitly set)
+        """
+        if self._body is None:
+            self._body = self.json(exclude_unset=True)
+        return self._body
+
+    def same_as(self, other: Optional["Scheduling"]) -> bool:
+        """
+        Cheap equality check based on identity and digest
+        """
+        if other is self:
+            return True
+        if not isinstance(other, Scheduling):
+            return False
+        return self.digest() == other.digest()
+
 
 class FunctionLanguage(str, Enum):
     PY = "PY"
@@ -37,6 +68,10 @@ class UploadFunctionDaaS(BaseModel):
     FC_HASH: str = Field(
         description="Function contents hash. Acts as a function ID."
     )
+    FC_IMPORTS: Optional[List[str]] = Field(
+        default=None,
+        description="Modules used by the function, to be kept imported by the runtime"
+    )
     
 class EdgeClusterFrontendResponse(BaseModel):
     ID: int = Field(description='Cluster ID in the Cloud Edge Manager cluster pool')
@@ -22,6 +22,10 @@ class ExecAsyncParams(BaseModel):
 class ExecReturnCode(Enum):
     SUCCESS = 0
     ERROR = -1
+    # Stored in the outbox of the device, sent once the runtime is connected
+    QUEUED = 2
+    # The deadline of the offload expired before the response was received
+    TIMEOUT = 3
 class ExecResponse(BaseModel):
     ret_code: ExecReturnCode = Field(
         default=ExecReturnCode.SUCCESS,
@@ -4,9 +4,11 @@ import requests as req
 from requests.auth import HTTPBasicAuth
 from typing import Callable, Optional, Union, List
 import hashlib
+import threading
 
 from cognit.models._cognit_frontend_client import Scheduling, UploadFunctionDaaS, FunctionLanguage, EdgeClusterFrontendResponse
 from cognit.modules._cognitconfig import CognitConfig
+from cognit.modules._deadline import Deadline, REQ_TIMEOUT, request_timeout
 from cognit.modules._logger import CognitLogger
 from cognit.modules._faas_parser import FaasParser
 from cognit.models._edge_cluster_frontend_client import Execution
@@ -15,15 +17,18 @@ cognit_logger = CognitLogger()
 
 SR_RESOURCE_ENDPOINT = "serverless-runtimes"
 
-REQ_TIMEOUT = 60
-
 def filter_empty_values(data):
     if isinstance(data, dict):
         return {key: filter_empty_values(value) for key,\
                 value in data.items() if value is not None}
     else:
         return data
-    
+
+def fc_hash(func: Callable) -> str:
+    """
+    Hash a function is uploaded with, offloads of the same code reuse its upload
+    """
+    return hashlib.sha256(func.__code__.co_code).hexdigest()
 
 
 class CognitFrontendClient:
@@ -53,7 +58,11 @@ class CognitFrontendClient:
         self.token = None
         self.app_req_id = None
         self.offloaded_funs_hash_map = {} # {ḱey: hash(funcN)], value: cognit_fc_id_INTEGER}
-        self.ec_fe_list = [] # TODO: List containing the endpoints of the Edge Cluster Frontend Engines
+        self._upload_locks = {} # {key: hash(funcN), value: Lock} so concurrent offloads upload once
+        self._upload_locks_lock = threading.Lock()
+        self.parser = FaasParser()
+        self.ec_fe_list = [] # Endpoints of the Edge Cluster Frontend Engines, best first
+        self.placement_changed = True # False if the last update did not alter the ECFE assignment
         self._has_connection = False
 
     def get_has_connection(self):
@@ -97,7 +106,9 @@ class CognitFrontendClient:
         
         uri = f'{self.endpoint}/v1/app_requirements'
         headers = {"token": self.token}
-        response = req.post(uri, headers=headers, data=initial_reqs.json(exclude_unset=True))
+        # A new requirements document always needs a new placement
+        self.placement_changed = True
+        response = req.post(uri, headers=headers, data=initial_reqs.body(), timeout=request_timeout(None, "requirements upload"))
         try:
             self.app_req_id = response.json()
         except:
@@ -127,7 +138,7 @@ class CognitFrontendClient:
         """
         uri = f'{self.endpoint}/v1/app_requirements/{self.app_req_id}/ec_fe'
         headers = {"token": self.token}
-        response = req.get(uri, headers=headers)
+        response = req.get(uri, headers=headers, timeout=request_timeout(None, "address request"))
         self.set_has_connection(response.status_code < 400)
         if response.status_code >= 300:
             cognit_logger.warning(f"App req update returned {response.status_code}")
@@ -142,8 +153,12 @@ class CognitFrontendClient:
             if len(data) <= 0:
                 cognit_logger.error("ECFE list is empty")
                 return None
-            parsed_data = pydantic.parse_obj_as(EdgeClusterFrontendResponse, data[0])
-            return parsed_data.TEMPLATE['EDGE_CLUSTER_FRONTEND'] ## TESTBED integration
+            # Every ECFE of the list is kept, in order of preference, as alternatives to the first one
+            self.ec_fe_list = [
+                pydantic.parse_obj_as(EdgeClusterFrontendResponse, item).TEMPLATE['EDGE_CLUSTER_FRONTEND'] ## TESTBED integration
+                for item in data
+            ]
+            return self.ec_fe_list[0]
             # return "http://0.0.0.0:1339" ## only for testing in local
         except Exception as e:
             cognit_logger.error(f"Error in get_ECFE response handling: {e}")
@@ -162,7 +177,7 @@ class CognitFrontendClient:
         cognit_logger.debug(f"Requesting token for {self.config._cognit_frontend_engine_usr}")
 
         uri = f'{self.endpoint}/v1/authenticate'
-        response = req.post(url=uri, auth=HTTPBasicAuth(self.config._cognit_frontend_engine_usr, self.config.cognit_frontend_engine_cfe_pwd))
+        response = req.post(url=uri, auth=HTTPBasicAuth(self.config._cognit_frontend_engine_usr, self.config.cognit_frontend_engine_cfe_pwd), timeout=request_timeout(None, "authentication"))
         if response.status_code not in [200, 201]:
             cognit_logger.critical(f"Token creation failed with status code: {response.status_code}")
             self._inspect_response(response, "_authenticate.error")
@@ -177,6 +192,8 @@ class CognitFrontendClient:
     def _app_req_update(self, new_reqs:Scheduling) -> bool:
         """
         Update the application requirements using the application ID.
+        If the response body is a dict with PLACEMENT_CHANGED set to False, 
+        the current Edge Cluster Frontend remains valid and placement_changed is cleared.
         Args: 
             new_reqs: The new requirements to update
         Returns:
@@ -193,10 +210,19 @@ class CognitFrontendClient:
         
         uri = f'{self.endpoint}/v1/app_requirements/{self.app_req_id}'
         headers = {"token": self.token}
-        response = req.put(uri, headers=headers, data=new_reqs.json(exclude_unset=True))
+        self.placement_changed = True
+        response = req.put(uri, headers=headers, data=new_reqs.body(), timeout=request_timeout(None, "requirements update"))
         if response.status_code >= 300:
             cognit_logger.warning(f"App req update returned {response.status_code}")
             self._inspect_response(response, "_app_req_update.warning")
+        elif response.status_code == 200:
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            if isinstance(data, dict) and data.get("PLACEMENT_CHANGED") is False:
+                cognit_logger.debug("Requirements updated, placement unchanged")
+                self.placement_changed = False
         
         self.set_has_connection(response.status_code < 400)
         
@@ -213,7 +239,7 @@ class CognitFrontendClient:
         """
         uri = f'{self.endpoint}/v1/app_requirements/{self.app_req_id}'
         headers = {"token": self.token}
-        response = req.get(uri, headers=headers)
+        response = req.get(uri, headers=headers, timeout=request_timeout(None, "requirements read"))
         
         # TODO: Check response.status_code < 300, else return None
         # if response.status_code >= 300:
@@ -245,7 +271,7 @@ class CognitFrontendClient:
         uri = f'{self.endpoint}/v1/app_requirements/{self.app_req_id}'
         headers = {"token": self.token}
 
-        response = req.delete(uri, headers=headers)
+        response = req.delete(uri, headers=headers, timeout=request_timeout(None, "requirements deletion"))
         if response.status_code >= 300:
             cognit_logger.warning(f"App req delete returned {response.status_code} with body: {response.json()}")
         
@@ -253,41 +279,73 @@ class CognitFrontendClient:
         return response.status_code == 204
     
     
-    def _serialize_and_upload_fc_to_daas_gw(self, func: Callable):
-        # TODO:
-        parser = FaasParser()
-        serialized_fc = parser.serialize(func)
-        func_hash = hashlib.sha256(func.__code__.co_code).hexdigest()
+    def _serialize_and_upload_fc_to_daas_gw(self, func: Callable, deadline: Deadline = None):
+        # Only serialize functions that have not been uploaded yet
+        return self._upload_fc_once(
+            fc_hash(func),
+            lambda: (self.parser.serialize(func), self.parser.get_imports(func)),
+            deadline
+        )
+
+    def upload_serialized_fc(self, func_hash: str, serialized_fc: str, imports: List[str] = None, deadline: Deadline = None):
+        """
+        Uploads a function already serialized by FaasParser.serialize, unless it
+        was uploaded before
+
+        Args:
+            func_hash (str): Hash of the function, see fc_hash()
+            serialized_fc (str): The serialized function
+            imports (List[str]): Modules the serverless runtime imports for the function
+            deadline (Deadline): Deadline of the offload
+        """
+        return self._upload_fc_once(func_hash, lambda: (serialized_fc, imports), deadline)
+
+    def _upload_fc_once(self, func_hash: str, serialize: Callable, deadline: Deadline = None):
         if self.is_function_uploaded(func_hash): # TODO
             cognit_logger.debug("Function already in local HASH map")
             return self.app_req_id, self.offloaded_funs_hash_map[func_hash]
-        fc = UploadFunctionDaaS(
-            LANG=FunctionLanguage.PY,
-            FC=serialized_fc,
-            FC_HASH=func_hash
-        )
+        with self._get_upload_lock(func_hash):
+            # Another thread may have uploaded it while waiting
+            if self.is_function_uploaded(func_hash):
+                return self.app_req_id, self.offloaded_funs_hash_map[func_hash]
+            serialized_fc, imports = serialize()
+            fc = UploadFunctionDaaS(
+                LANG=FunctionLanguage.PY,
+                FC=serialized_fc,
+                FC_HASH=func_hash,
+                FC_IMPORTS=imports or None
+            )
 
-        cognit_fc_id = self._upload_fc(fc)
-        if cognit_fc_id:
-            self.offloaded_funs_hash_map[func_hash] = cognit_fc_id
-            return self.app_req_id, cognit_fc_id
+            cognit_fc_id = self._upload_fc(fc, deadline)
+            if cognit_fc_id:
+                self.offloaded_funs_hash_map[func_hash] = cognit_fc_id
+                return self.app_req_id, cognit_fc_id
         return None, None
+
+    def _get_upload_lock(self, func_hash: str) -> threading.Lock:
+        with self._upload_locks_lock:
+            return self._upload_locks.setdefault(func_hash, threading.Lock())
     
     def is_function_uploaded(self, func_hash: str) -> bool:
         return func_hash in self.offloaded_funs_hash_map.keys()
     
     
-    def _upload_fc(self, fc: UploadFunctionDaaS) -> int:
+    def _upload_fc(self, fc: UploadFunctionDaaS, deadline: Deadline = None) -> int:
         """
         Uploads the function to the Daas Gateway
         TODO: Save the returned func_id. One CognitFrontendClient can have 0-N func_ids
+
+        Args:
+            fc (UploadFunctionDaaS): Function to be uploaded
+            deadline (Deadline): Deadline of the offload, the time reserved for the
+            execution of the function is not used by the upload
         """
         cognit_logger.debug(f"Uploading function {fc}")
 
         uri = f'{self.endpoint}/v1/daas/upload'
         headers = {"token": self.token}
 
-        response = req.post(uri, headers=headers, data=fc.json())
+        response = req.post(uri, headers=headers, data=fc.json(exclude_none=True), timeout=request_timeout(deadline, "function upload"))
         if response.status_code != 200:
             self._inspect_response(response)
             return False
@@ -0,0 +1,118 @@
+import time
+from typing import Callable, Optional, Tuple
+
+import requests as req
+
+from cognit.models._cognit_frontend_client import Scheduling
+
+# Default timeout in seconds of the requests sent without an explicit deadline
+REQ_TIMEOUT = 60
+# Maximum time in seconds to establish a connection
+CONNECT_TIMEOUT = 3.05
+# Time in seconds allowed to the requests when MAX_LATENCY is not defined
+MIN_NETWORK_TIME = 1.0
+# Network round trips of an offload (function upload and execution, each with its connection)
+OFFLOAD_ROUND_TRIPS = 4
+# Header carrying the time left, in milliseconds, to the Edge Cluster Frontend
+DEADLINE_HEADER = "X-Cognit-Deadline-Ms"
+
+class DeadlineExceeded(req.exceptions.Timeout):
+    """
+    The deadline of an offload expired before one of its phases started
+    """
+
+
+def deadline_budget(requirements: Optional[Scheduling], timeout: float = None) -> float:
+    """
+    Time in seconds given to an offload
+
+    Args:
+        requirements (Scheduling): Requirements of the device. MAX_FUNCTION_EXECUTION_TIME
+        and MAX_LATENCY are only taken into account if they were explicitly set,
+        REQ_TIMEOUT is the budget otherwise.
+        timeout (float): Explicit budget, overrides the requirements
+    """
+    if timeout is not None:
+        return timeout
+    if not isinstance(requirements, Scheduling) or requirements.MAX_FUNCTION_EXECUTION_TIME is None \
+            or "MAX_FUNCTION_EXECUTION_TIME" not in requirements.__fields_set__:
+        return REQ_TIMEOUT
+    network_time = MIN_NETWORK_TIME
+    if requirements.MAX_LATENCY:
+        network_time = max(network_time, OFFLOAD_ROUND_TRIPS * requirements.MAX_LATENCY / 1000)
+    return requirements.MAX_FUNCTION_EXECUTION_TIME + network_time
+
+def execution_reserve(requirements: Optional[Scheduling]) -> float:
+    """
+    Time in seconds of the budget kept for the execution of the function
+    """
+    if isinstance(requirements, Scheduling) and "MAX_FUNCTION_EXECUTION_TIME" in requirements.__fields_set__:
+        return requirements.MAX_FUNCTION_EXECUTION_TIME or 0.0
+    return 0.0
+
+
+class Deadline:
+    """
+    Point in time by which an offload must be finished. It is split across the
+    phases of the offload as timeouts of their requests.
+    """
+
+    def __init__(self, budget: float, reserve: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            budget (float): Time in seconds given to the offload
+            reserve (float): Time in seconds that the phases before the execution
+            must leave for it
+            clock (Callable): Monotonic clock in seconds
+        """
+        self.budget = budget
+        self.reserve = min(reserve, budget)
+        self.clock = clock
+        self.expires_at = clock() + budget
+
+    @classmethod
+    def for_offload(cls, requirements: Optional[Scheduling], timeout: float = None) -> "Deadline":
+        """
+        Deadline of an offload under the given requirements
+        """
+        return cls(deadline_budget(requirements, timeout), execution_reserve(requirements))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self.clock())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def check(self, phase: str):
+        """
+        Raises DeadlineExceeded if there is no time left for the phase
+        """
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.budget:.3f}s exceeded before {phase}")
+
+    def timeout(self, phase: str, execution: bool = False) -> Tuple[float, float]:
+        """
+        (connect, read) timeouts of a request of the phase
+
+        Args:
+            phase (str): Description of the phase, for the error message
+            execution (bool): The request executes the function. Other
+            phases cannot use the time reserved for the execution.
+        """
+        self.check(phase)
+        available = self.remaining()
+        if not execution and available > self.reserve:
+            available -= self.reserve
+        return min(CONNECT_TIMEOUT, available), available
+
+    def header(self) -> dict:
+        return {DEADLINE_HEADER: str(int(self.remaining() * 1000))}
+
+
+def request_timeout(deadline: Optional[Deadline], phase: str, execution: bool = False) -> Tuple[float, float]:
+    """
+    (connect, read) timeouts of a request, the default ones without a deadline
+    """
+    if deadline is None:
+        return CONNECT_TIMEOUT, REQ_TIMEOUT
+    return deadline.timeout(phase, execution)
@@ -0,0 +1,176 @@
+import builtins
+import dis
+import os
+import sys
+import sysconfig
+import types
+from typing import Callable, Dict, Set, Tuple
+
+from cognit.modules._logger import CognitLogger
+
+cognit_logger = CognitLogger()
+
+GLOBAL_OPNAMES = frozenset(["LOAD_GLOBAL", "LOAD_NAME", "STORE_GLOBAL", "DELETE_GLOBAL"])
+# Function attributes set by the cognit decorators (result_encoding, pure,
+# idempotent). They are only read on the device and would make the shipped
+# function depend on cognit.
+DEVICE_ATTR_PREFIX = "__cognit_"
+
+# Installed code (stdlib and site-packages) is expected to be available remotely
+_INSTALLED_PATHS = tuple(
+    os.path.realpath(path) for path in {
+        sysconfig.get_paths()[key] for key in ("stdlib", "platstdlib", "purelib", "platlib")
+    }
+)
+
+def is_local_module(module_name: str) -> bool:
+    """
+    Checks if a module belongs to the application (not to the stdlib or an installed
+    package). Functions of local modules are shipped by value.
+
+    Args:
+        module_name (str): Name of the module
+    """
+    if module_name == "__main__":
+        return True
+    module = sys.modules.get(module_name)
+    module_file = getattr(module, "__file__", None)
+    if module_file is None:
+        # Builtin or unknown modules
+        return False
+    module_file = os.path.realpath(module_file)
+    if "site-packages" in module_file or "dist-packages" in module_file:
+        return False
+    return not module_file.startswith(_INSTALLED_PATHS)
+
+
+class FunctionDependencies:
+    """
+    Result of the dependency analysis of a function
+    """
+
+    def __init__(self):
+        # Referenced global values, by name
+        self.globals = {}
+        # Names of the modules the function (or its helpers) use
+        self.modules = set()
+        # Local helper functions, by name
+        self.helpers = {}
+
+    @property
+    def imports(self) -> list:
+        return sorted(self.modules)
+
+
+class DependencyAnalyzer:
+    """
+    Finds the globals, modules and helper functions an offloaded function really
+    uses by inspecting its bytecode, and builds copies of the function bound to a
+    globals dict that only contains them. The live module namespace is never modified.
+    """
+
+    def __init__(self):
+        # {code object: (global names, imported module names)}
+        self._code_cache = {}
+
+    def code_references(self, code: types.CodeType) -> Tuple[Set[str], Set[str]]:
+        """
+        Global names and imported modules referenced by a code object, including
+        the nested functions, lambdas and comprehensions defined in it.
+
+        Args:
+            code (CodeType): Code object to be inspected
+        """
+        cached = self._code_cache.get(code)
+        if cached is not None:
+            return cached
+        names = set()
+        imports = set()
+        for instruction in dis.get_instructions(code):
+            if instruction.opname in GLOBAL_OPNAMES:
+                names.add(instruction.argval)
+            elif instruction.opname == "IMPORT_NAME":
+                imports.add(instruction.argval)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                nested_names, nested_imports = self.code_references(const)
+                names |= nested_names
+                imports |= nested_imports
+        self._code_cache[code] = (names, imports)
+        return names, imports
+
+    def analyze(self, fc: Callable) -> FunctionDependencies:
+        """
+        Collects the dependencies of a function and its local helpers
+
+        Args:
+            fc (Callable): Function to be analyzed
+        """
+        dependencies = FunctionDependencies()
+        self._analyze(fc, dependencies, set())
+        return dependencies
+
+    def _analyze(self, fc: types.FunctionType, dependencies: FunctionDependencies, visited: Set[int]):
+        if id(fc) in visited:
+            return
+        visited.add(id(fc))
+        names, imports = self.code_references(fc.__code__)
+        dependencies.modules |= {name for name in imports if name}
+        fc_globals = fc.__globals__
+        for name in names:
+            try:
+                value = fc_globals[name]
+            except KeyError:
+                # Builtins or names that do not exist (yet)
+                continue
+            if name in dependencies.globals and dependencies.globals[name] is not value:
+                cognit_logger.warning(f"Global name {name} is bound to different values in the helpers of {fc.__name__}")
+            dependencies.globals[name] = value
+            if isinstance(value, types.ModuleType):
+                dependencies.modules.add(value.__name__)
+            elif self.is_helper(value):
+                dependencies.helpers[name] = value
+                self._analyze(value, dependencies, visited)
+
+    def is_helper(self, value) -> bool:
+        """
+        Helpers are plain Python functions defined by the application
+        """
+        return isinstance(value, types.FunctionType) and is_local_module(value.__module__)
+
+    def rebind(self, fc: types.FunctionType) -> types.FunctionType:
+        """
+        Returns a copy of fc whose globals only contain what the function uses.
+        Local helpers are copied the same way, so that they are shipped by value.
+
+        Args:
+            fc (FunctionType): Function to be copied
+        """
+        return self._rebind(fc, {})
+
+    def _rebind(self, fc: types.FunctionType, memo: Dict[int, types.FunctionType]) -> types.FunctionType:
+        if id(fc) in memo:
+            return memo[id(fc)]
+        names, _ = self.code_references(fc.__code__)
+        fc_globals = fc.__globals__
+        new_globals = {"__builtins__": fc_globals.get("__builtins__", builtins)}
+        copy = types.FunctionType(fc.__code__, new_globals, fc.__name__, fc.__defaults__, fc.__closure__)
+        copy.__kwdefaults__ = fc.__kwdefaults__
+        copy.__qualname__ = fc.__qualname__
+        copy.__doc__ = fc.__doc__
+        copy.__module__ = fc.__module__
+        # dict.copy() is atomic, other threads may be setting attributes
+        copy.__dict__.update(
+            (name, value) for name, value in fc.__dict__.copy().items() if not name.startswith(DEVICE_ATTR_PREFIX)
+        )
+        # Registered before filling the globals to support recursive helpers
+        memo[id(fc)] = copy
+        for name in names:
+            try:
+                value = fc_globals[name]
+            except KeyError:
+                continue
+            if self.is_helper(value):
+                value = self._rebind(value, memo)
+            new_globals[name] = value
+        return copy
@@ -1,12 +1,19 @@
 import sys
 sys.path.append(".")
 from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClient
+from cognit.modules._faas_parser import FaasParser
 from cognit.modules._cognit_frontend_client import CognitFrontendClient, Scheduling
 from cognit.models._edge_cluster_frontend_client import ExecutionMode
 from cognit.modules._cognitconfig import CognitConfig
+from cognit.modules._deadline import Deadline
+from cognit.modules._execution_planner import function_key
+from cognit.modules._hedging import Hedger, is_idempotent
 from cognit.modules._logger import CognitLogger
 from statemachine import StateMachine, State
+import requests as req
 from typing import Callable
+import threading
+import time
 
 class DeviceRuntimeStateMachine(StateMachine):
 
@@ -55,10 +62,15 @@ class DeviceRuntimeStateMachine(StateMachine):
     # 4.3 If the requirements have changed and token still valid, upload new requirements
     ready_update_requirements = ready.to(send_init_request, cond=["is_cfc_connected", "is_ecf_connected", "have_requirements_changed"])
 
-    def __init__(self, cognit_conf_path):
+    def __init__(self, cognit_conf_path, hedger: Hedger = None, parser: FaasParser = None):
         # Clients
         self.cfc = None
         self.ecf = None
+        # Parser shared by the Edge Cluster Frontend clients, they create their own if None
+        self.parser = parser
+        # Client of the second-best Edge Cluster Frontend, only used to hedge requests
+        self.hedge_ecf = None
+        self.hedger = hedger
         # Communication parameters
         self.token = None
         self.requirements = None
@@ -71,6 +83,9 @@ class DeviceRuntimeStateMachine(StateMachine):
         # Booleans for conditioners
         self.requirements_uploaded = False
         self.requirements_changed = False
+        # Transitions are driven by the thread of DeviceRuntime.call() and by the outbox
+        # drainers. They run one at a time, the offloads themselves run concurrently.
+        self._transition_lock = threading.RLock()
         super().__init__()
 
     # Get credentials by instantiating a CognitFrontendClient and authenticates to the Cognit Frontend  
@@ -81,6 +96,7 @@ class DeviceRuntimeStateMachine(StateMachine):
         self.get_address_counter = 0
         # Instantiate Cognit Frontend Client
         self.cfc = CognitFrontendClient(self.config)
+        self.hedge_ecf = None
         # This function will return if the client successfull authenticates or not
         self.token = self.cfc._authenticate()
         # self.logger.warning(f"\n\n[SMtk] ---- {self.token}\n\n")
@@ -94,8 +110,16 @@ class DeviceRuntimeStateMachine(StateMachine):
         self.logger.debug("SM: CFC Token succesfully set")
         
         # Upload requirements
-        self.logger.debug("Uploading requirements: " + str(self.requirements))
-        self.requirements_uploaded = self.cfc.init(self.requirements)
+        if self.cfc.app_req_id is None:
+            self.logger.debug("Uploading requirements: " + str(self.requirements))
+            self.requirements_uploaded = self.cfc.init(self.requirements)
+        else:
+            # The document already exists, only send the new requirements
+            self.logger.debug("Updating requirements: " + str(self.requirements))
+            self.requirements_uploaded = self.cfc._app_req_update(self.requirements)
+            if not self.requirements_uploaded:
+                # Next attempt creates a new document
+                self.cfc.app_req_id = None
         # Increment attempt counter
         self.up_req_counter += 1
 
@@ -103,10 +127,15 @@ class DeviceRuntimeStateMachine(StateMachine):
     def on_enter_get_ecf_address(self):
         self.logger.debug("Entering GET_ECF_ADDRESS state")
         self.up_req_counter = 0
-        # Get Edge Cluster Frontend 
-        self.ecc_address = self.cfc._get_edge_cluster_address()
-        # Initialize Edge Cluster client
-        self.ecf = EdgeClusterFrontendClient(self.token, self.ecc_address)
+        if self.ecf is not None and not self.cfc.placement_changed and self.ecf.get_has_connection():
+            # The Cognit Frontend kept the placement, the current client remains valid
+            self.logger.debug("Placement unchanged. Keeping Edge Cluster Frontend " + str(self.ecc_address))
+        else:
+            # Get Edge Cluster Frontend 
+            self.ecc_address = self.cfc._get_edge_cluster_address()
+            # Initialize Edge Cluster client
+            self.ecf = EdgeClusterFrontendClient(self.token, self.ecc_address, self.parser)
+            self.hedge_ecf = None
         # Reset attemps counter
         self.get_address_counter += 1
 
@@ -156,17 +185,23 @@ class DeviceRuntimeStateMachine(StateMachine):
 
         Args:
             requirements (Scheduling): The requirements to be uploaded
+        Returns:
+            True if the requirements are uploaded, or did not change
         """
+        with self._transition_lock:
+            return self._update_requirements(requirements)
 
+    def _update_requirements(self, requirements: Scheduling) -> bool:
         # Do not update requirements if they have not changed
-        if requirements == self.requirements:
+        if requirements is self.requirements or \
+                (isinstance(requirements, Scheduling) and requirements.same_as(self.requirements)):
             self.requirements_changed = False
             self.logger.info("Requirements have not changed. Clients are not restarted.")
-            return
+            return True
         
         if requirements == None or type(requirements) is not Scheduling:
             self.logger.info("The requirements provided are not valid.")
-            return
+            return False
         self.requirements_changed = True
         self.requirements = requirements
         self.logger.info("Requirements have changed! Applying...")
@@ -183,7 +218,7 @@ class DeviceRuntimeStateMachine(StateMachine):
                 self.token_not_valid_address()
             elif self.send_init_request.is_active:
                 self.token_not_valid_requirements()
-            return
+            return False
         
         # Transitions depending on the current state of the SM
         
@@ -214,7 +249,7 @@ class DeviceRuntimeStateMachine(StateMachine):
                 self.requirements = None
                 self.limit_requirements_upload()
                 self.requirements_changed = False
-                return
+                return False
             self.retry_requirements_upload()
 
         self.logger.info("Requirements successfully uploaded! Entering GET_ECF_ADDRESS state...")
@@ -222,42 +257,127 @@ class DeviceRuntimeStateMachine(StateMachine):
         self.requirements_up()
         # Reset requirements_changed flag
         self.requirements_changed = False
+        return True
 
 
     # In charge of offloading a function
-    def offload_function(self, func: Callable, *params):
+    def offload_function(self, func: Callable, *params, deadline: Deadline = None):
         """
         Handles the process that derive in the execution of a function in the cloud-edge continuum
 
         Args:
             function (Callable): The function to be offloaded
             params (List[Any]): Arguments needed to call the function
+            deadline (Deadline): Deadline of the offload, default timeouts if None
         """
 
-        # If the state machine is able to offload functions
-        if self.ready.is_active:
-            response = self._execute_function_offloading(func, *params)
+        # If the state machine is able to offload functions (a client that lost its connection
+        # since the last offload makes it authenticate again)
+        if self.ready.is_active and self.cfc.get_has_connection() and self.ecf.get_has_connection():
+            response = self._execute_function_offloading(func, *params, deadline=deadline)
             return response  # Return response when ready
         else:
             self.logger.debug("State is not READY. Handling transitions...")
             self._handle_transitions()
+            if deadline is not None:
+                deadline.check("function offloading")
             self.logger.debug("Retrying function offload after state transitions...")
             # Retry function offloading after handling transitions
-            return self.offload_function(func, *params)  # Return the recursive call
+            return self.offload_function(func, *params, deadline=deadline)  # Return the recursive call
+
+    # Offloads a function whose parameters are already serialized
+    def offload_serialized_function(
+        self,
+        fc_hash: str,
+        serialized_fc: str,
+        imports: list,
+        serialized_params: list,
+        max_transitions: int = None
+    ):
+        """
+        Handles the process that derive in the execution of a function in the cloud-edge continuum
+
+        Args:
+            fc_hash (str): Hash the function is uploaded with
+            serialized_fc (str): Function serialized by FaasParser.serialize
+            imports (List[str]): Modules the serverless runtime imports for the function
+            serialized_params (List[str]): Parameters serialized by FaasParser.serialize_params
+            max_transitions (int): Maximum number of transitions to try to reach READY,
+            unlimited if None
+        Raises:
+            requests.exceptions.ConnectionError if READY is not reached
+        """
+        if not self.ensure_ready(max_transitions):
+            raise req.exceptions.ConnectionError(f"State machine not READY after {max_transitions} transitions")
+        app_req_id, function_id = self.cfc.upload_serialized_fc(fc_hash, serialized_fc, imports)
+        return self.ecf.execute_serialized(function_id, app_req_id, ExecutionMode.SYNC, serialized_params)
+
+    # Handles the transitions until the READY state is reached
+    def ensure_ready(self, max_transitions: int = None) -> bool:
+        """
+        Args:
+            max_transitions (int): Maximum number of transitions to try, unlimited if None
+        Returns:
+            True if the state machine is READY
+        """
+        with self._transition_lock:
+            return self._ensure_ready(max_transitions)
+
+    def _ensure_ready(self, max_transitions: int = None) -> bool:
+        transitions = 0
+        while not self.ready.is_active:
+            if max_transitions is not None and transitions >= max_transitions:
+                self.logger.warning(f"State machine not READY after {transitions} transitions")
+                return False
+            self._handle_transitions()
+            transitions += 1
+        return True
 
     # Uploads and executes the function
-    def _execute_function_offloading(self, func: Callable, *params):
-        app_req_id, function_id = self.cfc._serialize_and_upload_fc_to_daas_gw(func)
+    def _execute_function_offloading(self, func: Callable, *params, deadline: Deadline = None):
+        app_req_id, function_id = self.cfc._serialize_and_upload_fc_to_daas_gw(func, deadline)
         self.logger.debug("Waiting for result...")
-        self.response = self.ecf.execute_function(function_id, app_req_id, ExecutionMode.SYNC, params)
-        if self.response.res is not None:
-            self.logger.info(f"Result: {self.response.res}")
+        # Local variable: concurrent offloads must not return each other's response
+        if self.hedger is not None and is_idempotent(func):
+            response = self._execute_hedged(func, function_id, app_req_id, params, deadline)
+        else:
+            response = self.ecf.execute_function(function_id, app_req_id, ExecutionMode.SYNC, params, deadline=deadline)
+        self.response = response
+        if response.res is not None:
+            self.logger.info(f"Result: {response.res}")
         else:
             self.logger.info("Result not given!")
-        return self.response
+        return response
+
+    # Executes an idempotent function, duplicating the request to the second-best ECF if it is slow
+    def _execute_hedged(self, func: Callable, function_id, app_req_id: int, params: tuple, deadline: Deadline = None):
+        ecf = self.ecf
+        # Parameters are serialized once for both requests
+        start = time.perf_counter()
+        serialized_params = ecf.parser.serialize_params(params)
+        ecf.last_call.serialization_time = time.perf_counter() - start
+        primary = lambda: ecf.execute_serialized(function_id, app_req_id, ExecutionMode.SYNC, serialized_params, deadline)
+        hedge = None
+        hedge_ecf = self._get_hedge_ecf()
+        if hedge_ecf is not None:
+            hedge = lambda: hedge_ecf.execute_serialized(function_id, app_req_id, ExecutionMode.SYNC, serialized_params, deadline)
+        return self.hedger.execute(function_key(func), primary, hedge)
+
+    # Returns the client of the second-best Edge Cluster Frontend, None if the Cognit Frontend only gave one
+    def _get_hedge_ecf(self):
+        if self.hedge_ecf is None or not self.hedge_ecf.get_has_connection():
+            alternatives = [address for address in self.cfc.ec_fe_list if address != self.ecc_address]
+            if len(alternatives) == 0:
+                return None
+            self.hedge_ecf = EdgeClusterFrontendClient(self.token, alternatives[0], self.parser)
+        return self.hedge_ecf
 
     # Manage the transitions based on the current state (eventually will reach ready state)
     def _handle_transitions(self):
+        with self._transition_lock:
+            self._handle_transition()
+
+    def _handle_transition(self):
         if self.send_init_request.is_active:
             self._handle_send_init_request_state()
         elif self.get_ecf_address.is_active:
@@ -1,16 +1,76 @@
 import requests as req
 import pydantic
 import json
+import threading
+import time
+from urllib.parse import urlencode
 
-from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecutionMode
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecReturnCode, ExecutionMode
+from cognit.modules._deadline import Deadline, request_timeout
 from cognit.modules._faas_parser import FaasParser
 from cognit.modules._logger import CognitLogger
 
 cognit_logger = CognitLogger()
 
+EXEC_RESPONSE_FIELDS = frozenset(ExecResponse.__fields__)
+EXEC_RETURN_CODES = {code.value: code for code in ExecReturnCode}
+
+def dumps_params(serialized_params: list) -> bytes:
+    """
+    Encodes the list of serialized parameters as the JSON request body
+    """
+    if orjson is not None:
+        return orjson.dumps(serialized_params)
+    return json.dumps(serialized_params).encode("utf-8")
+
+def loads_response(response: req.Response):
+    """
+    Decodes the JSON body of a response
+    """
+    content = response.content
+    if orjson is not None and isinstance(content, (bytes, bytearray)):
+        return orjson.loads(content)
+    return response.json()
+
+def decode_exec_response(data) -> ExecResponse:
+    """
+    Builds an ExecResponse from the decoded response body. Well-formed
+    bodies skip the pydantic validation, anything else is validated.
+
+    Args:
+        data: Decoded JSON body of the execution response
+    """
+    if type(data) is dict and data.keys() <= EXEC_RESPONSE_FIELDS:
+        ret_code = EXEC_RETURN_CODES.get(data.get("ret_code", ExecReturnCode.SUCCESS.value))
+        res = data.get("res")
+        err = data.get("err")
+        if ret_code is not None and type(res) in (str, type(None)) and type(err) in (str, type(None)):
+            return ExecResponse.construct(ret_code=ret_code, res=res, err=err)
+    return pydantic.parse_obj_as(ExecResponse, data)
+
+
+class ExecRequestTemplate:
+    """
+    Precomputed parts of the execution request of a function
+    """
+
+    def __init__(self, url: str, headers: dict):
+        """
+        Args:
+            url (str): Execution endpoint including the query parameters
+            headers (dict): Request headers
+        """
+        self.url = url
+        self.headers = headers
+
 class EdgeClusterFrontendClient:
 
-    def __init__(self, token: str, address: str):
+    def __init__(self, token: str, address: str, parser: FaasParser = None):
         """
         Initializes EdgeClusterFrontendClient. 
 
@@ -18,8 +78,10 @@ class EdgeClusterFrontendClient:
             token (str): Token for the communication between the client 
             and the Edge Cluster Frontend
             address (str): address of the Edge Cluster Frontend
+            parser (FaasParser): Parser of the offloaded functions and their
+            parameters. A default one is created if None.
         """
-        self.parser = FaasParser()
+        self.parser = parser if parser is not None else FaasParser()
         self.set_has_connection(True)
         # Check if the parameters received are not null
         if token == None:
@@ -31,8 +93,42 @@ class EdgeClusterFrontendClient:
         self.token = token
         # cognit_logger.warning(f"\n\n[ECFC] ---- {self.token}\n\n")
         self.address = address
+        # Execution requests are fixed for a given function, requirements and mode.
+        # Only the ones of the current requirements are kept.
+        self.exec_templates = {}
+        self.exec_templates_app_req_id = None
+        # Disabled once the ECF is known to use a self-signed certificate
+        self.verify = True
+        # Timings of the last execute_function call of each thread
+        self.last_call = threading.local()
+
+    def get_exec_template(self, func_id: str, app_req_id: int, exec_mode: ExecutionMode) -> ExecRequestTemplate:
+        """
+        Returns the request template to execute a function, building it the first time
+
+        Args:
+            func_id (str): Identifier of the function to be executed
+            app_req_id (int): Identifier of the requirements associated to the function
+            exec_mode (ExecutionMode): Selected mode for offloading (SYNC OR ASYNC)
+        """
+        if app_req_id != self.exec_templates_app_req_id:
+            # The requirements were updated, the previous templates are not used anymore
+            self.exec_templates = {}
+            self.exec_templates_app_req_id = app_req_id
+        key = (func_id, app_req_id, exec_mode)
+        template = self.exec_templates.get(key)
+        if template is None:
+            # Query parameters are encoded once in the URL
+            qparams = urlencode({
+                "app_req_id": app_req_id,
+                "mode": ExecutionMode(exec_mode).value
+            })
+            url = f"{self.address}/v1/functions/{func_id}/execute?{qparams}"
+            template = ExecRequestTemplate(url, {"token": self.token})
+            self.exec_templates[key] = template
+        return template
         
-    def execute_function(self, func_id: str, app_req_id: int, exec_mode: ExecutionMode, params_tuple: tuple) -> ExecResponse:
+    def execute_function(self, func_id: str, app_req_id: int, exec_mode: ExecutionMode, params_tuple: tuple, deadline: Deadline = None) -> ExecResponse:
         """
         Triggers the execution of a function described by its id in a certain mode using certain paramters for its execution
 
@@ -41,46 +137,56 @@ class EdgeClusterFrontendClient:
             app_req_id (int): Identifier of the requirements associated to the function
             exec_mode (ExecutionMode): Selected mode for offloading (SYNC OR ASYNC)
             params (List[Any]): Arguments needed to call the function
+            deadline (Deadline): Deadline of the offload, default timeouts if None
+        """
+
+        # Encode parameters
+        start = time.perf_counter()
+        serialized_params = self.parser.serialize_params(params_tuple)
+        self.last_call.serialization_time = time.perf_counter() - start
+        return self.execute_serialized(func_id, app_req_id, exec_mode, serialized_params, deadline)
+
+    def execute_serialized(self, func_id: str, app_req_id: int, exec_mode: ExecutionMode, serialized_params: list, deadline: Deadline = None) -> ExecResponse:
+        """
+        Triggers the execution of a function with parameters that are already serialized
+
+        Args:
+            func_id (str): Identifier of the function to be executed
+            app_req_id (int): Identifier of the requirements associated to the function
+            exec_mode (ExecutionMode): Selected mode for offloading (SYNC OR ASYNC)
+            serialized_params (List[str]): Parameters serialized by FaasParser.serialize_params
+            deadline (Deadline): Deadline of the offload, default timeouts if None.
+            The time left is sent to the Edge Cluster Frontend in a header.
         """
 
         # Create request
         cognit_logger.debug(f"Execute function with ID {func_id}")
-        uri = f"{self.address}/v1/functions/{func_id}/execute"
-        # Header
-        headers = {
-            "token": self.token
-        }
-        # Query parameters
-        qparams = {
-            "app_req_id": app_req_id,
-            "mode": exec_mode.value
-        }
-        # Encode parameters
-        serialized_params = []
-        for param in params_tuple:
-            serialized_param = self.parser.serialize(param)
-            serialized_params.append(serialized_param)
+        template = self.get_exec_template(func_id, app_req_id, exec_mode)
+        body = dumps_params(serialized_params)
+        timeout = request_timeout(deadline, "function execution", execution=True)
+        headers = template.headers if deadline is None else {**template.headers, **deadline.header()}
         # Send request
         try:
             cognit_logger.debug(f"Sending function execution order...")
-            
-            # TODO: Add a timeout for the request, otherwise if ECFE is not available it takes too long
             try:
-                response = req.post(uri, headers=headers, params=qparams, data=json.dumps(serialized_params))
+                response = req.post(template.url, headers=headers, data=body, verify=self.verify, timeout=timeout)
             except req.exceptions.SSLError as e:
                 if "CERTIFICATE_VERIFY_FAILED" not in str(e):
                     raise e
-                cognit_logger.warning(f"SSL certificate verification failed, retrying with verify=False for URI: {uri}")
-                response = req.post(uri, headers=headers, params=qparams, data=json.dumps(serialized_params), verify=False) # verify=False because the uri uses a self-signed certificate
+                cognit_logger.warning(f"SSL certificate verification failed, retrying with verify=False for URI: {template.url}")
+                self.verify = False # the uri uses a self-signed certificate
+                response = req.post(template.url, headers=headers, data=body, verify=self.verify, timeout=request_timeout(deadline, "function execution", execution=True))
             response.raise_for_status() 
-            response_data = response.json()
             # Parse the response to an ExecResponse model
-            response_obj = pydantic.parse_obj_as(ExecResponse, response_data)
+            response_obj = decode_exec_response(loads_response(response))
             cognit_logger.debug(f"Result obtained {func_id}")
             # Evaluate response
             self.evaluate_response(response_obj)
         except req.exceptions.RequestException as e:
             cognit_logger.error(f"Error during execution: {e}")
+            if isinstance(e, req.exceptions.HTTPError) and e.response is not None and e.response.status_code in (400, 401):
+                # The token is not valid anymore, the state machine has to authenticate again
+                self.set_has_connection(False)
             raise
         return response_obj
 
@@ -96,7 +202,7 @@ class EdgeClusterFrontendClient:
         # TODO: Add current location and latency to the request
 
         # Wait for the response
-        response = req.post(uri, headers=headers)
+        response = req.post(uri, headers=headers, timeout=request_timeout(None, "metrics upload"))
         # Evaluate response
         self.evaluate_response(response)
         return response
@@ -114,6 +220,12 @@ class EdgeClusterFrontendClient:
             cognit_logger.debug("Bad request. Has the token been added in the header?")
             self.set_has_connection(False)
 
+    def get_last_serialization_time(self):
+        """
+        Time in seconds spent serializing the parameters in the last execute_function call of the current thread
+        """
+        return getattr(self.last_call, "serialization_time", None)
+
     def get_has_connection(self):
         return self.has_connection
     
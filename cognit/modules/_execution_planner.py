@@ -0,0 +1,214 @@
+import threading
+import time
+from enum import Enum
+from typing import Callable, Dict, Optional
+
+from cognit.modules._logger import CognitLogger
+
+cognit_logger = CognitLogger()
+
+
+class ExecutionPolicy(str, Enum):
+    # Every call is offloaded (default)
+    OFFLOAD = "offload"
+    # Every call runs on the device
+    LOCAL = "local"
+    # Calls run where they are predicted to finish first, and locally
+    # while the Edge Cluster Frontend is unreachable
+    ADAPTIVE = "adaptive"
+
+
+class ExecutionRoute(str, Enum):
+    LOCAL = "local"
+    OFFLOAD = "offload"
+    # Ran locally because the offload failed
+    FALLBACK = "fallback"
+
+
+def function_key(fc: Callable) -> str:
+    """
+    Name under which the estimates and stats of a function are kept
+    """
+    module = getattr(fc, "__module__", None) or ""
+    name = getattr(fc, "__qualname__", None) or getattr(fc, "__name__", None) or repr(fc)
+    return f"{module}.{name}" if module else name
+
+
+class Ewma:
+    """
+    Exponentially weighted moving average. The first sample initializes it.
+    """
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value = None
+        self.count = 0
+
+    def update(self, sample: float):
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+        self.count += 1
+
+
+class FunctionCosts:
+    """
+    Running estimates (in seconds) and routing counters of a function
+    """
+
+    def __init__(self, alpha: float):
+        self.local_time = Ewma(alpha)
+        self.serialization_time = Ewma(alpha)
+        # Request round trip, including the remote execution and the result decoding
+        self.rtt = Ewma(alpha)
+        self.routes = {route: 0 for route in ExecutionRoute}
+        # Consecutive decisions for the same route, to probe the other one from time to time
+        self.streak = 0
+        self.last_route = None
+
+    def remote_time(self) -> Optional[float]:
+        if self.rtt.value is None:
+            return None
+        return self.rtt.value + (self.serialization_time.value or 0.0)
+
+    def to_dict(self) -> dict:
+        return {
+            "local_time": self.local_time.value,
+            "serialization_time": self.serialization_time.value,
+            "rtt": self.rtt.value,
+            "routes": {route.value: count for route, count in self.routes.items()},
+        }
+
+
+class ExecutionPlanner:
+    """
+    Decides whether each call of DeviceRuntime.call is offloaded or run on the
+    device, from running estimates of the local execution time, the parameter
+    serialization time and the round trip to the Edge Cluster Frontend, kept
+    per function.
+    """
+
+    def __init__(
+        self,
+        policy: ExecutionPolicy = ExecutionPolicy.OFFLOAD,
+        alpha: float = 0.2,
+        probe_interval: int = 20,
+        unreachable_backoff: float = 5.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            policy (ExecutionPolicy): Routing policy
+            alpha (float): Weight of the new samples in the estimates
+            probe_interval (int): With the ADAPTIVE policy, after this many calls routed
+            the same way the other route is taken once to refresh its estimate
+            unreachable_backoff (float): Seconds during which calls run locally after an
+            offload failed, with the ADAPTIVE policy
+            clock (Callable): Monotonic time source
+        """
+        self.policy = ExecutionPolicy(policy)
+        self.alpha = alpha
+        self.probe_interval = probe_interval
+        self.unreachable_backoff = unreachable_backoff
+        self.clock = clock
+        self.unreachable_until = None
+        self._costs: Dict[str, FunctionCosts] = {}
+        self._lock = threading.Lock()
+
+    def _get_costs(self, fc: Callable) -> FunctionCosts:
+        key = function_key(fc)
+        costs = self._costs.get(key)
+        if costs is None:
+            costs = self._costs.setdefault(key, FunctionCosts(self.alpha))
+        return costs
+
+    def can_fallback(self) -> bool:
+        """
+        Whether failed offloads are run locally
+        """
+        return self.policy == ExecutionPolicy.ADAPTIVE
+
+    def is_unreachable(self) -> bool:
+        return self.unreachable_until is not None and self.clock() < self.unreachable_until
+
+    def plan(self, fc: Callable) -> ExecutionRoute:
+        """
+        Route of the next call of fc
+
+        Args:
+            fc (Callable): Function to be executed
+        """
+        if self.policy == ExecutionPolicy.OFFLOAD:
+            return ExecutionRoute.OFFLOAD
+        if self.policy == ExecutionPolicy.LOCAL:
+            return ExecutionRoute.LOCAL
+        if self.is_unreachable():
+            return ExecutionRoute.FALLBACK
+        with self._lock:
+            costs = self._get_costs(fc)
+            remote_time = costs.remote_time()
+            if remote_time is None:
+                # Nothing known yet, the first call keeps the default behaviour
+                route = ExecutionRoute.OFFLOAD
+            elif costs.local_time.value is None:
+                route = ExecutionRoute.LOCAL
+            elif costs.local_time.value <= remote_time:
+                route = ExecutionRoute.LOCAL
+            else:
+                route = ExecutionRoute.OFFLOAD
+            if route == costs.last_route:
+                costs.streak += 1
+                if costs.streak >= self.probe_interval:
+                    # Refresh the estimate of the other route
+                    route = ExecutionRoute.OFFLOAD if route == ExecutionRoute.LOCAL else ExecutionRoute.LOCAL
+            if route != costs.last_route:
+                costs.streak = 0
+                costs.last_route = route
+        return route
+
+    def record_local(self, fc: Callable, elapsed: float, route: ExecutionRoute = ExecutionRoute.LOCAL):
+        """
+        Records a call run on the device
+
+        Args:
+            fc (Callable): Executed function
+            elapsed (float): Execution time in seconds
+            route (ExecutionRoute): LOCAL or FALLBACK
+        """
+        with self._lock:
+            costs = self._get_costs(fc)
+            costs.local_time.update(elapsed)
+            costs.routes[route] += 1
+
+    def record_offload(self, fc: Callable, serialization_time: Optional[float], elapsed: float):
+        """
+        Records a successful offload
+
+        Args:
+            fc (Callable): Offloaded function
+            serialization_time (float): Time spent serializing the parameters, if known
+            elapsed (float): Total time of the offload in seconds
+        """
+        with self._lock:
+            costs = self._get_costs(fc)
+            if serialization_time is not None:
+                costs.serialization_time.update(serialization_time)
+                elapsed = max(0.0, elapsed - serialization_time)
+            costs.rtt.update(elapsed)
+            costs.routes[ExecutionRoute.OFFLOAD] += 1
+        self.unreachable_until = None
+
+    def record_unreachable(self):
+        """
+        Records an offload that failed because the Edge Cluster Frontend could not be reached
+        """
+        self.unreachable_until = self.clock() + self.unreachable_backoff
+        cognit_logger.warning(f"Edge Cluster Frontend unreachable, running calls locally for {self.unreachable_backoff}s")
+
+    def stats(self) -> dict:
+        """
+        Estimates and number of calls per route, by function name
+        """
+        with self._lock:
+            return {key: costs.to_dict() for key, costs in self._costs.items()}
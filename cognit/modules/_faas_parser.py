@@ -1,37 +1,333 @@
 import base64 as b64
-from typing import Any
+import os
+import pickle
+import sys
+import threading
+import types
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Callable, List, Optional, Tuple
 
 import cloudpickle as cp
 
+from cognit.modules._dependency_analyzer import DependencyAnalyzer
+from cognit.modules._serializers import Serializer, SerializerRegistry, CLOUDPICKLE, default_registry, detach, is_envelope
+
+# Parameters whose estimated size is above this threshold are serialized
+# and compressed on the shared worker pool
+PARALLEL_SERIALIZATION_THRESHOLD = 1 << 20
+# Pickled parameters above this size are compressed in chunks, if compression is enabled
+COMPRESSION_THRESHOLD = 256 << 10
+COMPRESSION_CHUNK_SIZE = 1 << 20
+COMPRESSION_LEVEL = 1
+# Items inspected to estimate the size of a sequence
+SIZE_ESTIMATION_SAMPLE = 256
+
+# With parameter codecs enabled, parameters below this estimated size are
+# still cloudpickled, the codec envelope and its remote decoder are not worth it
+CODEC_SELECTION_THRESHOLD = 64 << 10
+
+RESULT_ENCODING_ATTR = "__cognit_result_encoding__"
+
+
+class ResultEncoding(str, Enum):
+    PICKLE = "pickle"
+    JSON = "json"
+    MSGPACK = "msgpack"
+    NDARRAY = "ndarray"
+    PICKLE5 = "pickle5"
+    ARROW = "arrow"
+
+def result_encoding(encoding: ResultEncoding) -> Callable:
+    """
+    Decorator that declares how the result of an offloaded function is encoded.
+    JSON and msgpack results must be plain data (dicts, lists, strings, numbers...),
+    NDARRAY results must be numpy arrays and ARROW results pandas DataFrames or
+    pyarrow Tables. Results that cannot be encoded fall back to cloudpickle.
+
+    Args:
+        encoding (ResultEncoding): Encoding of the function result
+    """
+    encoding = ResultEncoding(encoding)
+
+    def decorator(fc: Callable) -> Callable:
+        setattr(fc, RESULT_ENCODING_ATTR, encoding)
+        return fc
+    return decorator
+
+def get_result_encoding(fc: Callable) -> ResultEncoding:
+    return getattr(fc, RESULT_ENCODING_ATTR, ResultEncoding.PICKLE)
+
+def _make_typed_result_wrapper(fc: Callable, serializer: Serializer) -> Callable:
+    """
+    Wraps fc so that the serverless runtime returns the encoded result as bytes.
+    The wrapper runs remotely, so it only relies on its own imports.
+    """
+    header = serializer.header
+    encode = detach(serializer.encode)
+
+    def typed_result_wrapper(*args, **kwargs):
+        result = fc(*args, **kwargs)
+        try:
+            payload = encode(result)
+        except Exception:
+            # Not encodable, let the serverless runtime pickle it
+            return result
+        return header + payload
+
+    wrapper = detach(typed_result_wrapper)
+    wrapper.__name__ = fc.__name__
+    wrapper.__qualname__ = getattr(fc, "__qualname__", fc.__name__)
+    return wrapper
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_serialization_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool shared by all the parsers of the process
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                thread_name_prefix="cognit-serializer"
+            )
+        return _executor
+
+def estimate_size(value: Any) -> int:
+    """
+    Cheap estimation of the serialized size of a value in bytes. Large
+    sequences are estimated from a sample of their items.
+
+    Args:
+        value: Value to be serialized
+    """
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return sys.getsizeof(value)
+        sample = value[:SIZE_ESTIMATION_SAMPLE]
+        sample_size = sum(estimate_size(item) for item in sample)
+        return sample_size * len(value) // len(sample)
+    if isinstance(value, dict):
+        return sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    return sys.getsizeof(value)
+
+
+class _Inflate:
+    """
+    Pickled as zlib.decompress(data): the serverless runtime only needs the stdlib
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __reduce__(self):
+        return (zlib.decompress, (self.data,))
+
+
+class _Join:
+    """
+    Pickled as b"".join(parts)
+    """
+
+    def __init__(self, parts: list):
+        self.parts = parts
+
+    def __reduce__(self):
+        return (b"".join, (self.parts,))
+
+
+class _Unpickle:
+    """
+    Pickled as pickle.loads(data), so that a compressed pickle is transparently
+    restored by the serverless runtime when it loads the parameter
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce__(self):
+        return (pickle.loads, (self.data,))
+
+
+class _Decode:
+    """
+    Pickled as decoder(data), where decoder is the self-contained envelope
+    decoder of a codec, shipped by value
+    """
+
+    def __init__(self, decoder: Callable, data):
+        self.decoder = decoder
+        self.data = data
+
+    def __reduce__(self):
+        return (self.decoder, (self.data,))
+
 
 class FaasParser:
     """
     This class is responsible for serializing the functions that will be offloaded
     and deserializing the results that will be returned from the serverless runtime.
+
+    Args:
+        registry (SerializerRegistry): Codecs used for declared result encodings
+        and, if param_codecs is set, for large parameters. The serverless runtime
+        must provide the modules of the codecs in use.
+        param_codecs (bool): Encode large parameters with the codec of their type
+        (Arrow for tables, pickle protocol 5 for arrays, msgpack for lists and
+        dicts) instead of cloudpickle. Off by default, as the serverless runtime
+        then needs pyarrow and msgpack.
+        compress (bool): Compress the parameters above COMPRESSION_THRESHOLD. Off by
+        default, as it trades CPU time for bandwidth and changes the wire format.
+        The chunks are compressed in parallel on devices with several CPUs.
     """
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        registry: Optional[SerializerRegistry] = None,
+        param_codecs: bool = False,
+        compress: bool = False
+    ):
+        self.analyzer = DependencyAnalyzer()
+        self.registry = registry if registry is not None else default_registry()
+        self.param_codecs = param_codecs
+        self.compress = compress
 
     def serialize(self, fc) -> str:
-        # For now clear the __global__ attribute to avoid sending global namespace info
-        # TODO: Implement a dependency analyzer to send the required imports
-        if hasattr(fc, "__globals__"):
-            g = fc.__globals__.copy()
-            fc.__globals__.clear()
-            # Cloudpickle it
-            blob_cp = cp.dumps(fc)
-            fc.__globals__.update(g)
-        else:
-            # Cloudpickle it
-            blob_cp = cp.dumps(fc)
+        target = fc
+        if isinstance(fc, types.FunctionType):
+            # Ship a copy bound to the globals it really uses, the caller's module
+            # namespace is left untouched
+            target = self.analyzer.rebind(fc)
+        # Functions with a declared result encoding are offloaded wrapped
+        encoding = get_result_encoding(fc) if callable(fc) else ResultEncoding.PICKLE
+        serializer = self.registry.get(encoding.value)
+        if serializer is not None:
+            target = _make_typed_result_wrapper(target, serializer)
+        # Cloudpickle it
+        blob_cp = cp.dumps(target)
 
         ## Encode it in base64
         blob_b64 = b64.b64encode(blob_cp)
         return blob_b64.decode("utf-8")
 
-    def deserialize(self, input: str) -> Any:
+    def serialize_param(self, param: Any) -> str:
+        """
+        Serializes a function parameter with cloudpickle, or with the best codec
+        for its type if param_codecs is set. Large payloads are compressed if
+        compression is enabled.
+
+        Args:
+            param: Parameter of the offloaded function
+        """
+        decoder, blob = self._encode_param(param, estimate_size(param))
+        compressed = None
+        if self.compress and len(blob) >= COMPRESSION_THRESHOLD:
+            compressed = [zlib.compress(chunk, COMPRESSION_LEVEL) for chunk in self._split(blob)]
+        return self._wire(decoder, blob, compressed)
+
+    def serialize_params(self, params: tuple) -> List[str]:
+        """
+        Serializes the parameters of an offloaded function. Without compression,
+        or below PARALLEL_SERIALIZATION_THRESHOLD, they are serialized inline.
+        For the others, the chunks of their payloads are compressed on the shared worker pool
+        (zlib releases the GIL) while the next parameters are encoded.
+
+        Args:
+            params (tuple): Arguments of the offloaded function
+        """
+        sizes = [estimate_size(param) for param in params]
+        if not self.compress or max(sizes, default=0) < PARALLEL_SERIALIZATION_THRESHOLD:
+            return [self.serialize_param(param) for param in params]
+
+        executor = get_serialization_executor()
+        pending = []
+        for param, size in zip(params, sizes):
+            if size < PARALLEL_SERIALIZATION_THRESHOLD:
+                pending.append(self.serialize_param(param))
+                continue
+            decoder, blob = self._encode_param(param, size)
+            if len(blob) < COMPRESSION_THRESHOLD:
+                pending.append(self._wire(decoder, blob))
+                continue
+            futures = [executor.submit(zlib.compress, chunk, COMPRESSION_LEVEL) for chunk in self._split(blob)]
+            pending.append((decoder, blob, futures))
+
+        serialized_params = []
+        for item in pending:
+            if isinstance(item, str):
+                serialized_params.append(item)
+            else:
+                decoder, blob, futures = item
+                serialized_params.append(self._wire(decoder, blob, [future.result() for future in futures]))
+        return serialized_params
+
+    def _encode_param(self, param: Any, size: int) -> Tuple[Optional[Callable], bytes]:
+        """
+        Encodes a parameter with the codec selected for its type. Returns the
+        remote decoder of the codec (None for plain cloudpickle) and the payload.
+        """
+        if self.param_codecs and size >= CODEC_SELECTION_THRESHOLD:
+            serializer = self.registry.select(param)
+            if serializer is not CLOUDPICKLE:
+                try:
+                    return self.registry.remote_decoder(serializer), self.registry.encode(param, serializer)
+                except (TypeError, ValueError, OverflowError, pickle.PicklingError):
+                    # Not encodable after all (e.g. plain data holding custom objects)
+                    pass
+        return None, cp.dumps(param)
+
+    def _wire(self, decoder: Optional[Callable], blob: bytes, compressed: Optional[List[bytes]] = None) -> str:
+        """
+        Pickle stream of a parameter, base64 encoded. The serverless runtime loads
+        it as usual and gets the original value back.
+        """
+        data = blob
+        if compressed is not None and sum(len(chunk) for chunk in compressed) < len(blob):
+            data = _Join([_Inflate(chunk) for chunk in compressed])
+        if decoder is not None:
+            # The decoder function is shipped by value
+            stream = cp.dumps(_Decode(decoder, data))
+        elif data is not blob:
+            stream = pickle.dumps(_Unpickle(data), protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            stream = blob
+        return b64.b64encode(stream).decode("utf-8")
+
+    def _split(self, blob: bytes) -> List[bytes]:
+        return [blob[i:i + COMPRESSION_CHUNK_SIZE] for i in range(0, len(blob), COMPRESSION_CHUNK_SIZE)]
+
+    def get_imports(self, fc) -> List[str]:
+        """
+        Modules used by an offloaded function, to be imported by the serverless runtime
+
+        Args:
+            fc (Callable): The offloaded function
+        """
+        if not isinstance(fc, types.FunctionType):
+            return []
+        return self.analyzer.analyze(fc).imports
+
+    def deserialize(self, input: str, encoding: Optional[ResultEncoding] = None) -> Any:
+        """
+        Args:
+            input (str): base64 encoded cloudpickle blob
+            encoding (ResultEncoding): Declared result encoding of the function
+            that produced the blob, if any
+        """
         # Decode it from base64
         b64_bytes = b64.b64decode(input)
         # Cloudpickle it
-        return cp.loads(b64_bytes)
+        value = cp.loads(b64_bytes)
+        if encoding not in (None, ResultEncoding.PICKLE) and type(value) is bytes and is_envelope(value):
+            return self.registry.decode(value)
+        return value
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+from cognit.modules._logger import CognitLogger
+
+cognit_logger = CognitLogger()
+
+IDEMPOTENT_ATTR = "__cognit_idempotent__"
+
+def idempotent(fc: Callable) -> Callable:
+    """
+    Decorator that marks an offloaded function as idempotent: executing it twice
+    has no other effect than executing it once, so its requests may be hedged.
+    """
+    setattr(fc, IDEMPOTENT_ATTR, True)
+    return fc
+
+def is_idempotent(fc: Callable) -> bool:
+    return getattr(fc, IDEMPOTENT_ATTR, False) is True
+
+
+class LatencyTracker:
+    """
+    Latencies of the last requests of each function
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Args:
+            window (int): Number of latencies kept per function
+            min_samples (int): Latencies needed before a percentile is estimated
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(latency)
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """
+        Observed q-quantile of the latency of a function, None without enough samples
+
+        Args:
+            key (str): Name of the function
+            q (float): Quantile between 0 and 1
+        """
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgingBudget:
+    """
+    Token bucket capping the hedged requests to a ratio of the eligible requests
+    """
+
+    def __init__(self, ratio: float = 0.05, burst: float = 2.0):
+        """
+        Args:
+            ratio (float): Hedged requests allowed per eligible request
+            burst (float): Maximum number of hedged requests allowed in a row
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class Hedger:
+    """
+    Sends a duplicate of a request to an alternative Edge Cluster Frontend when
+    no response arrives within the observed p95 latency of the function, and
+    returns whichever response comes first.
+    """
+
+    def __init__(
+        self,
+        budget: HedgingBudget = None,
+        tracker: LatencyTracker = None,
+        quantile: float = 0.95,
+        max_workers: int = 8
+    ):
+        """
+        Args:
+            budget (HedgingBudget): Cap of the extra load
+            tracker (LatencyTracker): Observed latencies per function
+            quantile (float): Latency quantile after which the request is hedged
+            max_workers (int): Threads sending the requests
+        """
+        self.budget = budget if budget is not None else HedgingBudget()
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self.quantile = quantile
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cognit-hedger")
+        # Counters, updated by the threads of every call
+        self._lock = threading.Lock()
+        self.requests_counter = 0
+        self.hedges_counter = 0
+        self.hedges_won_counter = 0
+
+    def execute(self, key: str, primary: Callable, hedge: Optional[Callable]):
+        """
+        Sends a request, hedging it if it is slow
+
+        Args:
+            key (str): Name of the function
+            primary (Callable): Sends the request to the selected Edge Cluster Frontend
+            hedge (Callable): Sends the request to the alternative one, None if there is none
+        Returns:
+            The first response
+        """
+        with self._lock:
+            self.requests_counter += 1
+        self.budget.deposit()
+        delay = self.tracker.percentile(key, self.quantile) if hedge is not None else None
+        start = time.perf_counter()
+        if delay is None:
+            response = primary()
+            self.tracker.record(key, time.perf_counter() - start)
+            return response
+
+        primary_future = self._executor.submit(primary)
+        done, _ = wait([primary_future], timeout=delay)
+        if done or not self.budget.try_spend():
+            response = primary_future.result()
+            self.tracker.record(key, time.perf_counter() - start)
+            return response
+
+        cognit_logger.debug(f"No response for {key} after {delay:.3f}s, hedging the request")
+        with self._lock:
+            self.hedges_counter += 1
+        hedge_future = self._executor.submit(hedge)
+        pending = {primary_future, hedge_future}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if not succeeded and pending:
+                cognit_logger.warning(f"Request of {key} failed while hedged: {next(iter(done)).exception()}")
+                continue
+            winner = succeeded[0] if succeeded else next(iter(done))
+            # The slower request cannot be interrupted once sent, its response is discarded
+            for other in pending:
+                other.cancel()
+            if winner is hedge_future:
+                with self._lock:
+                    self.hedges_won_counter += 1
+            self.tracker.record(key, time.perf_counter() - start)
+            return winner.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests_counter,
+                "hedges": self.hedges_counter,
+                "hedges_won": self.hedges_won_counter,
+            }
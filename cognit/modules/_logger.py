@@ -1,6 +1,6 @@
-import inspect
 import logging
 import os
+import sys
 
 
 class CognitLogger:
@@ -18,10 +18,13 @@ class CognitLogger:
             self.logger.addHandler(handler)
 
     def _log(self, level: int, message):
+        if not self.logger.isEnabledFor(level):
+            return
         if self.verbose:
-            frame = inspect.stack()[2]
-            filename = os.path.basename(frame.filename)
-            line = frame.lineno
+            # Caller of debug(), info()... (inspect.stack() is too slow for hot paths)
+            frame = sys._getframe(2)
+            filename = os.path.basename(frame.f_code.co_filename)
+            line = frame.f_lineno
             self.logger.log(level, f"[{filename}::{line}] {message}")
         else:
             self.logger.log(level, message)
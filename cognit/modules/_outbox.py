@@ -0,0 +1,380 @@
+import base64 as b64
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import cloudpickle as cp
+import requests as req
+
+from cognit.modules._logger import CognitLogger
+
+cognit_logger = CognitLogger()
+
+DEFAULT_CAPACITY = 1000
+DEFAULT_FSYNC_INTERVAL = 0.05
+# Acknowledged records kept in the file before it is rewritten
+COMPACTION_THRESHOLD = 1000
+
+
+class OutboxFullError(Exception):
+    pass
+
+
+class OutboxEntry:
+    """
+    An offload waiting in the outbox
+    """
+
+    def __init__(
+        self,
+        entry_id: int,
+        key: str,
+        fc: str,
+        params: List[str],
+        created: float,
+        function: Callable = None,
+        fc_hash: Optional[str] = None,
+        imports: Optional[List[str]] = None,
+        encoding: str = "pickle"
+    ):
+        """
+        Args:
+            entry_id (int): Position of the entry in the outbox
+            key (str): Name of the function, entries of the same key are drained in order
+            fc (str): base64 cloudpickle of the function, as it is uploaded
+            params (List[str]): Serialized parameters
+            created (float): Unix time of the call
+            function (Callable): The function, if it was queued by this process
+            fc_hash (str): Hash the function is uploaded with, the hash of fc if None
+            imports (List[str]): Modules the serverless runtime imports for the function
+            encoding (str): Declared result encoding of the function
+        """
+        self.id = entry_id
+        self.key = key
+        self.fc = fc
+        self.params = params
+        self.created = created
+        self._function = function
+        self.fc_hash = fc_hash or hashlib.sha256(fc.encode("utf-8")).hexdigest()
+        self.imports = imports
+        self.encoding = encoding
+
+    def get_function(self) -> Callable:
+        if self._function is None:
+            self._function = cp.loads(b64.b64decode(self.fc))
+        return self._function
+
+    def to_record(self) -> dict:
+        return {
+            "op": "put",
+            "id": self.id,
+            "key": self.key,
+            "fc": self.fc,
+            "fc_hash": self.fc_hash,
+            "imports": self.imports,
+            "encoding": self.encoding,
+            "params": self.params,
+            "created": self.created
+        }
+
+
+class Outbox:
+    """
+    Durable queue of the offloads that could not be sent. Entries are appended
+    to a JSON lines file, and acknowledged with another record once executed,
+    so that the pending entries survive a restart. Writes are fsynced in batches,
+    at most fsync_interval seconds after they are appended.
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY, fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        """
+        Args:
+            path (str): File of the outbox, created if it does not exist
+            capacity (int): Maximum number of pending entries
+            fsync_interval (float): Maximum time in seconds an appended record
+            may wait before being flushed to disk
+        """
+        self.path = path
+        self.capacity = capacity
+        self.fsync_interval = fsync_interval
+        self._entries: Dict[int, OutboxEntry] = {}
+        self._next_id = 0
+        self._acked_records = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="cognit-outbox", daemon=True)
+        self._flusher.start()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write of the last record before a crash
+                    cognit_logger.warning(f"Skipping corrupted outbox record in {self.path}")
+                    continue
+                if record.get("op") == "put":
+                    entry = OutboxEntry(
+                        record["id"],
+                        record["key"],
+                        record["fc"],
+                        record["params"],
+                        record["created"],
+                        fc_hash=record.get("fc_hash"),
+                        imports=record.get("imports"),
+                        encoding=record.get("encoding", "pickle")
+                    )
+                    self._entries[entry.id] = entry
+                elif record.get("op") == "ack":
+                    self._entries.pop(record["id"], None)
+                    self._acked_records += 1
+                self._next_id = max(self._next_id, record.get("id", -1) + 1)
+        if self._entries:
+            cognit_logger.info(f"{len(self._entries)} pending offloads loaded from {self.path}")
+
+    def put(
+        self,
+        function: Callable,
+        key: str,
+        params: List[str],
+        fc: Optional[str] = None,
+        fc_hash: Optional[str] = None,
+        imports: Optional[List[str]] = None,
+        encoding: str = "pickle"
+    ) -> int:
+        """
+        Appends an offload to the outbox
+
+        Args:
+            function (Callable): Function to be offloaded
+            key (str): Name of the function
+            params (List[str]): Serialized parameters
+            fc (str): The function as it is uploaded (FaasParser.serialize), a
+            plain cloudpickle of function if None
+            fc_hash (str): Hash the function is uploaded with
+            imports (List[str]): Modules the serverless runtime imports for the function
+            encoding (str): Declared result encoding of the function
+        Returns:
+            Identifier of the entry
+        Raises:
+            OutboxFullError if the capacity is reached
+        """
+        if fc is None:
+            fc = b64.b64encode(cp.dumps(function)).decode("utf-8")
+        with self._lock:
+            if len(self._entries) >= self.capacity:
+                raise OutboxFullError(f"Outbox {self.path} is full ({self.capacity} entries)")
+            entry = OutboxEntry(
+                self._next_id,
+                key,
+                fc,
+                params,
+                time.time(),
+                function,
+                fc_hash=fc_hash,
+                imports=imports,
+                encoding=encoding
+            )
+            self._next_id += 1
+            self._append(entry.to_record())
+            self._entries[entry.id] = entry
+        return entry.id
+
+    def ack(self, entry_id: int, error: Optional[str] = None):
+        """
+        Removes an executed entry from the outbox
+
+        Args:
+            entry_id (int): Identifier of the entry
+            error (str): Why the entry was dropped instead of executed, kept in
+            its ack record until the file is compacted
+        """
+        with self._lock:
+            if self._entries.pop(entry_id, None) is None:
+                return
+            record = {"op": "ack", "id": entry_id}
+            if error is not None:
+                record["error"] = error
+            self._append(record)
+            self._acked_records += 1
+            if not self._entries or self._acked_records >= COMPACTION_THRESHOLD:
+                self._compact()
+
+    def _append(self, record: dict):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._dirty = True
+
+    def _compact(self):
+        # Rewrites the file with the pending entries only
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry.to_record(), separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._acked_records = 0
+        self._dirty = False
+
+    def sync(self):
+        """
+        Flushes the appended records to disk
+        """
+        with self._lock:
+            if self._dirty and not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.sync()
+
+    def close(self):
+        self._closed.set()
+        self.sync()
+        with self._lock:
+            self._file.close()
+
+    def pending(self, key: Optional[str] = None) -> List[OutboxEntry]:
+        """
+        Pending entries in call order
+
+        Args:
+            key (str): Only the entries of this function if given
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        if key is not None:
+            entries = [entry for entry in entries if entry.key == key]
+        return entries
+
+    def has_pending(self, key: Optional[str] = None) -> bool:
+        with self._lock:
+            if key is None:
+                return bool(self._entries)
+            return any(entry.key == key for entry in self._entries.values())
+
+    def keys(self) -> List[str]:
+        """
+        Functions with pending entries
+        """
+        with self._lock:
+            return list(dict.fromkeys(entry.key for entry in self._entries.values()))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class OutboxDrainer:
+    """
+    Sends the pending entries of an outbox. The entries of a function are sent
+    one after the other in call order, up to max_concurrency functions at a time.
+    Draining stops for retry_interval seconds when an entry cannot be sent.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        execute: Callable[[OutboxEntry], object],
+        on_result: Optional[Callable[[OutboxEntry, object], None]] = None,
+        max_concurrency: int = 2,
+        retry_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            outbox (Outbox): Outbox to be drained
+            execute (Callable): Offloads an entry and returns its result, raises a
+            requests exception if it could not be sent
+            on_result (Callable): Called with each entry and its result once sent. Entries
+            that fail with other errors (e.g. a function that cannot be unpickled) would
+            fail again: they are dropped and on_result gets the exception as result.
+            max_concurrency (int): Maximum number of functions drained at the same time
+            retry_interval (float): Seconds to wait after a failure before draining again
+            clock (Callable): Monotonic time source
+        """
+        self.outbox = outbox
+        self.execute = execute
+        self.on_result = on_result
+        self.retry_interval = retry_interval
+        self.clock = clock
+        self.last_failure = None
+        self.sent_counter = 0
+        self.dropped_counter = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="cognit-drainer")
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def should_retry(self) -> bool:
+        return self.last_failure is None or self.clock() - self.last_failure >= self.retry_interval
+
+    def drain(self) -> list:
+        """
+        Starts draining the functions that are not being drained yet
+
+        Returns:
+            Futures of the started drains
+        """
+        futures = []
+        if not self.should_retry():
+            return futures
+        for key in self.outbox.keys():
+            with self._lock:
+                if key in self._inflight:
+                    continue
+                self._inflight.add(key)
+            futures.append(self._executor.submit(self._drain_key, key))
+        return futures
+
+    def drain_and_wait(self):
+        for future in self.drain():
+            future.result()
+
+    def _drain_key(self, key: str):
+        try:
+            while True:
+                entries = self.outbox.pending(key)
+                if not entries:
+                    return
+                entry = entries[0]
+                try:
+                    result = self.execute(entry)
+                except req.exceptions.RequestException as e:
+                    cognit_logger.warning(f"Outbox entry {entry.id} could not be sent: {e}")
+                    self.last_failure = self.clock()
+                    return
+                except Exception as e:
+                    # Retrying would fail the same way and block the next entries of the function
+                    cognit_logger.error(f"Outbox entry {entry.id} failed, dropping it: {e!r}")
+                    self.outbox.ack(entry.id, error=repr(e))
+                    self.dropped_counter += 1
+                    result = e
+                else:
+                    self.outbox.ack(entry.id)
+                    self.sent_counter += 1
+                if self.on_result is not None:
+                    try:
+                        self.on_result(entry, result)
+                    except Exception as e:
+                        cognit_logger.error(f"Outbox result callback failed for entry {entry.id}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,169 @@
+import math
+import time
+from typing import Callable, Optional, Tuple
+
+from cognit.models._cognit_frontend_client import Scheduling
+from cognit.modules._logger import CognitLogger
+
+cognit_logger = CognitLogger()
+
+EARTH_RADIUS_M = 6371000.0
+
+def parse_geolocation(geolocation: Optional[str]) -> Optional[Tuple[float, float]]:
+    """
+    Parses a GEOLOCATION value with the "<latitude>,<longitude>" format
+
+    Args:
+        geolocation (str): GEOLOCATION field of a Scheduling object
+    Returns:
+        (latitude, longitude) tuple in degrees or None if the value is not a coordinate
+    """
+    if not isinstance(geolocation, str):
+        return None
+    parts = geolocation.split(",")
+    if len(parts) != 2:
+        return None
+    try:
+        return float(parts[0]), float(parts[1])
+    except ValueError:
+        return None
+
+def geolocation_distance(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """
+    Great-circle (haversine) distance between two coordinates
+
+    Args:
+        a, b: (latitude, longitude) tuples in degrees
+    Returns:
+        Distance in metres
+    """
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+class RequirementsCoalescer:
+    """
+    Rate limits the requirement updates sent to the Cognit Frontend.
+
+    Only the latest pending requirements are kept: intermediate states received
+    before the minimum interval elapses are dropped. Changes that are below the
+    significance thresholds with respect to the last sent requirements are ignored.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 0.0,
+        geolocation_threshold: float = 0.0,
+        latency_threshold: int = 0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            min_interval (float): Minimum time in seconds between two requirement uploads
+            geolocation_threshold (float): Minimum GEOLOCATION displacement in metres
+            to consider the requirements changed
+            latency_threshold (int): Minimum MAX_LATENCY delta in miliseconds to consider
+            the requirements changed
+            clock (Callable): Monotonic time source
+        """
+        self.min_interval = min_interval
+        self.geolocation_threshold = geolocation_threshold
+        self.latency_threshold = latency_threshold
+        self.clock = clock
+
+        self.last_sent = None
+        self.last_sent_time = None
+        self.pending = None
+        # Counters
+        self.submitted_counter = 0
+        self.sent_counter = 0
+        self.dropped_counter = 0
+
+    def mark_sent(self, requirements: Scheduling):
+        """
+        Registers requirements once they have been uploaded, the ones returned by
+        poll() or others uploaded bypassing the coalescer
+
+        Args:
+            requirements (Scheduling): The uploaded requirements
+        """
+        if requirements is self.pending:
+            self.sent_counter += 1
+        self.last_sent = requirements
+        self.last_sent_time = self.clock()
+        self.pending = None
+
+    def submit(self, requirements: Scheduling):
+        """
+        Offers new requirements. They replace any pending ones if they are significant.
+
+        Args:
+            requirements (Scheduling): The new requirements
+        """
+        self.submitted_counter += 1
+        if self.pending is not None:
+            # The previous pending state will never be sent
+            self.dropped_counter += 1
+            self.pending = None
+        if self.is_significant(requirements):
+            self.pending = requirements
+        else:
+            self.dropped_counter += 1
+
+    def poll(self) -> Optional[Scheduling]:
+        """
+        Returns the pending requirements if the minimum interval has elapsed. They
+        stay pending until mark_sent() is called, so a failed upload is retried.
+
+        Returns:
+            The Scheduling object to be uploaded or None if nothing has to be sent
+        """
+        if self.pending is None:
+            return None
+        if self.last_sent_time is not None and \
+                self.clock() - self.last_sent_time < self.min_interval:
+            return None
+        return self.pending
+
+    def is_significant(self, requirements: Scheduling) -> bool:
+        """
+        Checks if the requirements differ enough from the last sent ones
+
+        Args:
+            requirements (Scheduling): Requirements to be compared
+        """
+        if self.last_sent is None:
+            return True
+        if requirements.same_as(self.last_sent):
+            return False
+
+        old = self.last_sent.dict()
+        new = requirements.dict()
+        old_geo = old.pop("GEOLOCATION")
+        new_geo = new.pop("GEOLOCATION")
+        old_latency = old.pop("MAX_LATENCY")
+        new_latency = new.pop("MAX_LATENCY")
+
+        # Any other field is always significant
+        if old != new:
+            return True
+
+        if old_latency != new_latency:
+            if old_latency is None or new_latency is None:
+                return True
+            if abs(new_latency - old_latency) >= self.latency_threshold:
+                return True
+
+        if old_geo != new_geo:
+            old_point = parse_geolocation(old_geo)
+            new_point = parse_geolocation(new_geo)
+            if old_point is None or new_point is None:
+                return True
+            if geolocation_distance(old_point, new_point) >= self.geolocation_threshold:
+                return True
+
+        cognit_logger.debug("Requirements change is below the significance thresholds")
+        return False
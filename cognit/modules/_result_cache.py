@@ -0,0 +1,259 @@
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import cloudpickle as cp
+
+from cognit.modules._logger import CognitLogger
+
+cognit_logger = CognitLogger()
+
+PURE_ATTR = "__cognit_pure__"
+DEFAULT_MAX_BYTES = 64 << 20
+DISK_ENTRY_SUFFIX = ".res"
+
+def pure(fc: Callable) -> Callable:
+    """
+    Decorator that marks an offloaded function as pure: its result only depends
+    on its parameters, so DeviceRuntime may return a cached result for repeated
+    calls with equal parameters and requirements.
+
+    The globals the function reads are hashed with it the first time it is called
+    only. A pure function must not read globals that are later reassigned or
+    mutated (e.g. a rules dict): pass them as parameters instead, otherwise stale
+    results are returned.
+    """
+    setattr(fc, PURE_ATTR, True)
+    return fc
+
+def is_pure(fc: Callable) -> bool:
+    return getattr(fc, PURE_ATTR, False) is True
+
+def hash_params(params: tuple) -> Optional[str]:
+    """
+    Content hash of the parameters of a call, None if they cannot be pickled.
+    Equal values pickled differently (e.g. dicts in a different order) only
+    produce a cache miss.
+
+    Args:
+        params (tuple): Arguments of the function
+    """
+    digest = hashlib.sha256()
+    try:
+        for param in params:
+            blob = cp.dumps(param)
+            digest.update(len(blob).to_bytes(8, "little"))
+            digest.update(blob)
+    except Exception as e:
+        cognit_logger.debug(f"Parameters cannot be hashed, skipping the result cache: {e}")
+        return None
+    return digest.hexdigest()
+
+
+class _Entry:
+
+    def __init__(self, res: str, expires: Optional[float]):
+        self.res = res
+        self.expires = expires
+
+
+class ResultCache:
+    """
+    Results of pure offloaded functions, keyed by (function content hash,
+    parameters content hash, requirements digest). Entries are evicted in LRU
+    order to stay within a byte budget, and expire after a TTL. An optional
+    on-disk tier keeps them across restarts.
+
+    The cached value is the serialized result returned by the Edge Cluster
+    Frontend, so each hit is deserialized into a fresh object.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttl: Optional[float] = None,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 4 * DEFAULT_MAX_BYTES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            max_bytes (int): Memory budget of the cached results
+            ttl (float): Seconds after which a result is not returned anymore (None: never)
+            disk_path (str): Directory of the on-disk tier (None: memory only)
+            disk_max_bytes (int): Budget of the on-disk tier
+            clock (Callable): Monotonic time source of the memory tier
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self.clock = clock
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Content hash of each function object
+        self._function_hashes = weakref.WeakKeyDictionary()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_path is not None:
+            os.makedirs(disk_path, exist_ok=True)
+            self.disk_size = sum(entry.stat().st_size for entry in self._disk_entries())
+
+    def function_hash(self, fc: Callable, serialize: Callable[[Callable], str]) -> str:
+        """
+        Content hash of a function, including the globals and helpers shipped with it.
+        It is computed once per function object, later changes of its globals are
+        not seen (see pure()).
+
+        Args:
+            fc (Callable): Pure function
+            serialize (Callable): Serializer of offloaded functions
+        """
+        try:
+            return self._function_hashes[fc]
+        except (KeyError, TypeError):
+            pass
+        fc_hash = hashlib.sha256(serialize(fc).encode("utf-8")).hexdigest()
+        try:
+            self._function_hashes[fc] = fc_hash
+        except TypeError:
+            # Not weak referenceable
+            pass
+        return fc_hash
+
+    def make_key(self, fc_hash: str, params_hash: str, reqs_digest: str) -> str:
+        return hashlib.sha256(f"{fc_hash}:{params_hash}:{reqs_digest}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Serialized result cached for a key, if any
+
+        Args:
+            key (str): Key built by make_key
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires is not None and self.clock() >= entry.expires:
+                    self._remove(key)
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.res
+        res, remaining = self._disk_get(key) if self.disk_path is not None else (None, None)
+        with self._lock:
+            if res is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # Expires in memory when it would have expired on disk
+            self._insert(key, res, remaining)
+        return res
+
+    def put(self, key: str, res: str):
+        """
+        Caches the serialized result of a call
+
+        Args:
+            key (str): Key built by make_key
+            res (str): Serialized result returned by the Edge Cluster Frontend
+        """
+        if len(res) > self.max_bytes:
+            return
+        with self._lock:
+            self._insert(key, res)
+        if self.disk_path is not None:
+            self._disk_put(key, res)
+
+    def _insert(self, key: str, res: str, ttl: Optional[float] = None):
+        if key in self._entries:
+            self._remove(key)
+        ttl = ttl if ttl is not None else self.ttl
+        expires = self.clock() + ttl if ttl is not None else None
+        self._entries[key] = _Entry(res, expires)
+        self.size += len(res)
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.res)
+
+    def _disk_entries(self):
+        return [entry for entry in os.scandir(self.disk_path) if entry.name.endswith(DISK_ENTRY_SUFFIX)]
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, key + DISK_ENTRY_SUFFIX)
+
+    def _disk_get(self, key: str) -> Tuple[Optional[str], Optional[float]]:
+        """
+        Serialized result stored on disk for a key and the seconds left before it
+        expires (None if there is no TTL)
+        """
+        path = self._disk_file(key)
+        remaining = None
+        try:
+            if self.ttl is not None:
+                remaining = self.ttl - (time.time() - os.path.getmtime(path))
+                if remaining <= 0:
+                    return None, None
+            with open(path, "r") as f:
+                return f.read(), remaining
+        except OSError:
+            return None, None
+
+    def _disk_put(self, key: str, res: str):
+        path = self._disk_file(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            # Overwritten entries only count once
+            replaced_size = os.path.getsize(path)
+        except OSError:
+            replaced_size = 0
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(res)
+            # Readers never see partial entries
+            os.replace(tmp_path, path)
+        except OSError as e:
+            cognit_logger.warning(f"Result could not be cached on disk: {e}")
+            return
+        with self._lock:
+            self.disk_size += len(res) - replaced_size
+            if self.disk_size > self.disk_max_bytes:
+                self._disk_evict()
+
+    def _disk_evict(self):
+        entries = sorted(self._disk_entries(), key=lambda entry: entry.stat().st_mtime)
+        self.disk_size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.disk_size <= self.disk_max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self.disk_size -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            if self.disk_path is not None:
+                for entry in self._disk_entries():
+                    os.remove(entry.path)
+                self.disk_size = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from cognit.models._cognit_frontend_client import Scheduling
+
+DEFAULT_MAX_ENTRIES = 64
+
+def freeze_requirements(value: Any) -> Hashable:
+    """
+    Normalizes a requirements dict into a hashable value. Dicts are
+    order independent, lists and tuples keep their order.
+
+    Args:
+        value: Requirements dict or any of its values
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze_requirements(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (list,) + tuple(freeze_requirements(item) for item in value)
+    # Keep the type so that 1, 1.0 and True are different keys
+    return (value.__class__, value)
+
+
+class SchedulingCache:
+    """
+    Memoizes the construction of Scheduling objects from requirement dicts.
+    The same Scheduling instance is returned for equal dicts, so that
+    unchanged requirements can be detected by identity.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            max_entries (int): Maximum number of Scheduling objects kept (LRU)
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, reqs: dict) -> Scheduling:
+        """
+        Returns the validated Scheduling object for the requirements dict
+
+        Args:
+            reqs (dict): Requirements to be converted
+        Raises:
+            pydantic.ValidationError if the requirements are not valid
+        """
+        try:
+            key = freeze_requirements(reqs)
+            scheduling = self._entries.get(key)
+        except TypeError:
+            # Unhashable values, skip the cache
+            return Scheduling(**reqs)
+
+        if scheduling is not None:
+            self._entries.move_to_end(key)
+            return scheduling
+
+        scheduling = Scheduling(**reqs)
+        # Precompute the values used by the change detection and the uploads
+        scheduling.digest()
+        scheduling.body()
+        self._entries[key] = scheduling
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return scheduling
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
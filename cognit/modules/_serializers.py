@@ -0,0 +1,283 @@
+import builtins
+import importlib.util
+import types
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# Encoded values travel as bytes: magic + content-type tag + payload
+ENVELOPE_MAGIC = b"CGNT"
+HEADER_SIZE = len(ENVELOPE_MAGIC) + 1
+
+# The encoders and decoders below are also shipped by value to the serverless
+# runtime, so they must only rely on their own imports (no module globals).
+
+def _encode_cloudpickle(value: Any) -> bytes:
+    import cloudpickle
+    return cloudpickle.dumps(value)
+
+def _decode_cloudpickle(payload: memoryview) -> Any:
+    import pickle
+    return pickle.loads(payload)
+
+def _encode_pickle5(value: Any) -> bytes:
+    # Frame: number of buffers, the sizes of the pickle and of each buffer, the
+    # pickle and the raw buffers. Buffers are not copied into the pickle stream.
+    import pickle
+    buffers = []
+    head = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    sizes = [len(head)] + [raw.nbytes for raw in raws]
+    frame = [len(raws).to_bytes(4, "little")] + [size.to_bytes(8, "little") for size in sizes]
+    return b"".join(frame + [head] + raws)
+
+def _decode_pickle5(payload: memoryview) -> Any:
+    import pickle
+    count = int.from_bytes(payload[:4], "little")
+    offset = 4 + 8 * (count + 1)
+    views = []
+    for i in range(count + 1):
+        size = int.from_bytes(payload[4 + 8 * i:12 + 8 * i], "little")
+        views.append(payload[offset:offset + size])
+        offset += size
+    # Out-of-band buffers are views over the payload (zero-copy)
+    return pickle.loads(views[0], buffers=views[1:])
+
+def _encode_msgpack(value: Any) -> bytes:
+    import msgpack
+    # strict_types: tuples and subclasses are rejected instead of being
+    # silently turned into lists or base types
+    return msgpack.packb(value, use_bin_type=True, strict_types=True)
+
+def _decode_msgpack(payload: memoryview) -> Any:
+    import msgpack
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+def _encode_json(value: Any) -> bytes:
+    import json
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+def _decode_json(payload: memoryview) -> Any:
+    import json
+    return json.loads(bytes(payload))
+
+def _encode_ndarray(value: Any) -> bytes:
+    import json
+    import numpy
+    array = numpy.ascontiguousarray(value)
+    if array.dtype.hasobject:
+        raise TypeError("Arrays of objects cannot be encoded as raw buffers")
+    meta = json.dumps({"dtype": array.dtype.str, "shape": array.shape}).encode("utf-8")
+    return len(meta).to_bytes(4, "little") + meta + array.tobytes()
+
+def _decode_ndarray(payload: memoryview) -> Any:
+    import json
+    import numpy
+    meta_len = int.from_bytes(payload[:4], "little")
+    meta = json.loads(bytes(payload[4:4 + meta_len]))
+    # Zero-copy view over the received buffer
+    array = numpy.frombuffer(payload[4 + meta_len:], dtype=numpy.dtype(meta["dtype"]))
+    return array.reshape(meta["shape"])
+
+def _encode_arrow(value: Any) -> bytes:
+    import pyarrow
+    table = value
+    if not isinstance(value, pyarrow.Table):
+        table = pyarrow.Table.from_pandas(value)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _decode_arrow(payload: memoryview) -> Any:
+    import pyarrow
+    table = pyarrow.ipc.open_stream(pyarrow.py_buffer(payload)).read_all()
+    # Frames encoded from pandas come back as pandas
+    if table.schema.metadata and b"pandas" in table.schema.metadata:
+        return table.to_pandas()
+    return table
+
+def _accepts_buffers(value: Any) -> bool:
+    # numpy arrays and other values exposing large contiguous buffers
+    return type(value).__module__ == "numpy" and hasattr(value, "__array_interface__")
+
+def _accepts_plain_data(value: Any) -> bool:
+    return type(value) in (list, dict)
+
+def _accepts_table(value: Any) -> bool:
+    module = type(value).__module__
+    return type(value).__name__ in ("DataFrame", "Table") and module.split(".")[0] in ("pandas", "pyarrow")
+
+def _never(value: Any) -> bool:
+    return False
+
+def detach(fc: types.FunctionType) -> types.FunctionType:
+    """
+    Copy of fc bound to fresh globals, so that cloudpickle ships it by value
+    without referencing the module it was defined in
+    """
+    copy = types.FunctionType(fc.__code__, {"__builtins__": builtins}, fc.__name__, fc.__defaults__, fc.__closure__)
+    copy.__qualname__ = fc.__qualname__
+    return copy
+
+def _make_envelope_decoder(decode: Callable, header: bytes, writable: bool) -> Callable:
+    def decode_envelope(blob):
+        if blob[:len(header)] != header:
+            raise ValueError(f"Unexpected content-type header: {bytes(blob[:len(header)])}")
+        view = memoryview(bytearray(blob) if writable else blob)
+        return decode(view[len(header):])
+    return detach(decode_envelope)
+
+
+class Serializer:
+    """
+    A codec of the registry
+
+    Args:
+        name (str): Name of the codec
+        tag (bytes): One byte content-type tag written on the wire
+        encode (Callable): value -> bytes, must be self-contained
+        decode (Callable): memoryview -> value, must be self-contained
+        accepts (Callable): Whether the codec is a candidate to encode a value
+        modules (tuple): Modules the codec needs, locally and on the serverless runtime
+    """
+
+    def __init__(
+        self,
+        name: str,
+        tag: bytes,
+        encode: Callable,
+        decode: Callable,
+        accepts: Callable = _never,
+        modules: Tuple[str, ...] = ()
+    ):
+        if len(tag) != 1:
+            raise ValueError("Content-type tags are one byte long")
+        self.name = name
+        self.tag = tag
+        self.encode = encode
+        self.decode = decode
+        self.accepts = accepts
+        self.modules = modules
+
+    @property
+    def header(self) -> bytes:
+        return ENVELOPE_MAGIC + self.tag
+
+    def is_available(self) -> bool:
+        return all(importlib.util.find_spec(module) is not None for module in self.modules)
+
+    def __repr__(self) -> str:
+        return f"Serializer({self.name!r}, {self.tag!r})"
+
+
+CLOUDPICKLE = Serializer("cloudpickle", b"C", _encode_cloudpickle, _decode_cloudpickle, modules=("cloudpickle",))
+PICKLE5 = Serializer("pickle5", b"P", _encode_pickle5, _decode_pickle5, _accepts_buffers)
+MSGPACK = Serializer("msgpack", b"M", _encode_msgpack, _decode_msgpack, _accepts_plain_data, ("msgpack",))
+JSON = Serializer("json", b"J", _encode_json, _decode_json)
+NDARRAY = Serializer("ndarray", b"N", _encode_ndarray, _decode_ndarray, modules=("numpy",))
+ARROW = Serializer("arrow", b"A", _encode_arrow, _decode_arrow, _accepts_table, ("pyarrow",))
+
+
+class SerializerRegistry:
+    """
+    Codecs known by the parser, by name and by content-type tag. Values are
+    encoded with the first registered codec that accepts them, cloudpickle
+    being the fallback for everything else.
+    """
+
+    def __init__(self, serializers: Iterable[Serializer] = ()):
+        self._by_name: Dict[str, Serializer] = {}
+        self._by_tag: Dict[bytes, Serializer] = {}
+        self._decoders: Dict[Tuple[bytes, bool], Callable] = {}
+        self.register(CLOUDPICKLE)
+        for serializer in serializers:
+            self.register(serializer)
+
+    def register(self, serializer: Serializer):
+        """
+        Registers a codec. Codecs whose modules are not installed are ignored.
+
+        Args:
+            serializer (Serializer): Codec to be registered
+        """
+        if not serializer.is_available():
+            return
+        previous = self._by_tag.get(serializer.tag)
+        if previous is not None and previous.name != serializer.name:
+            raise ValueError(f"Tag {serializer.tag} is already used by {previous.name}")
+        self._by_name[serializer.name] = serializer
+        self._by_tag[serializer.tag] = serializer
+
+    def get(self, name: str) -> Optional[Serializer]:
+        return self._by_name.get(name)
+
+    @property
+    def names(self) -> list:
+        return list(self._by_name)
+
+    def select(self, value: Any) -> Serializer:
+        """
+        Best codec for a value
+
+        Args:
+            value: Value to be encoded
+        """
+        for serializer in self._by_name.values():
+            if serializer.accepts(value):
+                return serializer
+        return CLOUDPICKLE
+
+    def encode(self, value: Any, serializer: Optional[Serializer] = None) -> bytes:
+        """
+        Encodes a value in an envelope: magic + content-type tag + payload
+
+        Args:
+            value: Value to be encoded
+            serializer (Serializer): Codec to use, selected from the value if None
+        """
+        serializer = serializer or self.select(value)
+        return serializer.header + serializer.encode(value)
+
+    def decode(self, blob: bytes) -> Any:
+        """
+        Decodes an envelope produced by encode()
+
+        Args:
+            blob (bytes): magic + content-type tag + payload
+        """
+        if not is_envelope(blob):
+            raise ValueError("Not an encoded value")
+        tag = bytes(blob[len(ENVELOPE_MAGIC):HEADER_SIZE])
+        serializer = self._by_tag.get(tag)
+        if serializer is None:
+            raise ValueError(f"Unknown content-type tag: {tag}")
+        return serializer.decode(memoryview(blob)[HEADER_SIZE:])
+
+    def remote_decoder(self, serializer: Serializer, writable: bool = True) -> Callable:
+        """
+        Self-contained function that decodes the envelopes of a codec on the
+        serverless runtime. The decoded values own their buffers when writable
+        is set, so that the offloaded function can modify them.
+
+        Args:
+            serializer (Serializer): Codec of the envelopes
+            writable (bool): Copy the payload before decoding it
+        """
+        key = (serializer.tag, writable)
+        decoder = self._decoders.get(key)
+        if decoder is None:
+            decoder = _make_envelope_decoder(detach(serializer.decode), serializer.header, writable)
+            self._decoders[key] = decoder
+        return decoder
+
+
+def is_envelope(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:len(ENVELOPE_MAGIC)]) == ENVELOPE_MAGIC
+
+def default_registry() -> SerializerRegistry:
+    """
+    Registry with the codecs picked per value type: Arrow IPC for tables (its
+    format does not depend on the pandas version of each side), pickle protocol 5
+    with out-of-band buffers for arrays and msgpack for plain data. JSON and raw
+    arrays are only used for declared result encodings.
+    """
+    return SerializerRegistry([ARROW, PICKLE5, MSGPACK, JSON, NDARRAY])
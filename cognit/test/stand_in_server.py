@@ -0,0 +1,354 @@
+"""Local stand-in for the Cognit Frontend and the Edge Cluster Frontend.
+
+Implements the endpoints used by the Device Runtime and executes the offloaded
+functions in a local worker pool, so DeviceRuntime can be tested and benchmarked
+offline. Latency, bandwidth and failures can be injected to get repeatable
+network conditions.
+
+Usage:
+    python cognit/test/stand_in_server.py --port 1338 --latency 0.02 --failure-rate 0.01
+
+The Device Runtime is pointed to it with a configuration file whose api_endpoint
+is the server URL (see StandInServer.write_config).
+
+It is built on http.server rather than FastAPI and uvicorn: it starts and stops
+within a test in the same process, on a free port, without an event loop, and
+the delays it injects are plain sleeps in the request threads.
+"""
+import argparse
+import base64 as b64
+import importlib
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.append(".")
+
+import cloudpickle as cp
+
+CREDENTIALS = "stand-in:stand-in"
+EXECUTE_PATH = re.compile(r"^/v1/functions/(\d+)/execute$")
+APP_REQUIREMENTS_PATH = re.compile(r"^/v1/app_requirements/(\d+)$")
+EC_FE_PATH = re.compile(r"^/v1/app_requirements/(\d+)/ec_fe$")
+
+@dataclass
+class NetworkProfile:
+    """
+    Network conditions injected in every response of the server
+
+    Args:
+        latency (float): Delay in seconds added to every request
+        jitter (float): Maximum random delay in seconds added to the latency
+        bandwidth (float): Bytes per second of the request and response bodies, unlimited if None
+        failure_rate (float): Probability of answering a request with 503
+        execution_failure_rate (float): Probability of a function execution failing
+        seed (int): Seed of the random injections, for repeatable runs
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    bandwidth: Optional[float] = None
+    failure_rate: float = 0.0
+    execution_failure_rate: float = 0.0
+    seed: int = 0
+
+def execute_function(fc: str, params: List[str]):
+    """
+    Runs an uploaded function as the serverless runtime does. Returns (ret_code, res, err).
+    """
+    try:
+        function = cp.loads(b64.b64decode(fc))
+        args = [cp.loads(b64.b64decode(param)) for param in params]
+        result = function(*args)
+        return 0, b64.b64encode(cp.dumps(result)).decode("utf-8"), None
+    except Exception as e:
+        return -1, None, f"{type(e).__name__}: {e}"
+
+
+class StandInServer:
+    """
+    Cognit Frontend and Edge Cluster Frontend served from the same local port
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        profile: NetworkProfile = None,
+        workers: int = 4,
+        processes: bool = False,
+        credentials: str = CREDENTIALS,
+        ecf_addresses: List[str] = None
+    ):
+        """
+        Args:
+            host (str): Interface to listen on
+            port (int): Port to listen on, any free port if 0
+            profile (NetworkProfile): Injected network conditions
+            workers (int): Size of the pool executing the functions
+            processes (bool): Execute the functions in worker processes instead of threads
+            credentials (str): "user:password" accepted by /v1/authenticate
+            ecf_addresses (List[str]): Edge Cluster Frontends returned by the ec_fe
+            endpoint, best first. The server itself if None.
+        """
+        self.profile = profile if profile is not None else NetworkProfile()
+        self.credentials = credentials
+        self.random = random.Random(self.profile.seed)
+        self.random_lock = threading.Lock()
+        self.executor: Executor = ProcessPoolExecutor(workers) if processes else ThreadPoolExecutor(workers)
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stand_in = self
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.ecf_addresses = ecf_addresses
+        self.thread = None
+        # State of the frontends
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.tokens = set()
+        self.app_requirements = {}
+        self.functions = {}
+        self.function_ids = {}
+        # Number of requests by endpoint and of injected failures
+        self.counters = {}
+
+    def start(self) -> "StandInServer":
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever,
+            kwargs={"poll_interval": 0.05},
+            name="stand-in-server",
+            daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "StandInServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def write_config(self, path: str) -> str:
+        """
+        Writes a Device Runtime configuration file pointing to the server
+        """
+        with open(path, "w") as f:
+            f.write(f'api_endpoint: "{self.url}"\ncredentials: "{self.credentials}"\n')
+        return path
+
+    def revoke_tokens(self):
+        """
+        Invalidates the issued tokens, the clients must authenticate again
+        """
+        with self.lock:
+            self.tokens.clear()
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def roll(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self.random_lock:
+            return self.random.random() < probability
+
+    def delay(self, transferred: int) -> float:
+        """
+        Delay in seconds of a request given the size of its bodies
+        """
+        delay = self.profile.latency
+        if self.profile.jitter > 0:
+            with self.random_lock:
+                delay += self.random.uniform(0, self.profile.jitter)
+        if self.profile.bandwidth:
+            delay += transferred / self.profile.bandwidth
+        return delay
+
+    def new_token(self) -> str:
+        token = f"stand-in-token-{next(self.ids)}"
+        with self.lock:
+            self.tokens.add(token)
+        return token
+
+    def is_token_valid(self, token: Optional[str]) -> bool:
+        with self.lock:
+            return token in self.tokens
+
+    def ec_fe_list(self) -> list:
+        addresses = self.ecf_addresses if self.ecf_addresses is not None else [self.url]
+        return [
+            {"ID": i, "NAME": f"stand-in-{i}", "HOSTS": [], "DATASTORES": [], "VNETS": [],
+             "TEMPLATE": {"EDGE_CLUSTER_FRONTEND": address}}
+            for i, address in enumerate(addresses)
+        ]
+
+    def upload_function(self, fc: dict) -> int:
+        with self.lock:
+            function_id = self.function_ids.get(fc["FC_HASH"])
+            if function_id is None:
+                function_id = self.function_ids[fc["FC_HASH"]] = next(self.ids)
+                self.functions[function_id] = fc["FC"]
+        for module in fc.get("FC_IMPORTS") or []:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+        return function_id
+
+    def execute(self, function_id: int, params: List[str]) -> dict:
+        with self.lock:
+            fc = self.functions.get(function_id)
+        if fc is None:
+            return {"ret_code": -1, "res": None, "err": f"Function {function_id} not found"}
+        if self.roll(self.profile.execution_failure_rate):
+            self.count("injected_execution_failures")
+            return {"ret_code": -1, "res": None, "err": "Injected execution failure"}
+        ret_code, res, err = self.executor.submit(execute_function, fc, params).result()
+        return {"ret_code": ret_code, "res": res, "err": err}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method: str):
+        server: StandInServer = self.server.stand_in
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        endpoint = f"{method} {self._route(url.path)}"
+        server.count(endpoint)
+        if server.roll(server.profile.failure_rate):
+            server.count("injected_failures")
+            self._reply(503, {"detail": "Injected failure"}, len(body))
+            return
+        try:
+            status, payload = self._dispatch(server, method, url, body)
+        except (ValueError, KeyError) as e:
+            status, payload = 400, {"detail": str(e)}
+        self._reply(status, payload, len(body))
+
+    def _route(self, path: str) -> str:
+        if EXECUTE_PATH.match(path):
+            return "/v1/functions/{id}/execute"
+        if EC_FE_PATH.match(path):
+            return "/v1/app_requirements/{id}/ec_fe"
+        if APP_REQUIREMENTS_PATH.match(path):
+            return "/v1/app_requirements/{id}"
+        return path
+
+    def _dispatch(self, server: StandInServer, method: str, url, body: bytes):
+        path = url.path
+        if method == "POST" and path == "/v1/authenticate":
+            auth = self.headers.get("Authorization", "")
+            if not auth.startswith("Basic ") or b64.b64decode(auth[6:]).decode("utf-8") != server.credentials:
+                return 401, {"detail": "Invalid credentials"}
+            return 201, server.new_token()
+        if not server.is_token_valid(self.headers.get("token")):
+            return 401, {"detail": "Invalid token"}
+
+        if method == "POST" and path == "/v1/app_requirements":
+            app_req_id = next(server.ids)
+            server.app_requirements[app_req_id] = json.loads(body)
+            return 200, app_req_id
+        if method == "POST" and path == "/v1/daas/upload":
+            return 200, server.upload_function(json.loads(body))
+        match = EXECUTE_PATH.match(path)
+        if method == "POST" and match:
+            mode = parse_qs(url.query).get("mode", ["sync"])[0]
+            if mode != "sync":
+                return 400, {"detail": f"Mode {mode} is not supported"}
+            return 200, server.execute(int(match.group(1)), json.loads(body))
+        match = EC_FE_PATH.match(path)
+        if method == "GET" and match:
+            if int(match.group(1)) not in server.app_requirements:
+                return 404, {"detail": "Requirements not found"}
+            return 200, server.ec_fe_list()
+        match = APP_REQUIREMENTS_PATH.match(path)
+        if match:
+            app_req_id = int(match.group(1))
+            if app_req_id not in server.app_requirements:
+                return 404, {"detail": f"[one.document.info] Error getting document [{app_req_id}]."}
+            if method == "GET":
+                return 200, server.app_requirements[app_req_id]
+            if method == "PUT":
+                server.app_requirements[app_req_id] = json.loads(body)
+                return 200, None
+            if method == "DELETE":
+                del server.app_requirements[app_req_id]
+                return 204, None
+        return 404, {"detail": "Not found"}
+
+    def _reply(self, status: int, payload, received: int):
+        data = b"" if status == 204 else json.dumps(payload).encode("utf-8")
+        delay = self.server.stand_in.delay(received + len(data))
+        if delay > 0:
+            time.sleep(delay)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1338)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, default=None, help="Bytes per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--execution-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--processes", action="store_true")
+    args = parser.parse_args()
+
+    profile = NetworkProfile(
+        latency=args.latency,
+        jitter=args.jitter,
+        bandwidth=args.bandwidth,
+        failure_rate=args.failure_rate,
+        execution_failure_rate=args.execution_failure_rate,
+        seed=args.seed
+    )
+    server = StandInServer(args.host, args.port, profile, args.workers, args.processes)
+    print(f"Stand-in Cognit Frontend and Edge Cluster Frontend listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from pytest_mock import MockerFixture
 from cognit.modules._cognitconfig import CognitConfig
@@ -121,7 +125,18 @@ def test_app_req_update(cognit_client, mock_update_request):
     new_reqs = Scheduling(**REQS_NEW)
     success = cognit_client._app_req_update(new_reqs)
     assert success is True
+    assert cognit_client.placement_changed is True
     
+# Test _app_req_update method when the Cognit Frontend keeps the placement
+def test_app_req_update_placement_unchanged(cognit_client, mocker):
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = {"PLACEMENT_CHANGED": False}
+    mocker.patch("requests.put", return_value=mock_response)
+    success = cognit_client._app_req_update(Scheduling(**REQS_NEW))
+    assert success is True
+    assert cognit_client.placement_changed is False
+
 # Test _app_req_update method with wrong requirements
 def test_app_req_update_failure(cognit_client, mock_update_request):
     wrong_reqs = Scheduling(**REQS_WRONG)
@@ -164,3 +179,31 @@ def test_fc_upload(cognit_client, mock_upload_fc_request):
         
     _, cognit_fc_id = cognit_client._serialize_and_upload_fc_to_daas_gw(dummy)
     assert cognit_fc_id is not None
+
+def test_concurrent_fc_upload_uploads_once(cognit_client, mocker):
+    def slow_upload(fc, deadline=None):
+        time.sleep(0.05)
+        return TEST_CFE_RESPONSES["fun_upload"]["body"]
+    mock_upload = mocker.patch.object(cognit_client, "_upload_fc", side_effect=slow_upload)
+    def dummy():
+        print("Test")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: cognit_client._serialize_and_upload_fc_to_daas_gw(dummy), range(8)))
+
+    assert mock_upload.call_count == 1
+    assert all(cognit_fc_id == TEST_CFE_RESPONSES["fun_upload"]["body"] for _, cognit_fc_id in results)
+
+# Test _get_edge_cluster_address keeps every ECFE of the list, best first
+def test_get_edge_cluster_address(cognit_client, mocker):
+    clusters = [
+        {"ID": i, "NAME": f"cluster{i}", "HOSTS": [], "DATASTORES": [], "VNETS": [],
+         "TEMPLATE": {"EDGE_CLUSTER_FRONTEND": f"http://ecf{i}:1339"}}
+        for i in range(2)
+    ]
+    mock_response = mocker.Mock()
+    mock_response.status_code = 200
+    mock_response.json.return_value = clusters
+    mocker.patch("requests.get", return_value=mock_response)
+    assert cognit_client._get_edge_cluster_address() == "http://ecf0:1339"
+    assert cognit_client.ec_fe_list == ["http://ecf0:1339", "http://ecf1:1339"]
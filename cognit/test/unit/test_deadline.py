@@ -0,0 +1,106 @@
+from unittest.mock import MagicMock
+
+import time
+
+import pytest
+import requests as req
+from pytest_mock import MockerFixture
+
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._cognit_frontend_client import Scheduling
+from cognit.models._edge_cluster_frontend_client import ExecReturnCode, ExecutionMode
+from cognit.modules._deadline import (
+    CONNECT_TIMEOUT, DEADLINE_HEADER, REQ_TIMEOUT,
+    Deadline, DeadlineExceeded, deadline_budget, request_timeout
+)
+from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClient
+from cognit.modules._outbox import Outbox
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_deadline_budget():
+    # Only explicitly set requirements are taken into account
+    assert deadline_budget(Scheduling(FLAVOUR="Energy")) == REQ_TIMEOUT
+    assert deadline_budget(None) == REQ_TIMEOUT
+    assert deadline_budget(Scheduling(FLAVOUR="Energy", MAX_FUNCTION_EXECUTION_TIME=2.0)) == 3.0
+    reqs = Scheduling(FLAVOUR="Energy", MAX_FUNCTION_EXECUTION_TIME=2.0, MAX_LATENCY=500, GEOLOCATION="here")
+    assert deadline_budget(reqs) == 4.0
+    # Declared budgets above the default timeout are kept
+    assert deadline_budget(Scheduling(FLAVOUR="Energy", MAX_FUNCTION_EXECUTION_TIME=600.0)) == 601.0
+    # An explicit timeout overrides the requirements
+    assert deadline_budget(reqs, timeout=120) == 120
+
+def test_deadline_phases():
+    clock = FakeClock()
+    deadline = Deadline(10.0, reserve=6.0, clock=clock)
+    # The upload cannot use the time reserved for the execution
+    assert deadline.timeout("function upload") == (CONNECT_TIMEOUT, 4.0)
+    clock.now = 3.0
+    assert deadline.timeout("function execution", execution=True) == (CONNECT_TIMEOUT, 7.0)
+    assert deadline.header() == {DEADLINE_HEADER: "7000"}
+    clock.now = 9.0
+    assert deadline.timeout("function execution", execution=True) == (1.0, 1.0)
+    clock.now = 10.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout("function execution", execution=True)
+
+def test_request_timeout_without_deadline():
+    assert request_timeout(None, "authentication") == (CONNECT_TIMEOUT, REQ_TIMEOUT)
+
+def test_execute_function_sends_deadline(mocker: MockerFixture):
+    ecf = EdgeClusterFrontendClient("the_token", "http://the_address")
+    mock_resp = mocker.Mock()
+    mock_resp.content = b'{"ret_code": 0, "res": "3", "err": null}'
+    mock_post = mocker.patch("requests.post", return_value=mock_resp)
+    clock = FakeClock()
+    ecf.execute_function("123", 123, ExecutionMode.SYNC, (1,), deadline=Deadline(5.0, clock=clock))
+    assert mock_post.call_args.kwargs["headers"] == {"token": "the_token", DEADLINE_HEADER: "5000"}
+    assert mock_post.call_args.kwargs["timeout"] == (CONNECT_TIMEOUT, 5.0)
+    # Without deadline the default timeouts apply
+    ecf.execute_function("123", 123, ExecutionMode.SYNC, (1,))
+    assert mock_post.call_args.kwargs["headers"] == {"token": "the_token"}
+    assert mock_post.call_args.kwargs["timeout"] == (CONNECT_TIMEOUT, REQ_TIMEOUT)
+
+def add(a, b):
+    return a + b
+
+@pytest.fixture
+def device_runtime() -> DeviceRuntime:
+    runtime = DeviceRuntime("cognit/test/config/cognit_v2.yml")
+    runtime.device_runtime_sm = MagicMock()
+    runtime.device_runtime_sm.requirements = Scheduling(FLAVOUR="Energy", MAX_FUNCTION_EXECUTION_TIME=2.0)
+    return runtime
+
+def test_call_returns_timeout(device_runtime: DeviceRuntime):
+    sm = device_runtime.device_runtime_sm
+    sm.offload_function.side_effect = req.exceptions.ReadTimeout("Read timed out")
+    ret_code, err = device_runtime.call(add, 1, 2)
+    assert ret_code == ExecReturnCode.TIMEOUT
+    assert "Read timed out" in err
+    deadline = sm.offload_function.call_args.kwargs["deadline"]
+    assert deadline.budget == 3.0 and deadline.reserve == 2.0
+    # Explicit timeout
+    sm.offload_function.side_effect = DeadlineExceeded("Deadline exceeded")
+    assert device_runtime.call(add, 1, 2, timeout=0.5)[0] == ExecReturnCode.TIMEOUT
+    assert sm.offload_function.call_args.kwargs["deadline"].budget == 0.5
+
+def test_deadline_starts_once_ready(device_runtime: DeviceRuntime, tmp_path):
+    device_runtime.outbox = Outbox(str(tmp_path / "outbox.jsonl"))
+    sm = device_runtime.device_runtime_sm
+    # Waits for the transitions of another thread
+    sm.ensure_ready.side_effect = lambda max_transitions: time.sleep(0.2) or True
+    remaining = []
+
+    def offload_function(*params, deadline: Deadline):
+        remaining.append(deadline.remaining())
+        raise DeadlineExceeded("Deadline exceeded")
+
+    sm.offload_function.side_effect = offload_function
+    assert device_runtime.call(add, 1, 2, timeout=0.1)[0] == ExecReturnCode.TIMEOUT
+    device_runtime.outbox.close()
+    assert remaining[0] > 0.05
@@ -0,0 +1,78 @@
+import base64 as b64
+import re
+import subprocess
+import sys
+
+import cloudpickle as cp
+import pytest
+
+from cognit.modules._dependency_analyzer import DependencyAnalyzer, is_local_module
+from cognit.modules._faas_parser import FaasParser
+
+LINE_REGEX = re.compile(r"user (\w+)")
+UNUSED_CONSTANT = "This global is never shipped"
+
+def extract_user(line):
+    match = LINE_REGEX.search(line)
+    return match.group(1) if match else None
+
+def count_users(lines):
+    import json
+    users = [extract_user(line) for line in lines]
+    return json.dumps(sorted({user for user in users if user}))
+
+def factorial(n):
+    return 1 if n <= 1 else n * factorial(n - 1)
+
+@pytest.fixture
+def analyzer() -> DependencyAnalyzer:
+    return DependencyAnalyzer()
+
+def test_is_local_module():
+    assert is_local_module(__name__)
+    assert not is_local_module("re")
+    assert not is_local_module("cloudpickle")
+    assert not is_local_module("sys")
+
+def test_analyze(analyzer: DependencyAnalyzer):
+    dependencies = analyzer.analyze(count_users)
+    assert set(dependencies.globals) == {"extract_user", "LINE_REGEX"}
+    assert dependencies.helpers == {"extract_user": extract_user}
+    assert dependencies.imports == ["json"]
+
+def test_analyze_module_global(analyzer: DependencyAnalyzer):
+    def uses_module():
+        return re.escape(".")
+    assert analyzer.analyze(uses_module).imports == ["re"]
+
+def test_rebind_keeps_live_globals(analyzer: DependencyAnalyzer):
+    copy = analyzer.rebind(count_users)
+    assert copy is not count_users
+    assert set(copy.__globals__) == {"__builtins__", "extract_user"}
+    # The helper is copied as well, the module namespace is untouched
+    helper_copy = copy.__globals__["extract_user"]
+    assert helper_copy is not extract_user
+    assert set(helper_copy.__globals__) == {"__builtins__", "LINE_REGEX"}
+    assert globals()["extract_user"] is extract_user
+    assert "UNUSED_CONSTANT" in globals()
+    assert copy(["session opened for user root"]) == '["root"]'
+
+def test_rebind_recursive_helper(analyzer: DependencyAnalyzer):
+    copy = analyzer.rebind(factorial)
+    assert copy.__globals__["factorial"] is copy
+    assert copy(5) == 120
+
+def test_serialized_function_runs_without_its_module():
+    serialized = FaasParser().serialize(count_users)
+    assert b"UNUSED_CONSTANT" not in b64.b64decode(serialized)
+    # Run it in an interpreter that cannot import this test module
+    script = (
+        "import base64, sys, cloudpickle;"
+        "fc = cloudpickle.loads(base64.b64decode(sys.stdin.read()));"
+        "print(fc(['Failed password for user admin', 'user root']))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        input=serialized, capture_output=True, text=True, cwd="/", check=True
+    )
+    assert output.stdout.strip() == '["admin", "root"]'
@@ -3,6 +3,11 @@ from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClie
 from cognit.modules._device_runtime_state_machine import DeviceRuntimeStateMachine
 from cognit.models._cognit_frontend_client import *
 
+import threading
+import time
+
+import requests as req
+
 from pytest_mock import MockerFixture
 import pytest
 
@@ -159,7 +164,7 @@ def test_execute_function_offloading(mocker: MockerFixture, init_state_machine:
     assert result.err is None
     assert result.res == "mocked_result"
     # Verify that the correct methods were called
-    mock_ecf.execute_function.assert_called_once_with("app_req_id", "func_id", "sync", (2,))
+    mock_ecf.execute_function.assert_called_once_with("app_req_id", "func_id", "sync", (2,), deadline=None)
 
 # Tests for offload_function
 
@@ -171,7 +176,7 @@ def test_offload_function_success_in_ready(mocker: MockerFixture, ready_state_ma
     test_func = lambda x: x + 1
     result = ready_state_machine.offload_function(test_func, 2)
     # Assertions
-    mock_execute_function.assert_called_once_with(test_func, 2)
+    mock_execute_function.assert_called_once_with(test_func, 2, deadline=None)
     assert result == "mocked_result"
 
 # Test offload_function if the state machine is not in READY state
@@ -190,7 +195,7 @@ def test_offload_function_when_not_ready(mocker: MockerFixture, init_state_machi
     assert init_state_machine.ecc_address == "mocked_ecf_address"
     assert init_state_machine.token == "mocked_token"
     assert init_state_machine.current_state == init_state_machine.ready
-    mock_execute_function.assert_called_once_with(test_func, 2)
+    mock_execute_function.assert_called_once_with(test_func, 2, deadline=None)
     assert result == "mocked_result"
     
 # Test if result was not given
@@ -322,3 +327,94 @@ def test_update_requirements_limit_reached(
     mock_logger.error.assert_called_with(
         "Number of attempts reached: unable to upload requirements. State machine is now in init state."
     )
+
+def test_update_requirements_existing_app_req_uses_update(
+        mocker: MockerFixture, 
+        ready_state_machine: DeviceRuntimeStateMachine, 
+        new_requirements: Scheduling
+    ):
+    # The requirements document already exists in the Cognit Frontend
+    ready_state_machine.cfc.app_req_id = 4123
+    mock_init = mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient.init", return_value=True)
+    mock_update = mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._app_req_update", return_value=True)
+    # Test function
+    ready_state_machine.update_requirements(new_requirements)
+    # Assertions
+    mock_update.assert_called_once_with(new_requirements)
+    mock_init.assert_not_called()
+    assert ready_state_machine.cfc.app_req_id == 4123
+    assert ready_state_machine.current_state.id == "get_ecf_address"
+
+def test_update_requirements_placement_unchanged_keeps_ecf(
+        mocker: MockerFixture, 
+        ready_state_machine: DeviceRuntimeStateMachine, 
+        new_requirements: Scheduling
+    ):
+    ready_state_machine.cfc.app_req_id = 4123
+    previous_ecf = ready_state_machine.ecf
+    # The Cognit Frontend reports the placement did not change
+    def update_without_replacement(new_reqs):
+        ready_state_machine.cfc.placement_changed = False
+        return True
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._app_req_update", side_effect=update_without_replacement)
+    mock_get_address = mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._get_edge_cluster_address", return_value="other_ecf_address")
+    # Test function
+    ready_state_machine.update_requirements(new_requirements)
+    # Assertions
+    mock_get_address.assert_not_called()
+    assert ready_state_machine.ecf is previous_ecf
+    assert ready_state_machine.ecc_address == "mocked_ecf_address"
+
+def test_update_requirements_failed_update_falls_back_to_init(
+        mocker: MockerFixture, 
+        ready_state_machine: DeviceRuntimeStateMachine, 
+        new_requirements: Scheduling
+    ):
+    ready_state_machine.cfc.app_req_id = 4123
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._app_req_update", return_value=False)
+    mock_init = mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient.init", return_value=True)
+    # Test function
+    ready_state_machine.update_requirements(new_requirements)
+    # Assertions
+    mock_init.assert_called_once_with(new_requirements)
+    assert ready_state_machine.current_state.id == "get_ecf_address"
+
+def test_ensure_ready_is_bounded(mocker: MockerFixture, init_state_machine: DeviceRuntimeStateMachine):
+    # Authentication keeps failing
+    init_state_machine.token = None
+    mock_handle = mocker.patch.object(DeviceRuntimeStateMachine, "_handle_transitions")
+    # Test function
+    assert init_state_machine.ensure_ready(3) is False
+    # Assertions
+    assert mock_handle.call_count == 3
+
+def test_ensure_ready_when_ready(mocker: MockerFixture, ready_state_machine: DeviceRuntimeStateMachine):
+    mock_handle = mocker.patch.object(DeviceRuntimeStateMachine, "_handle_transitions")
+    assert ready_state_machine.ensure_ready(3) is True
+    mock_handle.assert_not_called()
+
+def test_transitions_run_one_at_a_time(init_state_machine: DeviceRuntimeStateMachine):
+    active = []
+    overlaps = []
+
+    def handle_init_state():
+        active.append(1)
+        if len(active) > 1:
+            overlaps.append(True)
+        time.sleep(0.01)
+        active.pop()
+
+    init_state_machine._handle_init_state = handle_init_state
+    threads = [threading.Thread(target=init_state_machine.ensure_ready, args=(3,)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+
+def test_offload_serialized_function_is_bounded(mocker: MockerFixture, init_state_machine: DeviceRuntimeStateMachine):
+    mock_handle = mocker.patch.object(DeviceRuntimeStateMachine, "_handle_transitions")
+    # Test function
+    with pytest.raises(req.exceptions.ConnectionError):
+        init_state_machine.offload_serialized_function("hash", "fc", None, [], max_transitions=3)
+    assert mock_handle.call_count == 3
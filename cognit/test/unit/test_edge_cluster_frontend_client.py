@@ -1,8 +1,9 @@
 from pytest_mock import MockerFixture
+import pydantic
 import pytest
 
 from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecutionMode, ExecReturnCode
-from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClient
+from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClient, decode_exec_response
 
 @pytest.fixture   
 def execution_mode() -> ExecutionMode:
@@ -55,4 +56,42 @@ def test_execute_function(
     assert response.ret_code == ExecReturnCode.SUCCESS
     assert ecf.has_connection == True
     assert ecf.token == "the_token"
-    assert ecf.address == "the_address"
\ No newline at end of file
+    assert ecf.address == "the_address"
+    assert ecf.get_last_serialization_time() > 0
+
+def test_execute_function_reuses_template(
+        mocker: MockerFixture,
+        execution_mode: ExecutionMode
+    ):
+    ecf = EdgeClusterFrontendClient("the_token", "http://the_address")
+    mock_resp = mocker.Mock()
+    mock_resp.content = b'{"ret_code": 0, "res": "3", "err": null}'
+    mock_post = mocker.patch("requests.post", return_value=mock_resp)
+    # Test function
+    ecf.execute_function("123", 123, execution_mode, (1,))
+    ecf.execute_function("123", 123, execution_mode, (2,))
+    # Assertions
+    assert len(ecf.exec_templates) == 1
+    url = mock_post.call_args.args[0]
+    assert url == "http://the_address/v1/functions/123/execute?app_req_id=123&mode=sync"
+    assert mock_post.call_args.kwargs["headers"] == {"token": "the_token"}
+
+def test_exec_templates_of_previous_requirements_are_dropped(execution_mode: ExecutionMode):
+    ecf = EdgeClusterFrontendClient("the_token", "http://the_address")
+    ecf.get_exec_template("123", 1, execution_mode)
+    ecf.get_exec_template("456", 1, execution_mode)
+    assert len(ecf.exec_templates) == 2
+    # New app_req_id after a requirements update
+    template = ecf.get_exec_template("123", 2, execution_mode)
+    assert list(ecf.exec_templates) == [("123", 2, execution_mode)]
+    assert template.url == "http://the_address/v1/functions/123/execute?app_req_id=2&mode=sync"
+
+def test_decode_exec_response():
+    fast = decode_exec_response({"ret_code": -1, "res": None, "err": "Boom"})
+    assert fast.ret_code == ExecReturnCode.ERROR
+    assert fast.err == "Boom"
+    # Bodies that do not match the trusted layout are validated
+    validated = decode_exec_response({"ret_code": 0, "res": 3})
+    assert validated.res == "3"
+    with pytest.raises(pydantic.ValidationError):
+        decode_exec_response({"ret_code": 7})
@@ -0,0 +1,115 @@
+from unittest.mock import MagicMock
+
+import pytest
+import requests as req
+
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecReturnCode
+from cognit.modules._execution_planner import ExecutionPlanner, ExecutionPolicy, ExecutionRoute, Ewma, function_key
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def cheap(a, b):
+    return a + b
+
+def expensive(n):
+    return n
+
+def test_ewma():
+    ewma = Ewma(0.5)
+    ewma.update(2.0)
+    assert ewma.value == 2.0
+    ewma.update(4.0)
+    assert ewma.value == 3.0
+    assert ewma.count == 2
+
+def test_function_key():
+    assert function_key(cheap) == f"{__name__}.cheap"
+    assert function_key(sum) == "builtins.sum"
+
+@pytest.mark.parametrize("policy, route", [
+    (ExecutionPolicy.OFFLOAD, ExecutionRoute.OFFLOAD),
+    (ExecutionPolicy.LOCAL, ExecutionRoute.LOCAL),
+])
+def test_fixed_policies(policy: ExecutionPolicy, route: ExecutionRoute):
+    planner = ExecutionPlanner(policy)
+    planner.record_local(cheap, 0.0)
+    planner.record_offload(cheap, 0.0, 1.0)
+    assert all(planner.plan(cheap) == route for _ in range(50))
+    assert not planner.can_fallback()
+
+def test_adaptive_picks_the_fastest_route():
+    planner = ExecutionPlanner(ExecutionPolicy.ADAPTIVE, probe_interval=1000)
+    # Offloaded first, then measured locally
+    assert planner.plan(cheap) == ExecutionRoute.OFFLOAD
+    planner.record_offload(cheap, 0.001, 0.05)
+    assert planner.plan(cheap) == ExecutionRoute.LOCAL
+    planner.record_local(cheap, 0.00001)
+    assert planner.plan(cheap) == ExecutionRoute.LOCAL
+
+    planner.record_offload(expensive, 0.001, 0.5)
+    planner.record_local(expensive, 3.0)
+    assert planner.plan(expensive) == ExecutionRoute.OFFLOAD
+
+    stats = planner.stats()[function_key(cheap)]
+    assert stats["serialization_time"] == 0.001
+    assert stats["rtt"] == pytest.approx(0.049)
+    assert stats["routes"] == {"local": 1, "offload": 1, "fallback": 0}
+
+def test_adaptive_probes_the_other_route():
+    planner = ExecutionPlanner(ExecutionPolicy.ADAPTIVE, probe_interval=5)
+    planner.record_offload(cheap, None, 0.05)
+    planner.record_local(cheap, 0.00001)
+    routes = [planner.plan(cheap) for _ in range(7)]
+    assert routes == [ExecutionRoute.LOCAL] * 5 + [ExecutionRoute.OFFLOAD, ExecutionRoute.LOCAL]
+
+def test_unreachable_backoff():
+    clock = FakeClock()
+    planner = ExecutionPlanner(ExecutionPolicy.ADAPTIVE, unreachable_backoff=5.0, clock=clock)
+    planner.record_unreachable()
+    assert planner.plan(expensive) == ExecutionRoute.FALLBACK
+    clock.now = 5.0
+    assert planner.plan(expensive) == ExecutionRoute.OFFLOAD
+
+@pytest.fixture
+def device_runtime() -> DeviceRuntime:
+    runtime = DeviceRuntime("cognit/test/config/cognit_v2.yml", execution_policy=ExecutionPolicy.ADAPTIVE)
+    runtime.device_runtime_sm = MagicMock()
+    runtime.device_runtime_sm.ecf.get_last_serialization_time.return_value = 0.001
+    return runtime
+
+def test_call_runs_cheap_functions_locally(device_runtime: DeviceRuntime):
+    sm = device_runtime.device_runtime_sm
+    sm.offload_function.return_value = ExecResponse(ret_code=ExecReturnCode.SUCCESS, res=device_runtime.faas_parser.serialize(3))
+    assert device_runtime.call(cheap, 1, 2) == (ExecReturnCode.SUCCESS, 3)
+    assert sm.offload_function.call_count == 1
+    for _ in range(5):
+        assert device_runtime.call(cheap, 1, 2) == (ExecReturnCode.SUCCESS, 3)
+    assert sm.offload_function.call_count == 1
+    assert device_runtime.get_execution_stats()[function_key(cheap)]["routes"] == {"local": 5, "offload": 1, "fallback": 0}
+
+def test_call_falls_back_to_local_when_unreachable(device_runtime: DeviceRuntime):
+    sm = device_runtime.device_runtime_sm
+    sm.offload_function.side_effect = req.exceptions.ConnectionError("ECF down")
+    assert device_runtime.call(expensive, 7) == (ExecReturnCode.SUCCESS, 7)
+    # Not retried during the backoff
+    assert device_runtime.call(expensive, 8) == (ExecReturnCode.SUCCESS, 8)
+    assert sm.offload_function.call_count == 1
+    assert device_runtime.get_execution_stats()[function_key(expensive)]["routes"]["fallback"] == 2
+
+def test_local_errors_are_returned(device_runtime: DeviceRuntime):
+    device_runtime.planner.policy = ExecutionPolicy.LOCAL
+    ret_code, err = device_runtime.call(cheap, 1, "a")
+    assert ret_code == ExecReturnCode.ERROR
+    assert "unsupported operand" in err
+
+def test_offload_policy_raises_when_unreachable(device_runtime: DeviceRuntime):
+    device_runtime.planner.policy = ExecutionPolicy.OFFLOAD
+    device_runtime.device_runtime_sm.offload_function.side_effect = req.exceptions.ConnectionError("ECF down")
+    with pytest.raises(req.exceptions.ConnectionError):
+        device_runtime.call(expensive, 7)
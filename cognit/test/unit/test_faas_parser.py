@@ -0,0 +1,180 @@
+import base64 as b64
+import pickle
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cloudpickle as cp
+import numpy as np
+import pandas as pd
+import pytest
+
+from cognit.modules._faas_parser import FaasParser, ResultEncoding, result_encoding, get_result_encoding, estimate_size
+
+@pytest.fixture
+def parser() -> FaasParser:
+    return FaasParser()
+
+def run_remotely(parser: FaasParser, fc, *params) -> str:
+    """Mimics the serverless runtime: loads the function, runs it and pickles the result"""
+    remote_fc = cp.loads(b64.b64decode(parser.serialize(fc)))
+    remote_params = [cp.loads(b64.b64decode(parser.serialize(param))) for param in params]
+    return b64.b64encode(cp.dumps(remote_fc(*remote_params))).decode("utf-8")
+
+@result_encoding(ResultEncoding.JSON)
+def count_failures(lines):
+    return {"message": "ok", "failures": sum("Failed" in line for line in lines)}
+
+@result_encoding(ResultEncoding.NDARRAY)
+def make_matrix(n):
+    import numpy
+    return numpy.arange(n * 3, dtype=numpy.float32).reshape(n, 3)
+
+@result_encoding(ResultEncoding.JSON)
+def not_json():
+    return {1, 2, 3}
+
+def test_serialize_roundtrip(parser: FaasParser):
+    assert parser.deserialize(run_remotely(parser, lambda x, y: x + y, 1, 2)) == 3
+
+def test_result_encoding_declaration():
+    assert get_result_encoding(count_failures) == ResultEncoding.JSON
+    assert get_result_encoding(lambda: None) == ResultEncoding.PICKLE
+
+def test_json_result(parser: FaasParser):
+    res = run_remotely(parser, count_failures, ["Failed password", "Accepted password"])
+    assert parser.deserialize(res, ResultEncoding.JSON) == {"message": "ok", "failures": 1}
+
+def test_ndarray_result(parser: FaasParser):
+    res = run_remotely(parser, make_matrix, 4)
+    matrix = parser.deserialize(res, ResultEncoding.NDARRAY)
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (4, 3)
+    np.testing.assert_array_equal(matrix, np.arange(12, dtype=np.float32).reshape(4, 3))
+
+def test_not_encodable_result_falls_back_to_pickle(parser: FaasParser):
+    res = run_remotely(parser, not_json)
+    assert parser.deserialize(res, ResultEncoding.JSON) == {1, 2, 3}
+
+def test_serialize_keeps_globals(parser: FaasParser):
+    parser.serialize(count_failures)
+    assert "count_failures" in globals()
+
+def test_concurrent_serialization_keeps_module_namespace(parser: FaasParser):
+    module_globals = globals()
+    stop = threading.Event()
+    missing = []
+
+    def watch_namespace():
+        # Other threads of the process must always see the full module
+        while not stop.is_set():
+            if "count_failures" not in module_globals or "np" not in module_globals:
+                missing.append(True)
+
+    watcher = threading.Thread(target=watch_namespace)
+    watcher.start()
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            blobs = list(executor.map(lambda _: parser.serialize(count_failures), range(200)))
+    finally:
+        stop.set()
+        watcher.join()
+    assert not missing
+    assert len(set(blobs)) == 1
+
+def test_estimate_size():
+    assert estimate_size("a" * 100) == 100
+    assert estimate_size(["a" * 100] * 1000) == 100000
+    assert estimate_size(np.zeros(10, dtype=np.float64)) == 80
+
+def test_large_params_are_compressed():
+    parser = FaasParser(compress=True)
+    lines = [f"Feb 20 10:15:{i % 60:02d} server sshd[{i}]: Accepted password for user1 from 192.168.1.10" for i in range(50000)]
+    small = {"ips": ["127.0.0.1"]}
+    serialized = parser.serialize_params((lines, small))
+    assert len(b64.b64decode(serialized[0])) < len(cp.dumps(lines)) / 2
+    # The serverless runtime loads them as usual
+    assert [cp.loads(b64.b64decode(param)) for param in serialized] == [lines, small]
+    assert serialized[0] == parser.serialize_param(lines)
+
+def test_compressed_param_loads_with_stdlib_pickle():
+    lines = ["Failed password for root from 203.0.113.45"] * 20000
+    assert pickle.loads(b64.b64decode(FaasParser(compress=True).serialize_param(lines))) == lines
+
+def test_compression_is_optional(mocker):
+    lines = ["Failed password for root from 203.0.113.45"] * 50000
+    assert FaasParser(compress=False).serialize_params((lines,)) == [b64.b64encode(cp.dumps(lines)).decode("utf-8")]
+    # Off by default, whatever the number of CPUs
+    mocker.patch("os.cpu_count", return_value=4)
+    assert not FaasParser().compress
+    assert FaasParser().serialize_params((lines,)) == [b64.b64encode(cp.dumps(lines)).decode("utf-8")]
+
+@result_encoding(ResultEncoding.ARROW)
+def failures_per_user(frame):
+    return frame.groupby("user", as_index=False)["failures"].sum()
+
+def test_arrow_result(parser: FaasParser):
+    frame = pd.DataFrame({"user": ["root", "admin", "root"], "failures": [1, 2, 3]})
+    res = run_remotely(parser, failures_per_user, frame)
+    expected = pd.DataFrame({"user": ["admin", "root"], "failures": [2, 4]})
+    pd.testing.assert_frame_equal(parser.deserialize(res, ResultEncoding.ARROW), expected)
+
+def test_params_are_cloudpickled_by_default(parser: FaasParser):
+    frame = pd.DataFrame({"user": ["root"] * 20000, "failures": np.arange(20000)})
+    lines = ["Failed password for root from 203.0.113.45"] * 5000
+    blobs = [b64.b64decode(param) for param in parser.serialize_params((frame, lines))]
+    # The serverless runtime needs neither pyarrow nor msgpack
+    assert all(b"CGNT" not in blob for blob in blobs)
+    assert blobs[1] == cp.dumps(lines)
+
+def test_params_use_the_codec_of_their_type():
+    parser = FaasParser(param_codecs=True)
+    frame = pd.DataFrame({"user": ["root"] * 20000, "failures": np.arange(20000)})
+    embeddings = np.random.default_rng(0).random((200, 384), dtype=np.float32)
+    lines = ["Failed password for root from 203.0.113.45"] * 5000
+    rules = [("user1", 9, 17)] * 5000
+    serialized = parser.serialize_params((frame, embeddings, lines, rules, {"ips": ["127.0.0.1"]}))
+    blobs = [b64.b64decode(param) for param in serialized]
+    assert b"CGNTA" in blobs[0] and b"CGNTP" in blobs[1] and b"CGNTM" in blobs[2]
+    # Tuples are not msgpack data, small values are plain pickles
+    assert b"CGNT" not in blobs[3] and b"CGNT" not in blobs[4]
+
+def test_codec_params_load_without_cognit():
+    parser = FaasParser(param_codecs=True)
+    frame = pd.DataFrame({"user": ["root", "admin"] * 10000, "failures": np.arange(20000)})
+    embeddings = np.arange(200 * 384, dtype=np.float32).reshape(200, 384)
+    lines = ["Failed password for root from 203.0.113.45"] * 20000
+    script = (
+        "import base64, sys, pickle;"
+        "frame, embeddings, lines = [pickle.loads(base64.b64decode(param)) for param in sys.stdin.read().split()];"
+        "embeddings[0, 0] = -1;"
+        "print(int(frame['failures'].sum()), float(embeddings[0, 0]), float(embeddings[1, 1]), len(lines), lines[0][:6], 'cognit' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        input="\n".join(parser.serialize_params((frame, embeddings, lines))),
+        capture_output=True, text=True, cwd="/", check=True
+    )
+    # Decoded arrays are writable on the serverless runtime
+    assert output.stdout.split() == [str(sum(range(20000))), "-1.0", "385.0", "20000", "Failed", "False"]
+
+def test_decorated_function_loads_without_cognit(parser: FaasParser):
+    lines = ["Failed password for root from 203.0.113.45", "Accepted password for user1"]
+    script = (
+        "import base64, sys, pickle;"
+        # cognit is importable from the working tree, block it as on the serverless runtime
+        "sys.modules['cognit'] = None;"
+        "fc = pickle.loads(base64.b64decode(sys.stdin.read()));"
+        "result = fc(['Failed password for root', 'Accepted password for user1']);"
+        "print(result.decode('utf-8', 'replace'), 'cognit' in sys.modules and sys.modules['cognit'] is not None)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        input=parser.serialize(count_failures),
+        capture_output=True, text=True, cwd="/", check=True
+    )
+    assert '"failures":1' in output.stdout.replace(" ", "")
+    assert output.stdout.split()[-1] == "False"
+    # The declaration is still honoured on the device
+    assert get_result_encoding(count_failures) == ResultEncoding.JSON
@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+import requests as req
+
+from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecReturnCode
+from cognit.modules._device_runtime_state_machine import DeviceRuntimeStateMachine
+from cognit.modules._edge_cluster_frontend_client import EdgeClusterFrontendClient
+from cognit.modules._execution_planner import function_key
+from cognit.modules._hedging import Hedger, HedgingBudget, LatencyTracker, idempotent, is_idempotent
+
+def warm_tracker(key: str, latency: float = 0.01, samples: int = 20) -> LatencyTracker:
+    tracker = LatencyTracker(min_samples=samples)
+    for _ in range(samples):
+        tracker.record(key, latency)
+    return tracker
+
+def test_idempotent():
+    @idempotent
+    def square(x):
+        return x * x
+    assert is_idempotent(square)
+    assert not is_idempotent(lambda x: x)
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for i in range(9):
+        tracker.record("f", i)
+    assert tracker.percentile("f", 0.95) is None
+    for i in range(9, 200):
+        tracker.record("f", i)
+    # Only the last 100 latencies are kept
+    assert tracker.percentile("f", 0.95) == 195
+    assert tracker.percentile("g", 0.95) is None
+
+def test_budget():
+    budget = HedgingBudget(ratio=0.5, burst=1.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+
+def test_hedge_wins_when_primary_is_slow():
+    release = threading.Event()
+    hedger = Hedger(tracker=warm_tracker("f"))
+    def primary():
+        release.wait(5)
+        return "primary"
+    assert hedger.execute("f", primary, lambda: "hedge") == "hedge"
+    release.set()
+    assert hedger.stats() == {"requests": 1, "hedges": 1, "hedges_won": 1}
+
+def test_fast_primary_is_not_hedged():
+    hedge_calls = []
+    hedger = Hedger(tracker=warm_tracker("f", latency=1.0))
+    assert hedger.execute("f", lambda: "primary", lambda: hedge_calls.append(1)) == "primary"
+    assert hedge_calls == []
+    assert hedger.stats()["hedges"] == 0
+
+def test_counters_of_concurrent_calls():
+    hedger = Hedger()
+
+    def call():
+        for _ in range(500):
+            hedger.execute("f", lambda: "primary", None)
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert hedger.stats() == {"requests": 4000, "hedges": 0, "hedges_won": 0}
+
+def test_no_hedge_without_enough_samples_or_alternative():
+    calls = []
+    hedger = Hedger(tracker=LatencyTracker(min_samples=20))
+    assert hedger.execute("f", lambda: "primary", lambda: calls.append(1)) == "primary"
+    hedger = Hedger(tracker=warm_tracker("f"))
+    assert hedger.execute("f", lambda: "primary", None) == "primary"
+    assert calls == []
+
+def test_budget_caps_the_hedges():
+    release = threading.Event()
+    hedger = Hedger(budget=HedgingBudget(ratio=0.0, burst=1.0), tracker=warm_tracker("f"))
+    def primary():
+        release.wait(0.1)
+        return "primary"
+    assert hedger.execute("f", primary, lambda: "hedge") == "hedge"
+    # The budget is spent, the primary request is awaited
+    assert hedger.execute("f", primary, lambda: "hedge") == "primary"
+    assert hedger.stats()["hedges"] == 1
+
+def test_failed_request_waits_for_the_other():
+    release = threading.Event()
+    hedger = Hedger(tracker=warm_tracker("f"))
+    def primary():
+        release.wait(5)
+        raise req.exceptions.ConnectionError("ECF down")
+    def hedge():
+        raise req.exceptions.ConnectionError("ECF down")
+    def slow_hedge():
+        release.wait(0.05)
+        return "hedge"
+    assert hedger.execute("f", primary, slow_hedge) == "hedge"
+    release.set()
+    with pytest.raises(req.exceptions.ConnectionError):
+        hedger.execute("f", primary, hedge)
+
+@idempotent
+def add(a, b):
+    return a + b
+
+@pytest.fixture
+def hedged_state_machine(mocker) -> DeviceRuntimeStateMachine:
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._authenticate", return_value="mocked_token")
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient.init", return_value=True)
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._get_edge_cluster_address", return_value="http://ecf0")
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient.get_has_connection", return_value=True)
+    mocker.patch("cognit.modules._cognit_frontend_client.CognitFrontendClient._serialize_and_upload_fc_to_daas_gw", return_value=(1, 2))
+    mocker.patch("cognit.modules._edge_cluster_frontend_client.EdgeClusterFrontendClient.get_has_connection", return_value=True)
+    sm = DeviceRuntimeStateMachine("cognit/test/config/cognit_v2.yml", Hedger(tracker=warm_tracker(function_key(add))))
+    sm.success_auth()
+    sm.requirements_up()
+    sm.address_obtained()
+    sm.cfc.ec_fe_list = ["http://ecf0", "http://ecf1"]
+    return sm
+
+def test_state_machine_hedges_idempotent_functions(hedged_state_machine: DeviceRuntimeStateMachine, mocker):
+    sm = hedged_state_machine
+    release = threading.Event()
+    addresses = []
+    def execute_serialized(self, func_id, app_req_id, exec_mode, serialized_params, deadline=None):
+        addresses.append(self.address)
+        if self.address == "http://ecf0":
+            release.wait(5)
+        return ExecResponse(ret_code=ExecReturnCode.SUCCESS, res=self.address)
+    mocker.patch.object(EdgeClusterFrontendClient, "execute_serialized", execute_serialized)
+    response = sm.offload_function(add, 1, 2)
+    release.set()
+    assert response.res == "http://ecf1"
+    assert addresses == ["http://ecf0", "http://ecf1"]
+    assert sm.hedge_ecf.address == "http://ecf1"
+
+def test_state_machine_does_not_hedge_other_functions(hedged_state_machine: DeviceRuntimeStateMachine, mocker):
+    execute_function = mocker.patch.object(
+        EdgeClusterFrontendClient, "execute_function",
+        return_value=ExecResponse(ret_code=ExecReturnCode.SUCCESS, res="ok")
+    )
+    assert hedged_state_machine.offload_function(lambda a, b: a + b, 1, 2).res == "ok"
+    execute_function.assert_called_once()
+    assert hedged_state_machine.hedge_ecf is None
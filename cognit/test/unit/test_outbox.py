@@ -0,0 +1,282 @@
+import base64 as b64
+import threading
+import time
+from unittest.mock import MagicMock
+
+import cloudpickle as cp
+import pytest
+import requests as req
+
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecReturnCode
+from cognit.modules._cognit_frontend_client import fc_hash
+from cognit.modules._faas_parser import ResultEncoding, result_encoding
+from cognit.modules._outbox import Outbox, OutboxDrainer, OutboxFullError
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def analyze(lines):
+    return len(lines)
+
+def classify(line):
+    return line
+
+@pytest.fixture
+def outbox_path(tmp_path) -> str:
+    return str(tmp_path / "outbox" / "outbox.jsonl")
+
+@pytest.fixture
+def outbox(outbox_path: str):
+    outbox = Outbox(outbox_path, capacity=3)
+    yield outbox
+    outbox.close()
+
+def test_put_and_ack(outbox: Outbox):
+    first = outbox.put(analyze, "analyze", ["p1"])
+    second = outbox.put(classify, "classify", ["p2"])
+    assert [entry.id for entry in outbox.pending()] == [first, second]
+    assert outbox.has_pending("analyze") and outbox.keys() == ["analyze", "classify"]
+    outbox.ack(first)
+    assert not outbox.has_pending("analyze")
+    assert len(outbox) == 1
+
+def test_capacity(outbox: Outbox):
+    for i in range(3):
+        outbox.put(analyze, "analyze", [str(i)])
+    with pytest.raises(OutboxFullError):
+        outbox.put(analyze, "analyze", ["3"])
+
+def test_pending_entries_survive_a_restart(outbox_path: str):
+    outbox = Outbox(outbox_path)
+    first = outbox.put(analyze, "analyze", ["p1"])
+    second = outbox.put(analyze, "analyze", ["p2"])
+    outbox.ack(first)
+    outbox.close()
+    # A crash while appending leaves a torn record
+    with open(outbox_path, "a") as f:
+        f.write('{"op":"put","id":')
+    restarted = Outbox(outbox_path)
+    entries = restarted.pending()
+    assert [(entry.id, entry.params) for entry in entries] == [(second, ["p2"])]
+    assert entries[0].get_function()(["a", "b"]) == 2
+    # Identifiers are not reused
+    assert restarted.put(analyze, "analyze", ["p3"]) == second + 1
+    restarted.close()
+
+def test_compaction(outbox_path: str):
+    outbox = Outbox(outbox_path)
+    for i in range(5):
+        outbox.ack(outbox.put(analyze, "analyze", [str(i)]))
+    outbox.close()
+    # All the entries were acknowledged, nothing is left in the file
+    with open(outbox_path) as f:
+        assert f.read() == ""
+
+def test_fsync_is_batched(outbox: Outbox, mocker):
+    fsync = mocker.patch("os.fsync")
+    outbox.fsync_interval = 60
+    for _ in range(3):
+        outbox.put(analyze, "analyze", ["p"])
+    outbox.sync()
+    outbox.sync()
+    assert fsync.call_count == 1
+
+def test_drainer_keeps_the_order_of_each_function(outbox: Outbox):
+    outbox.capacity = 100
+    sent = []
+    running = set()
+    max_running = []
+    lock = threading.Lock()
+
+    def execute(entry):
+        with lock:
+            running.add(entry.key)
+            max_running.append(len(running))
+        time.sleep(0.001)
+        with lock:
+            running.discard(entry.key)
+            sent.append((entry.key, entry.params[0]))
+        return entry.id
+
+    for i in range(10):
+        outbox.put(analyze, "analyze", [str(i)])
+        outbox.put(classify, "classify", [str(i)])
+    results = []
+    drainer = OutboxDrainer(outbox, execute, lambda entry, result: results.append(result), max_concurrency=2)
+    drainer.drain_and_wait()
+    assert len(outbox) == 0
+    assert [params for key, params in sent if key == "analyze"] == [str(i) for i in range(10)]
+    assert [params for key, params in sent if key == "classify"] == [str(i) for i in range(10)]
+    assert max(max_running) <= 2
+    assert sorted(results) == list(range(20))
+    drainer.shutdown()
+
+def test_drainer_stops_on_failure(outbox: Outbox):
+    clock = FakeClock()
+    execute = MagicMock(side_effect=req.exceptions.ConnectionError("down"))
+    drainer = OutboxDrainer(outbox, execute, retry_interval=5, clock=clock)
+    outbox.put(analyze, "analyze", ["p1"])
+    outbox.put(analyze, "analyze", ["p2"])
+    drainer.drain_and_wait()
+    assert execute.call_count == 1
+    assert len(outbox) == 2
+    assert drainer.drain() == []
+    clock.now = 5
+    execute.side_effect = None
+    execute.return_value = "ok"
+    drainer.drain_and_wait()
+    assert len(outbox) == 0
+    drainer.shutdown()
+
+def test_drainer_drops_entries_that_cannot_be_sent(outbox: Outbox):
+    first = outbox.put(analyze, "analyze", ["p1"])
+    second = outbox.put(analyze, "analyze", ["p2"])
+    execute = MagicMock(side_effect=[ValueError("cannot be unpickled"), "ok"])
+    results = []
+    drainer = OutboxDrainer(outbox, execute, lambda entry, result: results.append((entry.id, result)))
+    drainer.drain_and_wait()
+    # The failed entry does not block the next ones of its function
+    assert len(outbox) == 0
+    assert (drainer.sent_counter, drainer.dropped_counter, drainer.last_failure) == (1, 1, None)
+    assert results[0][0] == first and isinstance(results[0][1], ValueError)
+    assert results[1] == (second, "ok")
+    drainer.shutdown()
+
+@pytest.fixture
+def device_runtime(outbox: Outbox) -> DeviceRuntime:
+    runtime = DeviceRuntime(
+        "cognit/test/config/cognit_v2.yml",
+        outbox=outbox,
+        on_queued_result=MagicMock()
+    )
+    runtime.device_runtime_sm = MagicMock()
+    runtime.device_runtime_sm.ensure_ready.return_value = True
+    runtime.device_runtime_sm.ecf.get_last_serialization_time.return_value = None
+    return runtime
+
+def test_call_queues_while_disconnected(device_runtime: DeviceRuntime, outbox: Outbox):
+    sm = device_runtime.device_runtime_sm
+    sm.offload_function.side_effect = req.exceptions.ConnectionError("ECF down")
+    assert device_runtime.call(analyze, ["line 1"]) == (ExecReturnCode.QUEUED, 0)
+    # Later calls of the function are queued behind it, without trying to offload them
+    device_runtime.outbox_drainer.retry_interval = 60
+    device_runtime.outbox_drainer.last_failure = device_runtime.outbox_drainer.clock()
+    assert device_runtime.call(analyze, ["line 2"]) == (ExecReturnCode.QUEUED, 1)
+    assert sm.offload_function.call_count == 1
+    # The runtime cannot reach READY
+    sm.ensure_ready.return_value = False
+    assert device_runtime.call(classify, "line 3") == (ExecReturnCode.QUEUED, 2)
+    assert device_runtime.call(classify, "line 4") == (ExecReturnCode.ERROR, f"Outbox {outbox.path} is full (3 entries)")
+
+    # Back online
+    sm.ensure_ready.return_value = True
+    sm.offload_serialized_function.side_effect = lambda fc_hash, fc, imports, params, max_transitions: ExecResponse(
+        ret_code=ExecReturnCode.SUCCESS,
+        res=device_runtime.faas_parser.serialize(
+            cp.loads(b64.b64decode(fc))(*[device_runtime.faas_parser.deserialize(param) for param in params])
+        )
+    )
+    device_runtime.outbox_drainer.last_failure = None
+    device_runtime.drain_outbox()
+    assert len(outbox) == 0
+    calls = device_runtime.on_queued_result.call_args_list
+    assert sorted((call.args[1], call.args[3]) for call in calls) == [(0, 1), (1, 1), (2, "line 3")]
+    assert all(call.args[2] == ExecReturnCode.SUCCESS for call in calls)
+
+def test_offloads_run_concurrently(outbox: Outbox):
+    runtime = DeviceRuntime(
+        "cognit/test/config/cognit_v2.yml",
+        outbox=outbox,
+        on_queued_result=MagicMock(),
+        outbox_concurrency=2
+    )
+    runtime.device_runtime_sm = sm = MagicMock()
+    sm.ecf.get_last_serialization_time.return_value = None
+    sm.ensure_ready.return_value = True
+    lock = threading.Lock()
+    running = []
+    max_running = []
+    callback_overlaps = []
+
+    def offload(result, active):
+        def run(*args, **kwargs):
+            with lock:
+                active.append(1)
+                max_running.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return result
+        return run
+
+    success = ExecResponse(ret_code=ExecReturnCode.SUCCESS, res=runtime.faas_parser.serialize(1))
+    sm.offload_function.side_effect = offload(success, running)
+    sm.offload_serialized_function.side_effect = offload(success, running)
+    callbacks = []
+
+    def on_queued_result(*args):
+        callbacks.append(1)
+        if len(callbacks) > 1:
+            callback_overlaps.append(args)
+        time.sleep(0.01)
+        callbacks.pop()
+
+    runtime.on_queued_result = MagicMock(side_effect=on_queued_result)
+    outbox.put(analyze, "analyze", runtime.faas_parser.serialize_params((["line"],)))
+    outbox.put(classify, "classify", runtime.faas_parser.serialize_params(("line",)))
+
+    threads = [threading.Thread(target=runtime.call, args=(len, "line")) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    runtime.drain_outbox()
+    for thread in threads:
+        thread.join()
+    runtime.outbox_drainer.shutdown()
+    assert len(outbox) == 0
+    assert sm.offload_serialized_function.call_count == 2
+    # The offloads overlap, the callbacks of the queued ones never do
+    assert max(max_running) > 1
+    assert runtime.on_queued_result.call_count == 2
+    assert callback_overlaps == []
+
+def test_queued_entry_that_cannot_be_loaded(outbox_path: str, device_runtime: DeviceRuntime):
+    device_runtime.outbox.close()
+    with open(outbox_path, "w") as f:
+        f.write('{"op":"put","id":0,"key":"gone","fc":"bm90IGEgcGlja2xl","params":[],"created":0}\n')
+    device_runtime.outbox = outbox = Outbox(outbox_path)
+    device_runtime.outbox_drainer.outbox = outbox
+    # Rejected by the serverless runtime
+    device_runtime.device_runtime_sm.offload_serialized_function.side_effect = ValueError("not a pickle")
+    device_runtime.drain_outbox()
+    assert len(outbox) == 0
+    (function, entry_id, ret_code, err), _ = device_runtime.on_queued_result.call_args
+    assert (function, entry_id, ret_code, err) == (None, 0, ExecReturnCode.ERROR, "not a pickle")
+
+def test_queued_and_direct_offloads_ship_the_same_function(device_runtime: DeviceRuntime, outbox: Outbox):
+    @result_encoding(ResultEncoding.JSON)
+    def summarize(lines):
+        return {"lines": len(lines)}
+
+    sm = device_runtime.device_runtime_sm
+    sm.offload_function.side_effect = req.exceptions.ConnectionError("ECF down")
+    assert device_runtime.call(summarize, ["line 1"]) == (ExecReturnCode.QUEUED, 0)
+    entry = outbox.pending()[0]
+    assert entry.fc == device_runtime.faas_parser.serialize(summarize)
+    assert entry.fc_hash == fc_hash(summarize)
+    assert entry.encoding == "json"
+    # The queued function is the by-value copy, wrapped to encode its result
+    shipped = cp.loads(b64.b64decode(entry.fc))
+    result = device_runtime.faas_parser.serialize(shipped(["line 1"]))
+    sm.offload_serialized_function.side_effect = None
+    sm.offload_serialized_function.return_value = ExecResponse(ret_code=ExecReturnCode.SUCCESS, res=result)
+    device_runtime.outbox_drainer.last_failure = None
+    device_runtime.drain_outbox()
+    (function, entry_id, ret_code, value), _ = device_runtime.on_queued_result.call_args
+    assert (function, entry_id, ret_code, value) == (summarize, 0, ExecReturnCode.SUCCESS, {"lines": 1})
+    args, _ = sm.offload_serialized_function.call_args
+    assert args[:3] == (entry.fc_hash, entry.fc, entry.imports)
@@ -0,0 +1,117 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._cognit_frontend_client import Scheduling
+from cognit.modules._requirements_coalescer import RequirementsCoalescer, geolocation_distance, parse_geolocation
+
+TEST_REQS_INIT = {
+      "FLAVOUR": "CyberSecurity",
+      "MAX_LATENCY": 25,
+      "GEOLOCATION": "43.0500,-2.5300"
+}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+@pytest.fixture
+def coalescer(clock: FakeClock) -> RequirementsCoalescer:
+    coalescer = RequirementsCoalescer(
+        min_interval=10.0,
+        geolocation_threshold=100.0,
+        latency_threshold=5,
+        clock=clock
+    )
+    coalescer.mark_sent(Scheduling(**TEST_REQS_INIT))
+    return coalescer
+
+def moved(metres: float) -> Scheduling:
+    # One degree of latitude is ~111 km
+    latitude = 43.05 + metres / 111195.0
+    return Scheduling(**{**TEST_REQS_INIT, "GEOLOCATION": f"{latitude:.6f},-2.5300"})
+
+def test_parse_geolocation():
+    assert parse_geolocation("43.05,-2.53") == (43.05, -2.53)
+    assert parse_geolocation("IKERLAN ARRASATE/MONDRAGON 20500") is None
+    assert parse_geolocation(None) is None
+
+def test_geolocation_distance():
+    distance = geolocation_distance((43.05, -2.53), (44.05, -2.53))
+    assert distance == pytest.approx(111195.0, rel=1e-3)
+
+def test_first_requirements_are_sent(clock: FakeClock):
+    coalescer = RequirementsCoalescer(min_interval=10.0, clock=clock)
+    coalescer.submit(Scheduling(**TEST_REQS_INIT))
+    assert coalescer.poll() == Scheduling(**TEST_REQS_INIT)
+
+def test_small_displacement_is_ignored(coalescer: RequirementsCoalescer, clock: FakeClock):
+    clock.now = 60.0
+    coalescer.submit(moved(20.0))
+    assert coalescer.poll() is None
+    assert coalescer.dropped_counter == 1
+
+def test_large_displacement_is_sent(coalescer: RequirementsCoalescer, clock: FakeClock):
+    clock.now = 60.0
+    coalescer.submit(moved(500.0))
+    assert coalescer.poll() == moved(500.0)
+    coalescer.mark_sent(coalescer.poll())
+    assert coalescer.sent_counter == 1
+    assert coalescer.poll() is None
+
+def test_latency_threshold(coalescer: RequirementsCoalescer, clock: FakeClock):
+    clock.now = 60.0
+    coalescer.submit(Scheduling(**{**TEST_REQS_INIT, "MAX_LATENCY": 27}))
+    assert coalescer.poll() is None
+    coalescer.submit(Scheduling(**{**TEST_REQS_INIT, "MAX_LATENCY": 40}))
+    assert coalescer.poll().MAX_LATENCY == 40
+
+def test_other_fields_are_always_significant(coalescer: RequirementsCoalescer, clock: FakeClock):
+    clock.now = 60.0
+    coalescer.submit(Scheduling(**{**TEST_REQS_INIT, "FLAVOUR": "Energy"}))
+    assert coalescer.poll().FLAVOUR == "Energy"
+
+def test_only_latest_pending_is_sent(coalescer: RequirementsCoalescer, clock: FakeClock):
+    clock.now = 5.0
+    for metres in (500.0, 1000.0, 1500.0):
+        coalescer.submit(moved(metres))
+        # The minimum interval has not elapsed yet
+        assert coalescer.poll() is None
+    clock.now = 10.0
+    assert coalescer.poll() == moved(1500.0)
+    coalescer.mark_sent(coalescer.poll())
+    assert coalescer.poll() is None
+    assert coalescer.sent_counter == 1
+    assert coalescer.dropped_counter == 2
+
+def test_failed_upload_is_retried(coalescer: RequirementsCoalescer, clock: FakeClock):
+    clock.now = 60.0
+    coalescer.submit(moved(500.0))
+    # The upload failed, mark_sent() is not called
+    assert coalescer.poll() == moved(500.0)
+    assert coalescer.poll() == moved(500.0)
+    assert coalescer.sent_counter == 0
+    coalescer.mark_sent(coalescer.poll())
+    assert coalescer.poll() is None
+    assert coalescer.last_sent == moved(500.0)
+
+def test_device_runtime_retries_failed_updates():
+    runtime = DeviceRuntime("cognit/test/config/cognit_v2.yml")
+    runtime.device_runtime_sm = sm = MagicMock()
+    sm.update_requirements.return_value = False
+    runtime.call(len, [], new_reqs={**TEST_REQS_INIT, "MAX_LATENCY": 40})
+    runtime.call(len, [])
+    assert sm.update_requirements.call_count == 2
+    sm.update_requirements.return_value = True
+    runtime.call(len, [])
+    runtime.call(len, [])
+    assert sm.update_requirements.call_count == 3
+    assert runtime.requirements_coalescer.last_sent.MAX_LATENCY == 40
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._cognit_frontend_client import Scheduling
+from cognit.models._edge_cluster_frontend_client import ExecResponse, ExecReturnCode
+from cognit.modules._faas_parser import FaasParser
+from cognit.modules._result_cache import ResultCache, hash_params, is_pure, pure
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pure
+def count_failures(lines):
+    return sum("Failed" in line for line in lines)
+
+def not_marked(lines):
+    return len(lines)
+
+def test_pure():
+    assert is_pure(count_failures)
+    assert not is_pure(not_marked)
+
+def test_hash_params():
+    assert hash_params((["a", "b"], {"ips": []})) == hash_params((["a", "b"], {"ips": []}))
+    assert hash_params((["a", "b"],)) != hash_params((["a"], ["b"]))
+    assert hash_params((threading.Lock(),)) is None
+
+def test_function_hash():
+    cache = ResultCache()
+    parser = FaasParser()
+    fc_hash = cache.function_hash(count_failures, parser.serialize)
+    assert fc_hash == cache.function_hash(count_failures, lambda fc: "not called")
+    assert fc_hash != cache.function_hash(not_marked, parser.serialize)
+
+def test_lru_byte_budget():
+    cache = ResultCache(max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "cccc")
+    # b was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    assert cache.size == 8
+    assert cache.evictions == 1
+    # Results above the budget are not cached
+    cache.put("d", "d" * 11)
+    assert cache.get("d") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+def test_ttl():
+    clock = FakeClock()
+    cache = ResultCache(ttl=10, clock=clock)
+    cache.put("a", "result")
+    clock.now = 9.9
+    assert cache.get("a") == "result"
+    clock.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_disk_tier(tmp_path):
+    cache = ResultCache(disk_path=str(tmp_path))
+    cache.put("a", "result")
+    # A new cache (e.g. after a restart) finds it on disk
+    restarted = ResultCache(disk_path=str(tmp_path))
+    assert restarted.disk_size == len("result")
+    assert restarted.get("a") == "result"
+    assert len(restarted) == 1
+    restarted.clear()
+    assert ResultCache(disk_path=str(tmp_path)).get("a") is None
+
+def test_disk_hit_keeps_the_remaining_ttl(tmp_path):
+    clock = FakeClock()
+    restarted = ResultCache(disk_path=str(tmp_path), ttl=10, clock=clock)
+    restarted.put("a", "result")
+    restarted._entries.clear()
+    # Written 8 seconds ago
+    os.utime(tmp_path / "a.res", (time.time() - 8, time.time() - 8))
+    assert restarted.get("a") == "result"
+    # Expired in memory, and removed from disk meanwhile
+    os.remove(tmp_path / "a.res")
+    clock.now = 2.5
+    assert restarted.get("a") is None
+
+def test_disk_overwrite_is_counted_once(tmp_path):
+    cache = ResultCache(disk_path=str(tmp_path), disk_max_bytes=20)
+    for _ in range(3):
+        cache.put("a", "aaaa")
+    assert cache.disk_size == 4
+    cache.put("b", "bbbb")
+    # Both fit in the budget
+    assert cache.disk_size == 8
+    assert len(list(tmp_path.iterdir())) == 2
+
+def test_disk_budget(tmp_path):
+    cache = ResultCache(disk_path=str(tmp_path), disk_max_bytes=10)
+    for key in "abc":
+        cache.put(key, key * 4)
+    assert cache.disk_size <= 10
+    assert len(list(tmp_path.iterdir())) == 2
+
+@pytest.fixture
+def device_runtime() -> DeviceRuntime:
+    runtime = DeviceRuntime("cognit/test/config/cognit_v2.yml", result_cache=ResultCache())
+    runtime.device_runtime_sm = MagicMock()
+    runtime.device_runtime_sm.requirements = Scheduling(FLAVOUR="CybersecV2")
+    runtime.device_runtime_sm.ecf.get_last_serialization_time.return_value = None
+    runtime.device_runtime_sm.offload_function.return_value = ExecResponse(
+        ret_code=ExecReturnCode.SUCCESS,
+        res=runtime.faas_parser.serialize([1])
+    )
+    return runtime
+
+def test_repeated_call_is_not_offloaded(device_runtime: DeviceRuntime):
+    sm = device_runtime.device_runtime_sm
+    lines = ["Failed password for root"]
+    first = device_runtime.call(count_failures, lines)
+    second = device_runtime.call(count_failures, lines)
+    assert first == second == (ExecReturnCode.SUCCESS, [1])
+    # Each hit is a fresh object
+    assert first[1] is not second[1]
+    assert sm.offload_function.call_count == 1
+    # Other parameters or requirements are offloaded
+    device_runtime.call(count_failures, lines + lines)
+    sm.requirements = Scheduling(FLAVOUR="Other")
+    device_runtime.call(count_failures, lines)
+    assert sm.offload_function.call_count == 3
+
+def test_only_pure_successful_calls_are_cached(device_runtime: DeviceRuntime):
+    sm = device_runtime.device_runtime_sm
+    device_runtime.call(not_marked, [])
+    device_runtime.call(not_marked, [])
+    assert sm.offload_function.call_count == 2
+    sm.offload_function.return_value = ExecResponse(ret_code=ExecReturnCode.ERROR, err="boom")
+    device_runtime.call(count_failures, [])
+    device_runtime.call(count_failures, [])
+    assert sm.offload_function.call_count == 4
+    assert len(device_runtime.result_cache) == 0
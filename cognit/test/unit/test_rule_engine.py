@@ -0,0 +1,117 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "..", "examples"))
+
+from rule_engine import ALL_HOURS, compile_rules, hour_mask, is_allowed_ip
+
+RULES = {
+    "users": [
+        {"user": "malik", "time_ranges": [{"start_hour": 9, "end_hour": 17}]},
+        {"user": "user1", "time_ranges": [{"start_hour": 0, "end_hour": 24}]},
+        {"user": "nobody"},
+    ],
+    "ips": [
+        "127.0.0.1",
+        "10.8.0.0/16",
+        "192.168.1.7/32",
+        "2001:db8::/32",
+        "fe80::1",
+        "10.11.0.0/99",
+        "not an ip",
+    ],
+}
+
+def allowed_hours(compiled: dict, user: str) -> list:
+    return [hour for hour in range(24) if compiled["user_hours"][user] >> hour & 1]
+
+def violates_time_ranges(rules: dict, user: str, hour: int) -> bool:
+    # Check of the rules before they were compiled
+    for user_rule in rules.get("users", []):
+        if user == user_rule.get("user"):
+            for time_range in user_rule.get("time_ranges", []):
+                if hour < time_range.get("start_hour", 0) or hour > time_range.get("end_hour", 24):
+                    return True
+    return False
+
+@pytest.fixture
+def compiled() -> dict:
+    return compile_rules(RULES)
+
+def test_hour_mask():
+    assert hour_mask(0, 24) == ALL_HOURS
+    assert hour_mask(9, 9) == 1 << 9
+    assert hour_mask(22, 23) == (1 << 22) | (1 << 23)
+
+def test_user_hours(compiled: dict):
+    assert allowed_hours(compiled, "malik") == list(range(9, 18))
+    assert compiled["user_hours"]["user1"] == ALL_HOURS
+    # No time ranges, every hour is allowed
+    assert compiled["user_hours"]["nobody"] == ALL_HOURS
+    assert "unknown" not in compiled["user_hours"]
+
+@pytest.mark.parametrize("users", [
+    # Listed twice, both listings apply
+    [
+        {"user": "ana", "time_ranges": [{"start_hour": 8, "end_hour": 18}]},
+        {"user": "ana", "time_ranges": [{"start_hour": 12, "end_hour": 23}]},
+    ],
+    # Several ranges, the hour must be in all of them
+    [{"user": "ana", "time_ranges": [{"start_hour": 6, "end_hour": 14}, {"start_hour": 10}]}],
+    # Overnight range, as with the uncompiled rules no hour is both after the start and before the end
+    [{"user": "ana", "time_ranges": [{"start_hour": 22, "end_hour": 6}]}],
+    # Overnight listing and day listing of the same user
+    [
+        {"user": "ana", "time_ranges": [{"start_hour": 22, "end_hour": 6}]},
+        {"user": "ana", "time_ranges": [{"start_hour": 0, "end_hour": 24}]},
+    ],
+])
+def test_user_hours_match_the_rules(users: list):
+    rules = {"users": users}
+    compiled = compile_rules(rules)
+    for hour in range(24):
+        assert (not compiled["user_hours"]["ana"] >> hour & 1) == violates_time_ranges(rules, "ana", hour)
+
+def test_user_listed_twice():
+    rules = {"users": [
+        {"user": "ana", "time_ranges": [{"start_hour": 8, "end_hour": 18}]},
+        {"user": "ana", "time_ranges": [{"start_hour": 12, "end_hour": 23}]},
+    ]}
+    assert allowed_hours(compile_rules(rules), "ana") == list(range(12, 19))
+
+def test_exact_ips(compiled: dict):
+    assert is_allowed_ip(compiled, "127.0.0.1")
+    assert is_allowed_ip(compiled, "fe80::1")
+    assert not is_allowed_ip(compiled, "127.0.0.2")
+    assert not is_allowed_ip(compiled, "UNKNOWN")
+
+def test_ipv4_subnets(compiled: dict):
+    assert is_allowed_ip(compiled, "10.8.0.1")
+    assert is_allowed_ip(compiled, "10.8.255.255")
+    assert not is_allowed_ip(compiled, "10.9.0.1")
+    assert is_allowed_ip(compiled, "192.168.1.7")
+    assert not is_allowed_ip(compiled, "192.168.1.8")
+
+def test_ipv6_subnets(compiled: dict):
+    assert is_allowed_ip(compiled, "2001:db8::1")
+    assert is_allowed_ip(compiled, "2001:db8:ffff::1")
+    assert not is_allowed_ip(compiled, "2001:db9::1")
+    # Same integer value as an allowed IPv6 prefix, but of the other version
+    assert not is_allowed_ip(compile_rules({"ips": ["::/96"]}), "10.0.0.1")
+
+def test_malformed_entries(compiled: dict):
+    # Kept as plain strings, they only match themselves
+    assert "10.11.0.0/99" in compiled["ip_set"] and "not an ip" in compiled["ip_set"]
+    assert is_allowed_ip(compiled, "not an ip")
+    assert not is_allowed_ip(compiled, "10.11.0.1")
+    assert not is_allowed_ip(compiled, "10.8.0.300")
+
+def test_non_strict_subnet():
+    # Host bits set, the network is used
+    assert is_allowed_ip(compile_rules({"ips": ["10.1.2.3/24"]}), "10.1.2.200")
+
+def test_compiled_rules_are_returned_as_they_are(compiled: dict):
+    assert compile_rules(compiled) is compiled
+    assert compile_rules(None) == {"user_hours": {}, "ip_set": frozenset(), "networks": {}}
@@ -0,0 +1,48 @@
+import pydantic
+import pytest
+
+from cognit.models._cognit_frontend_client import Scheduling
+from cognit.modules._scheduling_cache import SchedulingCache, freeze_requirements
+
+TEST_REQS = {
+      "FLAVOUR": "CyberSecurity",
+      "MAX_LATENCY": 25,
+      "GEOLOCATION": "43.05,-2.53"
+}
+
+@pytest.fixture
+def cache() -> SchedulingCache:
+    return SchedulingCache(max_entries=2)
+
+def test_freeze_is_order_independent():
+    reordered = dict(reversed(list(TEST_REQS.items())))
+    assert freeze_requirements(TEST_REQS) == freeze_requirements(reordered)
+    assert freeze_requirements({"A": 1}) != freeze_requirements({"A": True})
+
+def test_equal_dicts_return_same_instance(cache: SchedulingCache):
+    first = cache.get(TEST_REQS)
+    second = cache.get(dict(TEST_REQS))
+    assert first is second
+    assert first == Scheduling(**TEST_REQS)
+
+def test_precomputed_body_and_digest(cache: SchedulingCache):
+    scheduling = cache.get(TEST_REQS)
+    assert scheduling.body() == Scheduling(**TEST_REQS).json(exclude_unset=True)
+    assert scheduling.digest() == Scheduling(**TEST_REQS).digest()
+
+def test_same_as():
+    assert Scheduling(**TEST_REQS).same_as(Scheduling(**TEST_REQS))
+    assert not Scheduling(**TEST_REQS).same_as(Scheduling(**{**TEST_REQS, "MAX_LATENCY": 30}))
+    assert not Scheduling(**TEST_REQS).same_as(None)
+
+def test_lru_eviction(cache: SchedulingCache):
+    first = cache.get(TEST_REQS)
+    cache.get({**TEST_REQS, "MAX_LATENCY": 30})
+    cache.get({**TEST_REQS, "MAX_LATENCY": 35})
+    assert len(cache) == 2
+    assert cache.get(TEST_REQS) is not first
+
+def test_invalid_requirements_raise(cache: SchedulingCache):
+    with pytest.raises(pydantic.ValidationError):
+        cache.get({"MAX_LATENCY": "not a number"})
+    assert len(cache) == 0
@@ -0,0 +1,105 @@
+import pickle
+
+import cloudpickle as cp
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from cognit.modules._serializers import (
+    ARROW, CLOUDPICKLE, JSON, MSGPACK, NDARRAY, PICKLE5,
+    Serializer, SerializerRegistry, default_registry, is_envelope,
+)
+
+@pytest.fixture
+def registry() -> SerializerRegistry:
+    return default_registry()
+
+def test_select_per_value_type(registry: SerializerRegistry):
+    frame = pd.DataFrame({"user": ["root", "admin"], "failures": [3, 1]})
+    assert registry.select(frame) is ARROW
+    assert registry.select(pa.Table.from_pandas(frame)) is ARROW
+    assert registry.select(np.zeros(4)) is PICKLE5
+    assert registry.select(["Failed password for root"]) is MSGPACK
+    assert registry.select({"ips": ["127.0.0.1"]}) is MSGPACK
+    assert registry.select(("a", "b")) is CLOUDPICKLE
+    assert registry.select(lambda x: x) is CLOUDPICKLE
+
+@pytest.mark.parametrize("value, serializer", [
+    (["Failed password for root", "Accepted password for user1"], MSGPACK),
+    ({"users": [{"user": "user1", "time_ranges": [{"start_hour": 9, "end_hour": 17}]}], 1: b"raw"}, MSGPACK),
+    ({"message": "ok", "failures": [1, 2]}, JSON),
+    (["root", {"port": 22}], CLOUDPICKLE),
+])
+def test_roundtrip(registry: SerializerRegistry, value, serializer: Serializer):
+    blob = registry.encode(value, serializer)
+    assert is_envelope(blob)
+    assert blob[4:5] == serializer.tag
+    assert registry.decode(blob) == value
+
+@pytest.mark.parametrize("serializer", [PICKLE5, NDARRAY])
+def test_array_roundtrip(registry: SerializerRegistry, serializer: Serializer):
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    decoded = registry.decode(registry.encode(array, serializer))
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, array)
+
+def test_pickle5_nested_buffers(registry: SerializerRegistry):
+    value = {"embeddings": np.ones((2, 3)), "labels": ["normal", "attack"]}
+    decoded = registry.decode(registry.encode(value, PICKLE5))
+    np.testing.assert_array_equal(decoded["embeddings"], value["embeddings"])
+    assert decoded["labels"] == value["labels"]
+
+def test_arrow_roundtrip(registry: SerializerRegistry):
+    frame = pd.DataFrame({"user": ["root", "admin"], "failures": [3, 1]})
+    pd.testing.assert_frame_equal(registry.decode(registry.encode(frame)), frame)
+    table = pa.table({"user": ["root"]})
+    assert registry.decode(registry.encode(table)).equals(table)
+
+def test_msgpack_rejects_tuples(registry: SerializerRegistry):
+    with pytest.raises(TypeError):
+        registry.encode([("root", 3)], MSGPACK)
+
+def test_pickle5_buffers_out_of_band(registry: SerializerRegistry):
+    array = np.arange(1 << 16, dtype=np.float64)
+    blob = registry.encode(array, PICKLE5)
+    # The payload holds the raw buffer once, plus a small frame and pickle
+    assert len(blob) - array.nbytes < 512
+    decoded = registry.decode(blob)
+    # Decoded locally without copying the buffer
+    assert not decoded.flags.writeable
+    np.testing.assert_array_equal(decoded, array)
+
+def test_remote_decoder_is_self_contained(registry: SerializerRegistry):
+    array = np.arange(10, dtype=np.int64)
+    decoder = registry.remote_decoder(PICKLE5)
+    assert decoder.__globals__.keys() == {"__builtins__"}
+    assert decoder is registry.remote_decoder(PICKLE5)
+    decoded = pickle.loads(cp.dumps(decoder))(registry.encode(array, PICKLE5))
+    # Remote values own their buffer, the offloaded function may modify them
+    decoded[0] = 42
+    assert decoded[0] == 42
+
+def test_remote_decoder_checks_tag(registry: SerializerRegistry):
+    with pytest.raises(ValueError):
+        registry.remote_decoder(MSGPACK)(registry.encode({"a": 1}, JSON))
+
+def test_unknown_tag(registry: SerializerRegistry):
+    with pytest.raises(ValueError):
+        registry.decode(b"CGNTZpayload")
+    with pytest.raises(ValueError):
+        registry.decode(b"not an envelope")
+
+def test_register():
+    registry = SerializerRegistry()
+    assert registry.names == ["cloudpickle"]
+    registry.register(JSON)
+    assert registry.get("json") is JSON
+    with pytest.raises(ValueError):
+        registry.register(Serializer("other", b"J", JSON.encode, JSON.decode))
+    # Codecs whose modules are not installed are skipped
+    registry.register(Serializer("missing", b"X", JSON.encode, JSON.decode, modules=("not_a_real_module",)))
+    assert registry.get("missing") is None
+    assert registry.get("ndarray") is None
+    registry.register(NDARRAY)
+    assert registry.get("ndarray") is NDARRAY
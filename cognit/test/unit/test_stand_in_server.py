@@ -0,0 +1,69 @@
+import pytest
+import requests as req
+
+from cognit.device_runtime import DeviceRuntime
+from cognit.models._edge_cluster_frontend_client import ExecReturnCode
+from cognit.test.stand_in_server import NetworkProfile, StandInServer
+
+TEST_REQS = {
+    "FLAVOUR": "Energy",
+    "MAX_FUNCTION_EXECUTION_TIME": 5.0
+}
+
+def multiply(a, b):
+    return a * b
+
+def fail():
+    raise ValueError("Boom")
+
+@pytest.fixture
+def server():
+    with StandInServer() as server:
+        yield server
+
+@pytest.fixture
+def device_runtime(server: StandInServer, tmp_path) -> DeviceRuntime:
+    runtime = DeviceRuntime(server.write_config(str(tmp_path / "cognit.yml")))
+    runtime.init(TEST_REQS)
+    return runtime
+
+def test_offload(device_runtime: DeviceRuntime, server: StandInServer):
+    assert device_runtime.call(multiply, 6, 7) == (ExecReturnCode.SUCCESS, 42)
+    assert device_runtime.call(multiply, [1], 3) == (ExecReturnCode.SUCCESS, [1, 1, 1])
+    # The function is uploaded once
+    assert server.counters["POST /v1/daas/upload"] == 1
+    assert server.counters["POST /v1/functions/{id}/execute"] == 2
+
+def test_function_error(device_runtime: DeviceRuntime):
+    ret_code, err = device_runtime.call(fail)
+    assert ret_code == ExecReturnCode.ERROR
+    assert "Boom" in err
+
+def test_wrong_credentials(server: StandInServer):
+    response = req.post(f"{server.url}/v1/authenticate", auth=("stand-in", "wrong"))
+    assert response.status_code == 401
+    response = req.post(f"{server.url}/v1/app_requirements", headers={"token": "forged"}, data="{}")
+    assert response.status_code == 401
+
+def test_injected_latency_and_failures():
+    profile = NetworkProfile(latency=0.05, failure_rate=0.5, seed=1)
+    with StandInServer(profile=profile) as server:
+        statuses = [req.post(f"{server.url}/v1/authenticate", auth=("stand-in", "stand-in")).status_code for _ in range(10)]
+        assert set(statuses) == {201, 503}
+        assert server.counters["injected_failures"] == statuses.count(503)
+        response = req.post(f"{server.url}/v1/authenticate", auth=("stand-in", "stand-in"))
+        assert response.elapsed.total_seconds() >= 0.05
+
+def test_bandwidth_cap():
+    with StandInServer(profile=NetworkProfile(bandwidth=10_000)) as server:
+        response = req.post(f"{server.url}/v1/authenticate", auth=("stand-in", "stand-in"), data=b"x" * 1000)
+        assert response.elapsed.total_seconds() >= 0.1
+
+def test_reauthentication_after_token_revocation(device_runtime: DeviceRuntime, server: StandInServer):
+    assert device_runtime.call(multiply, 2, 3) == (ExecReturnCode.SUCCESS, 6)
+    server.revoke_tokens()
+    with pytest.raises(req.exceptions.HTTPError):
+        device_runtime.call(multiply, 2, 3)
+    # The rejected token makes the next call authenticate again
+    assert device_runtime.call(multiply, 2, 3) == (ExecReturnCode.SUCCESS, 6)
+    assert server.counters["POST /v1/authenticate"] == 2
@@ -0,0 +1,113 @@
+import datetime
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "..", "examples"))
+
+from streaming_detector import SlidingWindowCounter, StreamingDetector
+
+START = datetime.datetime(2000, 10, 19, 10, 0, 0)
+
+def failure(seconds: float, user: str = "bob", ip: str = "10.0.0.1") -> str:
+    timestamp = (START + datetime.timedelta(seconds=seconds)).strftime("%b %d %H:%M:%S")
+    return f"{timestamp} host sshd[1234]: Failed password for {user} from {ip} port 22 ssh2"
+
+def login(seconds: float) -> str:
+    timestamp = (START + datetime.timedelta(seconds=seconds)).strftime("%b %d %H:%M:%S")
+    return f"{timestamp} host sshd[1234]: Accepted password for bob from 10.0.0.1 port 22 ssh2"
+
+def test_sliding_window_counter():
+    counter = SlidingWindowCounter(3)
+    assert counter.add(10) and counter.add(10) and counter.add(11)
+    assert counter.total(11) == 3
+    # Bucket 10 leaves the window when bucket 13 reuses its slot
+    assert counter.add(13)
+    assert counter.total(13) == 2
+    assert counter.total(14) == 1
+    # Late occurrence of a bucket that already left the window
+    assert not counter.add(10)
+    assert counter.total(13) == 2
+    # Even when its slot is empty
+    counter = SlidingWindowCounter(3)
+    assert counter.add(20)
+    assert not counter.add(16)
+    assert counter.total(20) == 1
+
+def test_failures_leave_the_window():
+    detector = StreamingDetector(window=300, buckets=6, user_threshold=5)
+    result = detector.process([failure(i) for i in range(4)])
+    assert result["events"] == []
+    # Four more failures once the first ones left the window
+    result = detector.process([failure(600 + i) for i in range(4)])
+    assert result["events"] == []
+    result = detector.process([failure(610)])
+    assert [event["user"] for event in result["events"]] == ["bob"]
+
+def test_burst_across_batches():
+    detector = StreamingDetector(user_threshold=5)
+    assert detector.process([failure(i) for i in range(3)])["events"] == []
+    # Successful logins are not failures
+    assert detector.process([login(3), failure(4)])["events"] == []
+    events = detector.process([failure(5)])["events"]
+    assert events == [{
+        "user": "bob",
+        "severity": 3,
+        "ip": None,
+        "timestamp": (START + datetime.timedelta(seconds=5)).replace(year=datetime.datetime.now().year).isoformat(),
+        "reason": "5 authentication failures of the user bob in 300s",
+    }]
+
+def test_ip_burst_has_no_user():
+    detector = StreamingDetector(user_threshold=100, ip_threshold=10)
+    events = detector.process([failure(i, user=f"u{i}", ip="10.0.0.9") for i in range(12)])["events"]
+    assert [(event["user"], event["ip"]) for event in events] == [(None, "10.0.0.9")]
+
+def test_one_event_per_window():
+    detector = StreamingDetector(window=300, buckets=6, user_threshold=5, ip_threshold=1000)
+    events = detector.process([failure(i) for i in range(20)])["events"]
+    assert len(events) == 1
+    # Still within the window of the event
+    assert detector.process([failure(200 + i) for i in range(10)])["events"] == []
+    # A new window
+    events = detector.process([failure(700 + i) for i in range(5)])["events"]
+    assert len(events) == 1
+
+def test_max_keys():
+    detector = StreamingDetector(user_threshold=3, ip_threshold=100, max_keys=2)
+    detector.process([failure(0, user="ana", ip="UNKNOWN"), failure(1, user="bob", ip="UNKNOWN")])
+    detector.process([failure(2, user="eve", ip="UNKNOWN")])
+    assert list(detector.counters) == [("user", "bob"), ("user", "eve")]
+    # ana was evicted, her previous failure is not counted anymore
+    events = detector.process([failure(3 + i, user="ana", ip="UNKNOWN") for i in range(2)])["events"]
+    assert events == []
+    assert len(detector.counters) == 2
+
+def test_late_lines():
+    detector = StreamingDetector(window=300, buckets=6, user_threshold=3)
+    detector.process([failure(1000), failure(1001)])
+    counter = detector.counters[("user", "bob")]
+    rate_count = detector.rate_count
+    # Older than the window, neither counted nor making an event
+    assert detector.process([failure(0)] * 5)["events"] == []
+    assert sum(counter.counts) == 2
+    # Late but within the window, counted by the sliding window only
+    assert detector.process([failure(960)])["events"] == []
+    assert sum(counter.counts) == 3
+    assert detector.rate_count == rate_count
+
+def test_rate_anomaly():
+    detector = StreamingDetector(window=60, buckets=6, user_threshold=1000, ip_threshold=1000, rate_min_failures=20)
+    # One failure every bucket, a different user each time
+    baseline = [failure(10 * i + 1, user=f"u{i}") for i in range(12)]
+    assert detector.process(baseline)["anomalies"] == []
+    spike = [failure(121, user=f"s{i}") for i in range(30)]
+    anomalies = detector.process(spike)["anomalies"]
+    assert len(anomalies) == 1
+    assert anomalies[0]["failures"] == 20 and anomalies[0]["expected"] == 1.0
+    assert anomalies[0]["log_entry"] == spike[19]
+    # Reported once per bucket
+    assert detector.process([failure(122, user="t")])["anomalies"] == []
+
+def test_no_rate_anomaly_before_a_full_window():
+    detector = StreamingDetector(window=60, buckets=6, rate_min_failures=5)
+    assert detector.process([failure(1, user=f"s{i}") for i in range(50)])["anomalies"] == []
@@ -0,0 +1,93 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "..", "examples"))
+
+from template_miner import PARAM, TemplateMiner, mask_tokens
+
+FAILED = "Oct 19 10:00:0{} host sshd[{}]: Failed password for {} from {} port {} ssh2"
+
+def rebuild(template: str, parameters: list) -> str:
+    for parameter in parameters:
+        template = template.replace(PARAM, parameter, 1)
+    return template
+
+def test_mask_tokens():
+    tokens, masked = mask_tokens(FAILED.format(1, 1234, "bob", "10.0.0.1", 22))
+    assert tokens == ["sshd[1234]:", "Failed", "password", "for", "bob", "from", "10.0.0.1", "port", "22", "ssh2"]
+    assert masked == ["sshd[<*>]:", "Failed", "password", "for", "bob", "from", "<*>", "port", "<*>", "ssh2"]
+
+def test_lines_of_an_event_are_merged():
+    miner = TemplateMiner()
+    first, parameters = miner.add_line(FAILED.format(1, 1234, "bob", "10.0.0.1", 22))
+    assert first.template == "sshd[<*>]: Failed password for bob from <*> port <*> ssh2"
+    assert parameters == ["1234", "10.0.0.1", "22"]
+    second, parameters = miner.add_line(FAILED.format(2, 99, "eve", "10.0.0.2", 2222))
+    assert second is first and first.size == 2
+    assert first.template == "sshd[<*>]: Failed password for <*> from <*> port <*> ssh2"
+    assert parameters == ["99", "eve", "10.0.0.2", "2222"]
+    assert len(miner) == 1
+
+def test_lines_are_rebuilt_from_the_template():
+    miner = TemplateMiner()
+    lines = [
+        FAILED.format(1, 1234, "bob", "10.0.0.1", 22),
+        FAILED.format(2, 99, "eve", "10.0.0.2", 2222),
+        "Oct 19 10:00:03 host CRON[77]: pam_unix(cron:session): session opened for user root by (uid=0)",
+    ]
+    for line in lines:
+        cluster, parameters = miner.add_line(line)
+        assert rebuild(cluster.template, parameters) == line.split(" ", 4)[4]
+
+def test_routing_tokens_are_not_merged():
+    miner = TemplateMiner()
+    failed, _ = miner.add_line(FAILED.format(1, 1, "bob", "10.0.0.1", 22))
+    accepted, _ = miner.add_line("Oct 19 10:00:02 host sshd[1]: Accepted password for bob from 10.0.0.1 port 22 ssh2")
+    assert accepted is not failed
+    assert len(miner) == 2
+
+def test_dissimilar_lines_start_a_template():
+    miner = TemplateMiner(similarity_threshold=0.9)
+    miner.add_line("Oct 19 10:00:01 host app: a b c d e f")
+    cluster, _ = miner.add_line("Oct 19 10:00:02 host app: a b x y z w")
+    assert cluster.template == "app: a b x y z w"
+    assert len(miner) == 2
+
+def test_max_clusters():
+    miner = TemplateMiner(max_clusters=2)
+    first, _ = miner.add_line("Oct 19 10:00:01 host app: one")
+    second, _ = miner.add_line("Oct 19 10:00:01 host app: two words")
+    # Matched again, it is now the most recently used
+    miner.add_line("Oct 19 10:00:01 host app: one")
+    third, _ = miner.add_line("Oct 19 10:00:01 host app: three more words")
+    assert len(miner) == 2
+    assert miner.get_cluster(second.cluster_id) is None
+    assert miner.get_cluster(first.cluster_id) is first and miner.get_cluster(third.cluster_id) is third
+    # The evicted template is learnt again with a new id
+    again, _ = miner.add_line("Oct 19 10:00:01 host app: two words")
+    assert again.cluster_id not in (first.cluster_id, second.cluster_id, third.cluster_id)
+    assert miner.match("Oct 19 10:00:01 host app: one") is None
+
+def test_max_children():
+    miner = TemplateMiner(depth=3, max_children=3)
+    clusters = [miner.add_line(f"Oct 19 10:00:01 host {name} started")[0] for name in ("alpha", "beta", "gamma", "delta")]
+    node = miner.root[2]
+    # Two named children and the <*> child that takes the overflow
+    assert sorted(node) == [PARAM, "alpha", "beta"]
+    assert clusters[2] is clusters[3]
+    assert clusters[3].template == f"{PARAM} started"
+
+def test_match_does_not_learn():
+    miner = TemplateMiner()
+    assert miner.match(FAILED.format(1, 1, "bob", "10.0.0.1", 22)) is None
+    cluster, _ = miner.add_line(FAILED.format(1, 1, "bob", "10.0.0.1", 22))
+    matched = miner.match(FAILED.format(2, 2, "bob", "10.0.0.9", 23))
+    assert matched is cluster and cluster.size == 1
+    # Different number of tokens
+    assert miner.match("Oct 19 10:00:02 host sshd[1]: Failed password for bob") is None
+
+def test_depth():
+    with pytest.raises(ValueError):
+        TemplateMiner(depth=2)
@@ -1,70 +1,210 @@
+import re
+import datetime
+
+import numpy as np
+
+from cognit.device_runtime import ResultEncoding, result_encoding
+from rule_engine import compile_rules, is_allowed_ip
+
+# Message classes, in the order determine_severity checks them
+KIND_OTHER = 0
+KIND_LOGOUT = 1
+KIND_SUDO = 2
+KIND_INVALID_USER = 3
+KIND_REPEATED_FAILURES = 4
+KIND_NOT_IN_SUDOERS = 5
+KIND_FAILED_PASSWORD = 6
+KIND_AUTH_FAILURE = 7
+
+# Single pass over a line: the timestamp and process at the start, then the
+# user and IP candidates. "for <user>" must not consume the "from <ip>" after it.
+LINE_TOKENS = re.compile(
+    r"^(?P<ts>(?P<mon>\w+) (?P<day>\d+) (?P<hh>\d+):(?P<mm>\d+):(?P<ss>\d+))(?: \S+ (?P<proc>[^\s\[:]+))?"
+    r"|user (?P<user>\w+)"
+    r"|for (?P<for_user>\w+)(?= from)"
+    r"|rhost=(?P<rhost>\d+\.\d+\.\d+\.\d+)"
+    r"|from (?P<from_ip>\d+\.\d+\.\d+\.\d+)"
+)
+# Case-insensitive keywords that classify the message, searched in the lowercased line
+KEYWORD_FLAGS = (
+    ("logged out", 1),
+    ("sudo: ", 2),
+    ("user not in sudoers", 4),
+    ("invalid user", 8),
+    ("multiple authentication failures", 16),
+    ("pam_unix(sshd:auth): authentication failure", 32),
+    ("failed password for", 64),
+)
+
+def message_kind(flags):
+    """Message class of a line given the keywords found in it."""
+    if flags & 1:
+        return KIND_LOGOUT
+    if flags & 2 and not flags & 4:
+        return KIND_SUDO
+    if flags & 8:
+        return KIND_INVALID_USER
+    if flags & 16:
+        return KIND_REPEATED_FAILURES
+    if flags & 4:
+        return KIND_NOT_IN_SUDOERS
+    if flags & 64:
+        return KIND_FAILED_PASSWORD
+    if flags & 32:
+        return KIND_AUTH_FAILURE
+    return KIND_OTHER
+
+def tokenize_auth_log(log_content, year=None):
+    """Parse auth.log lines with a single regex pass per line.
+
+    Lines that do not start with a timestamp are skipped. Timestamps are parsed
+    once per distinct day and hour.
+
+    Args:
+        log_content: List of log lines
+        year: Year of the timestamps, the current one if None
+
+    Returns:
+        Dictionary of columns: timestamp, process, user, ip, message (lists),
+        hour, unix_time and kind (NumPy arrays)
+    """
+    if year is None:
+        year = datetime.datetime.now().year
+    timestamps, processes, users, ips, messages, hours, unix_times, kinds = [], [], [], [], [], [], [], []
+    hour_cache = {}
+    kinds_by_flags = {}
+    finditer = LINE_TOKENS.finditer
+    for line in log_content:
+        tokens = finditer(line)
+        first = next(tokens, None)
+        if first is None or first.start() != 0:
+            continue
+        ts, proc, mon, day, hh, mm, ss = first.group("ts", "proc", "mon", "day", "hh", "mm", "ss")
+        if ts is None:
+            continue
+        user = ip = None
+        for match in tokens:
+            group = match.lastgroup
+            if group == "user" or group == "for_user":
+                if user is None:
+                    user = match[group]
+            elif ip is None:
+                ip = match[group]
+        lowered = line.lower()
+        flags = 0
+        for keyword, flag in KEYWORD_FLAGS:
+            if keyword in lowered:
+                flags |= flag
+        minutes, seconds = int(mm), int(ss)
+        cached = hour_cache.get((mon, day, hh))
+        if cached is None or minutes > 59 or seconds > 61:
+            # strptime validates the timestamp as a whole
+            dt = datetime.datetime.strptime(f"{year} {ts}", "%Y %b %d %H:%M:%S")
+            cached = hour_cache[(mon, day, hh)] = (dt.hour, dt.timestamp() - dt.minute * 60 - dt.second)
+        kind = kinds_by_flags.get(flags)
+        if kind is None:
+            kind = kinds_by_flags[flags] = message_kind(flags)
+        timestamps.append(ts)
+        processes.append(proc or "UNKNOWN")
+        users.append(user or "UNKNOWN")
+        ips.append(ip or "UNKNOWN")
+        messages.append(line.strip())
+        hours.append(cached[0])
+        unix_times.append(cached[1] + minutes * 60 + seconds)
+        kinds.append(kind)
+    return {
+        "timestamp": timestamps,
+        "process": processes,
+        "user": users,
+        "ip": ips,
+        "message": messages,
+        "hour": np.array(hours, dtype=np.int8),
+        "unix_time": np.array(unix_times, dtype=np.float64),
+        "kind": np.array(kinds, dtype=np.int8),
+    }
+
+# Reasons of the severities, indexed by the reason codes of score_severity
+REASON_NONE = 0
+REASON_SUDO = 1
+REASON_INVALID_USER = 2
+REASON_REPEATED_FAILURES = 3
+REASON_PRIVILEGE_ESCALATION = 4
+REASON_UNUSUAL_TIME = 5
+REASON_UNUSUAL_IP = 6
+REASONS = (
+    None,
+    "Perhaps a privilege escalation attempts",
+    "Failed authentication attempts (Invalid user)",
+    "Failed authentication attempts (repeated failures)",
+    "Privilege escalation attempts",
+    "Unusual access patterns or times",
+    "Network anomalies - unusua IP",
+)
+
+def factorize(values):
+    """Integer code of each value and the distinct values, in order of appearance."""
+    codes = {}
+    encoded = np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=np.int64, count=len(values))
+    return encoded, list(codes)
+
+def score_severity(columns, compiled_rules):
+    """Severity and reason code of every line of a tokenized batch.
+
+    The rules are looked up once per distinct user and IP, the lines are then
+    scored with array operations. The conditions are checked in order, the
+    first one that holds gives the severity:
+    0: logout or sudo, 3: invalid user, repeated failures, privilege escalation
+    or failed login of an unknown user, 2: known user outside the allowed hours,
+    1: IP not allowed.
+
+    Args:
+        columns: Columns returned by tokenize_auth_log
+        compiled_rules: Rules compiled by rule_engine.compile_rules
+
+    Returns:
+        Tuple of NumPy arrays (severity, reason code), see REASONS
+    """
+    kind, hour = columns["kind"], columns["hour"].astype(np.int64)
+    user_codes, users = factorize(columns["user"])
+    ip_codes, ips = factorize(columns["ip"])
+    user_hours = compiled_rules["user_hours"]
+    known_user = np.array([user in user_hours for user in users], dtype=bool)[user_codes]
+    allowed_hours = np.array([user_hours.get(user, 0) for user in users], dtype=np.int64)[user_codes]
+    allowed_ip = np.array([is_allowed_ip(compiled_rules, ip) for ip in ips], dtype=bool)[ip_codes]
+    login_failure = (kind == KIND_FAILED_PASSWORD) | (kind == KIND_AUTH_FAILURE)
+
+    conditions = [
+        kind == KIND_LOGOUT,
+        kind == KIND_SUDO,
+        kind == KIND_INVALID_USER,
+        kind == KIND_REPEATED_FAILURES,
+        kind == KIND_NOT_IN_SUDOERS,
+        login_failure & ~known_user,
+        kind == KIND_FAILED_PASSWORD,
+        known_user & ((allowed_hours >> hour) & 1 == 0),
+        ~allowed_ip,
+    ]
+    severity = np.select(conditions, [0, 0, 3, 3, 3, 3, 3, 2, 1], default=0).astype(np.int8)
+    reason = np.select(conditions, [
+        REASON_NONE,
+        REASON_SUDO,
+        REASON_INVALID_USER,
+        REASON_REPEATED_FAILURES,
+        REASON_PRIVILEGE_ESCALATION,
+        REASON_INVALID_USER,
+        REASON_REPEATED_FAILURES,
+        REASON_UNUSUAL_TIME,
+        REASON_UNUSUAL_IP,
+    ], default=REASON_NONE).astype(np.int8)
+    return severity, reason
+
+# The result is plain data: decode it as JSON on the device instead of unpickling it
+@result_encoding(ResultEncoding.JSON)
 def get_authentication_failures(log_content, rules):
-    """Analyze log content for authentication failures using rules and generate block events."""
-    import re
-    import datetime
-    import numpy as np
-
-    def extract_logs(log_content):
-        timestamps, messages, users, ip_addresses = [], [], [], []
-        for line in log_content:
-            match = re.match(r"(\w+ \d+ \d+:\d+:\d+)", line)
-            if match:
-                timestamps.append(match.group(1))
-                messages.append(line.strip())
-                user_match = re.search(r"user (\w+)|for (\w+) from", line)
-                user = user_match.group(1) if user_match and user_match.group(1) else \
-                       user_match.group(2) if user_match and user_match.group(2) else "UNKNOWN"
-                users.append(user)
-                ip_match = re.search(r"rhost=(\d+\.\d+\.\d+\.\d+)|from (\d+\.\d+\.\d+\.\d+)", line)
-                ip = ip_match.group(1) if ip_match and ip_match.group(1) else \
-                     ip_match.group(2) if ip_match and ip_match.group(2) else "UNKNOWN"
-                ip_addresses.append(ip)
-        return timestamps, messages, users, ip_addresses
-
-    def convert_to_unix(timestamps):
-        current_year = datetime.datetime.now().year
-        unix_times = []
-        hours = []
-        for time in timestamps:
-            dt = datetime.datetime.strptime(f"{current_year} {time}", "%Y %b %d %H:%M:%S")
-            unix_times.append(dt.timestamp())
-            hours.append(dt.hour)
-        return np.array(unix_times).reshape(-1, 1), hours
-
-    def determine_severity(hour, user, ip_address, message):
-        reason = None
-        if re.search(r"logged out", message, re.IGNORECASE):
-            return 0, reason
-        if re.search(r"sudo: ", message, re.IGNORECASE) and not re.search(r"user NOT in sudoers", message, re.IGNORECASE):
-            reason = "Perhaps a privilege escalation attempts"
-            return 0, reason
-        if re.search(r"Invalid user|multiple authentication failures|user NOT in sudoers", message, re.IGNORECASE):
-            if re.search(r"Invalid user", message, re.IGNORECASE):
-                reason = "Failed authentication attempts (Invalid user)"
-            elif re.search(r"multiple authentication failures", message, re.IGNORECASE):
-                reason = "Failed authentication attempts (repeated failures)"
-            else:
-                reason = "Privilege escalation attempts"
-            return 3, reason
-        if re.search(r"pam_unix\(sshd:auth\): authentication failure|Failed password for", message, re.IGNORECASE):
-            user_exists = any(u.get('user') == user for u in rules.get('users', []))
-            if not user_exists:
-                return 3, "Failed authentication attempts (Invalid user)"
-            if re.search(r"Failed password for", message, re.IGNORECASE):
-                reason = "Failed authentication attempts (repeated failures)"
-                return 3, reason
-        for user_rule in rules.get('users', []):
-            if user == user_rule.get('user'):
-                time_ranges = user_rule.get('time_ranges', [])
-                for time_range in time_ranges:
-                    if hour < time_range.get('start_hour', 0) or hour > time_range.get('end_hour', 24):
-                        reason = "Unusual access patterns or times"
-                        return 2, reason
-        if ip_address not in rules.get('ips', []):
-            reason = "Network anomalies - unusua IP"
-            return 1, reason
-        return 0, reason
+    """Analyze log content for authentication failures using rules and generate block events.
 
+    The rules can be given compiled by rule_engine.compile_rules, to compile them only once.
+    """
     try:
         if not log_content:
             return {
@@ -72,28 +212,31 @@ def get_authentication_failures(log_content, rules):
                 "anomalies": [],
             }
 
-        timestamps, messages, users, ip_addresses = extract_logs(log_content)
+        columns = tokenize_auth_log(log_content)
+        timestamps = columns["timestamp"]
         if not timestamps:
             return {
                 "message": "No logs to analyze",
                 "anomalies": [],
             }
 
-        _, hours = convert_to_unix(timestamps)
-
-        confirmed_anomalies = []
-
-        for i, timestamp in enumerate(timestamps):
-            severity, reason = determine_severity(hours[i], users[i], ip_addresses[i], messages[i])
-            if severity > 0:
-                confirmed_anomalies.append({
-                    "log_entry": messages[i],
-                    "user": users[i] if users[i] != "UNKNOWN" else None,
-                    "ip_address": ip_addresses[i] if ip_addresses[i] != "UNKNOWN" else None,
-                    "timestamp": timestamp,
-                    "severity": severity,
-                    "reason": reason or "no specific reason",
-                })
+        severity, reason = score_severity(columns, compile_rules(rules))
+        anomalous = np.flatnonzero(severity > 0)
+        messages, users, ip_addresses = columns["message"], columns["user"], columns["ip"]
+
+        confirmed_anomalies = [
+            {
+                "log_entry": messages[i],
+                "user": users[i] if users[i] != "UNKNOWN" else None,
+                "ip_address": ip_addresses[i] if ip_addresses[i] != "UNKNOWN" else None,
+                "timestamp": timestamps[i],
+                "severity": line_severity,
+                "reason": REASONS[line_reason] or "no specific reason",
+            }
+            for i, line_severity, line_reason in zip(
+                anomalous.tolist(), severity[anomalous].tolist(), reason[anomalous].tolist()
+            )
+        ]
         if confirmed_anomalies:
             result_message = f"Detected {len(confirmed_anomalies)} confirmed anomalies"
 
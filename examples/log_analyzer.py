@@ -1,23 +1,75 @@
 """This module contains functions for analyzing log files and generating security events."""
 
-def get_authentication_failures(log_content, rules):
+from cognit.device_runtime import ResultEncoding, result_encoding
+from process_cache import ProcessCache
+from rule_engine import compile_rules, is_allowed_ip
+from template_miner import mask_tokens
+
+# Loaded models by model path, as (mtime of the file, pipeline)
+_pipelines = ProcessCache()
+
+@result_encoding(ResultEncoding.JSON)
+def get_authentication_failures(log_content, rules, model_path=".log_analyzer_model.joblib", background_retrain=True):
     """Analyze log content for authentication failures using decision tree and generate block events.
-    
+
+    The model (scaler and IsolationForest) is trained once on a
+    baseline window of log lines and persisted with joblib next to the function,
+    new batches are only scored with it. It is retrained in the background, on
+    the recent window, when it gets old or when the batches drift away from it.
+    Until the window holds enough lines for a baseline, each batch is scored
+    with a model fitted on the lines seen so far.
+
+    The files live in the serverless runtime: a relative model_path is resolved
+    against the working directory of its worker, pass an absolute path on storage
+    that outlives the worker. A background retraining runs in a daemon thread of
+    the worker. If the worker is reclaimed before it finishes, the model is not
+    updated and the ".lock" file it leaves blocks retraining for RETRAIN_TIMEOUT.
+
     Args:
         log_content: List of log lines to analyze
-        rules: Rules configuration for validation
-        
+        rules: Rules configuration for validation, or the rules compiled by rule_engine.compile_rules
+        model_path: Path of the persisted model. The window of recent lines is kept in model_path + ".window".
+        background_retrain: Retrain in a thread after returning the result. If False, the
+        call that triggers the retraining waits for it, for runtimes that reclaim their
+        workers once a call returns.
+
     Returns:
         Dictionary containing detected anomalies and recommended events
     """
+    import os
     import re
     import datetime
+    import threading
+    import time
+    import joblib
     import numpy as np
-    import pandas as pd
+    import scipy.sparse as sp
     from sklearn.ensemble import IsolationForest
-    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.feature_extraction.text import HashingVectorizer
     from sklearn.preprocessing import StandardScaler
 
+    # Lines needed to train the persisted baseline model
+    BASELINE_LINES = 1000
+    # Recent lines kept to retrain the model
+    WINDOW_LINES = 20000
+    # Age in seconds after which the model is retrained
+    RETRAIN_INTERVAL = 24 * 3600
+    # Age in seconds after which the lock of a retraining that did not finish is ignored
+    RETRAIN_TIMEOUT = 3600
+    CONTAMINATION = 0.01
+    # Drift: share of anomalies above DRIFT_ANOMALY_RATIO times the contamination, or share of
+    # users, IPs and event types unseen at training time above DRIFT_UNSEEN_SHARE. Only
+    # measured on batches of at least DRIFT_MIN_LINES lines.
+    DRIFT_ANOMALY_RATIO = 5
+    DRIFT_UNSEEN_SHARE = 0.2
+    DRIFT_MIN_LINES = 100
+    # Version of the features, persisted models of other versions are retrained
+    FEATURES_VERSION = 3
+    window_path = model_path + ".window"
+    lock_path = model_path + ".lock"
+    # Stateless: the columns of the message features mean the same in every batch
+    vectorizer = HashingVectorizer(n_features=2 ** 10, alternate_sign=False, norm="l2")
+
     def extract_logs(log_content):
         """Extract logs from a list of lines"""
         timestamps, messages, event_types, users, ip_addresses = [], [], [], [], []
@@ -51,6 +103,113 @@ def get_authentication_failures(log_content, rules):
             dt_objects.append(dt)
         return np.array(unix_times).reshape(-1, 1), hours, dt_objects
 
+    def log_template(message):
+        """Message without the timestamp and host, masked as by the device's TemplateMiner"""
+        return " ".join(mask_tokens(message)[1])
+
+    def encode(values, vocabulary):
+        """Codes of the values in the training vocabulary, unseen values get their own code"""
+        unseen = len(vocabulary)
+        return np.array([vocabulary.get(value, unseen) for value in values], dtype=np.float64).reshape(-1, 1)
+
+    def build_features(pipeline, messages, event_types, users, ip_addresses, dt_objects):
+        """Feature matrix of the lines and the share of categorical values unseen at training time"""
+        # Time of the day, absolute times of new batches would always be out of the training range
+        seconds = np.array([dt.hour * 3600 + dt.minute * 60 + dt.second for dt in dt_objects], dtype=np.float64)
+        message_features = vectorizer.transform([log_template(message) for message in messages])
+        vocabularies = pipeline["vocabularies"]
+        columns = [
+            encode(event_types, vocabularies["event_type"]),
+            encode(users, vocabularies["user"]),
+            encode(ip_addresses, vocabularies["ip"]),
+        ]
+        unseen = sum(float(np.mean(column == len(vocabulary))) for column, vocabulary in zip(columns, vocabularies.values())) / 3
+        dense = np.hstack([seconds.reshape(-1, 1)] + columns)
+        return sp.hstack([sp.csr_matrix(dense), message_features], format="csr"), unseen
+
+    def fit_pipeline(lines):
+        """Fits the scaler and the model on log lines"""
+        timestamps, messages, event_types, users, ip_addresses = extract_logs(lines)
+        _, _, dt_objects = convert_to_unix(timestamps)
+        pipeline = {
+            "features_version": FEATURES_VERSION,
+            "vocabularies": {
+                "event_type": {value: code for code, value in enumerate(dict.fromkeys(event_types))},
+                "user": {value: code for code, value in enumerate(dict.fromkeys(users))},
+                "ip": {value: code for code, value in enumerate(dict.fromkeys(ip_addresses))},
+            },
+            "trained_at": time.time(),
+            "lines": len(messages),
+        }
+        features, _ = build_features(pipeline, messages, event_types, users, ip_addresses, dt_objects)
+        # Without centering, which would densify the matrix
+        pipeline["scaler"] = StandardScaler(with_mean=False).fit(features)
+        pipeline["model"] = IsolationForest(
+            contamination=CONTAMINATION, max_samples='auto', random_state=42, n_jobs=-1, n_estimators=100
+        ).fit(pipeline["scaler"].transform(features))
+        return pipeline
+
+    def load_pipeline():
+        """Persisted model, kept in memory until the file changes"""
+        try:
+            mtime = os.stat(model_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = _pipelines.get(model_path)
+        if cached is None or cached[0] != mtime:
+            cached = _pipelines[model_path] = (mtime, joblib.load(model_path))
+        pipeline = cached[1]
+        if pipeline.get("features_version") != FEATURES_VERSION:
+            # Trained on other features, replaced by a model trained on the window
+            return None
+        return pipeline
+
+    def save_pipeline(pipeline):
+        """Persists the model atomically, concurrent calls never see a partial file"""
+        tmp_path = f"{model_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump(pipeline, tmp_path)
+        os.replace(tmp_path, model_path)
+
+    def update_window(lines):
+        """Appends the lines to the window file and returns the last WINDOW_LINES lines"""
+        with open(window_path, "a+", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+            f.seek(0)
+            window = f.read().splitlines()
+        if len(window) > 2 * WINDOW_LINES:
+            # Trimmed from time to time instead of rewriting the file on every call
+            tmp_path = f"{window_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("".join(line + "\n" for line in window[-WINDOW_LINES:]))
+            os.replace(tmp_path, window_path)
+        return window[-WINDOW_LINES:]
+
+    def retrain(window):
+        try:
+            save_pipeline(fit_pipeline(window))
+        finally:
+            os.remove(lock_path)
+
+    def start_retrain(window):
+        """Retrains the model on the window, unless another call already is"""
+        try:
+            # The lock file also covers the calls executed by other processes
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_path).st_mtime < RETRAIN_TIMEOUT:
+                    return
+                # Left by a retraining that did not finish
+                os.remove(lock_path)
+            except FileNotFoundError:
+                # The retraining finished in the meantime
+                pass
+            return
+        if background_retrain:
+            threading.Thread(target=retrain, args=(window,), daemon=True).start()
+        else:
+            retrain(window)
+
     def determine_severity(hour, user, ip_address, message):
         """
         Determine the severity level of a potential security anomaly.
@@ -83,25 +242,18 @@ def get_authentication_failures(log_content, rules):
         # Check for authentication failures (severity 3)
         if re.search(r"pam_unix\(sshd:auth\): authentication failure|Failed password for", message, re.IGNORECASE):
             # Check if user exists in the rules
-            user_exists = any(u.get('user') == user for u in rules.get('users', []))
-            if not user_exists:
+            if user not in user_hours:
                 # Unknown user attempting to log in - highly suspicious
                 return 3
 
         # Check for time-based violations (severity 2)
-        for user_rule in rules.get('users', []):
-            if user == user_rule.get('user'):
-                # Check if this user has time range restrictions
-                time_ranges = user_rule.get('time_ranges', [])
-                
-                if time_ranges:
-                    # Check if login attempt is outside allowed hours
-                    for time_range in time_ranges:
-                        if hour < time_range.get('start_hour', 0) or hour > time_range.get('end_hour', 24):
-                            return 2
+        allowed_hours = user_hours.get(user)
+        if allowed_hours is not None and not allowed_hours >> hour & 1:
+            # Login attempt outside the allowed hours
+            return 2
 
         # Check for IP-based anomalies (severity 1)
-        if ip_address not in rules.get('ips', []):
+        if not is_allowed_ip(compiled_rules, ip_address):
             return 1
 
         # If we reach here, no anomaly was detected
@@ -116,6 +268,9 @@ def get_authentication_failures(log_content, rules):
                 "events": []
             }
 
+        compiled_rules = compile_rules(rules)
+        user_hours = compiled_rules["user_hours"]
+
         timestamps, messages, event_types, users, ip_addresses = extract_logs(log_content)
 
         # If no logs were extracted, return early
@@ -126,25 +281,25 @@ def get_authentication_failures(log_content, rules):
                 "events": []
             }
             
-        unix_times, hours, dt_objects = convert_to_unix(timestamps)
-
-        # Prepare feature extraction for messages
-        vectorizer = TfidfVectorizer(max_features=100, min_df=2)
-        message_features = vectorizer.fit_transform(messages).toarray()
-
-        event_types_encoded = pd.factorize(pd.Series(event_types))[0].reshape(-1, 1)
-        users_encoded = pd.factorize(pd.Series(users))[0].reshape(-1, 1)
-        ip_encoded = pd.factorize(pd.Series(ip_addresses))[0].reshape(-1, 1)
-
-        features = np.hstack((unix_times, message_features, event_types_encoded, users_encoded, ip_encoded))
+        _, hours, dt_objects = convert_to_unix(timestamps)
 
-        scaler = StandardScaler()
-        features_scaled = scaler.fit_transform(features)
+        window = update_window(messages)
+        pipeline = load_pipeline()
+        if pipeline is None:
+            # No baseline yet: fitted on the lines seen so far, persisted once they are enough
+            pipeline = fit_pipeline(window)
+            if len(window) >= BASELINE_LINES:
+                save_pipeline(pipeline)
 
-        model = IsolationForest(contamination=0.01, max_samples='auto', random_state=42, n_jobs=-1, n_estimators=100, warm_start=True)
-        model.fit(features_scaled)
+        features, unseen = build_features(pipeline, messages, event_types, users, ip_addresses, dt_objects)
+        anomalies = pipeline["model"].predict(pipeline["scaler"].transform(features))
 
-        anomalies = model.predict(features_scaled)
+        drifted = len(messages) >= DRIFT_MIN_LINES and (
+            np.mean(anomalies == -1) > DRIFT_ANOMALY_RATIO * CONTAMINATION or unseen > DRIFT_UNSEEN_SHARE
+        )
+        expired = time.time() - pipeline["trained_at"] > RETRAIN_INTERVAL
+        if (drifted or expired) and pipeline["lines"] >= BASELINE_LINES:
+            start_retrain(window)
 
         results = []
         confirmed_anomalies = []
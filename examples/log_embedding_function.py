@@ -1,48 +1,88 @@
-"""Serverless-style single-file module for log line classification via embedding similarity.
-Only external dependencies expected: transformers, accelerate.
+"""Serverless-style module for log line classification via embedding similarity.
+Only external dependencies expected: transformers, accelerate (and numpy, which
+they depend on). The only local import, process_cache, is not needed remotely.
 
 Usage:
     from log_embedding_function import classify_log_line
     label = classify_log_line("Feb 20 10:15:32 server sshd[12345]: Accepted password for user1 from 192.168.1.10 port 54321 ssh2")
 
 If the local embedding database file (default: .emb) does not exist, it is built
-from the sample logs (normal vs anomalous) embedded with a tiny model.
+from the sample logs (normal vs anomalous) embedded with a tiny model. It is
+loaded once per process and kept in memory as a matrix until the file changes.
 """
-
-
-def classify_log_line(log_line: str, db_path: str = ".emb", _state={"model_pipeline": None}) -> str:
+from process_cache import ProcessCache
+
+# Embedding model and database matrices, by model name and by database path
+_cache = ProcessCache()
+
+
+def build_embedding_matrix(items):
+    """Stacks the embeddings of database items as the rows of a contiguous float32
+    matrix, normalized to unit norm so that a dot product is a cosine similarity.
+    Items whose embedding has not the dimension of the first one are skipped.
+
+    Returns (matrix, items kept).
+    """
+    import numpy as np
+
+    if not items:
+        return np.zeros((0, 0), dtype=np.float32), []
+    dim = len(items[0]["embedding"])
+    kept = [item for item in items if len(item["embedding"]) == dim]
+    matrix = np.array([item["embedding"] for item in kept], dtype=np.float32).reshape(len(kept), dim)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return np.ascontiguousarray(matrix), kept
+
+
+def nearest_rows(matrix, query, k=1):
+    """Rows of a unit-norm matrix most similar to a unit-norm query, with a single
+    matrix-vector product. Returns (row indices, cosine similarities), best first.
+    """
+    import numpy as np
+
+    if matrix.shape[0] == 0 or matrix.shape[1] != len(query):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    similarities = matrix @ np.asarray(query, dtype=np.float32)
+    k = min(k, len(similarities))
+    if k == 1:
+        top = np.array([int(np.argmax(similarities))])
+    else:
+        top = np.argpartition(similarities, -k)[-k:]
+        top = top[np.argsort(similarities[top])[::-1]]
+    return top, similarities[top]
+
+
+def classify_log_line(
+    log_line: str,
+    db_path: str = ".emb",
+) -> str:
     """Public serverless-style entrypoint. Returns closest label (normal|anomalous|unknown)."""
 
     import json
-    import math
     import os
     import time
+    import numpy as np
     from transformers import pipeline
 
     start_time = time.perf_counter()
     model_name = "sentence-transformers/paraphrase-MiniLM-L3-v2"
 
     def _get_model():
-        if _state["model_pipeline"] is None:
-            _state["model_pipeline"] = pipeline(
+        if model_name not in _cache:
+            _cache[model_name] = pipeline(
                 task="feature-extraction",
                 model=model_name,
                 device=-1,
             )
-        return _state["model_pipeline"]
+        return _cache[model_name]
 
     def _mean_pool(token_vectors):
-        if not token_vectors:
-            return []
-        seq_len = len(token_vectors)
-        dim = len(token_vectors[0])
-        sums = [0.0] * dim
-        for tv in token_vectors:
-            if len(tv) != dim:
-                continue
-            for i, value in enumerate(tv):
-                sums[i] += float(value)
-        return [s / seq_len for s in sums]
+        vectors = np.asarray(token_vectors, dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[0] == 0:
+            return np.zeros(0, dtype=np.float32)
+        return vectors.mean(axis=0)
 
     def _embed(text: str):
         extractor = _get_model()
@@ -52,21 +92,8 @@ def classify_log_line(log_line: str, db_path: str = ".emb", _state={"model_pipel
         else:
             token_vectors = output
         embedding = _mean_pool(token_vectors)
-        norm = math.sqrt(sum(v * v for v in embedding)) or 1.0
-        return [v / norm for v in embedding]
-
-    def _cosine(a, b):
-        if not a or not b or len(a) != len(b):
-            return -1.0
-        dot = 0.0
-        na = 0.0
-        nb = 0.0
-        for x, y in zip(a, b):
-            dot += x * y
-            na += x * x
-            nb += y * y
-        denom = math.sqrt(na) * math.sqrt(nb) or 1.0
-        return dot / denom
+        norm = float(np.linalg.norm(embedding)) or 1.0
+        return embedding / norm
 
     def _sample_logs():
         normals = [
@@ -95,7 +122,7 @@ def classify_log_line(log_line: str, db_path: str = ".emb", _state={"model_pipel
                 {
                     "text": text,
                     "label": label,
-                    "embedding": [round(v, 6) for v in embedding],
+                    "embedding": [round(float(v), 6) for v in embedding],
                 }
             )
         with open(path, "w", encoding="utf-8") as f:
@@ -119,22 +146,30 @@ def classify_log_line(log_line: str, db_path: str = ".emb", _state={"model_pipel
                     items.append(entry)
         return items
 
+    def _get_database(path: str):
+        """Embedding matrix and items of the database, loaded again only when the file changes"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            _ensure_database(path)
+            stat = os.stat(path)
+        path = os.path.abspath(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = _cache.get(path)
+        if cached is None or cached[0] != key:
+            cached = _cache[path] = (key, build_embedding_matrix(_load_database(path)))
+        return cached[1]
+
     def _get_nearby_label(text: str, path: str):
-        _ensure_database(path)
-        database = _load_database(path)
+        matrix, database = _get_database(path)
         if not database:
             return "unknown", -1.0, {}
         query_embedding = _embed(text)
-        best_label = "unknown"
-        best_similarity = -2.0
-        best_item = {}
-        for item in database:
-            similarity = _cosine(query_embedding, item.get("embedding", []))
-            if similarity > best_similarity:
-                best_label = item.get("label", "unknown")
-                best_similarity = similarity
-                best_item = item
-        return best_label, best_similarity, best_item
+        rows, similarities = nearest_rows(matrix, query_embedding)
+        if len(rows) == 0:
+            return "unknown", -1.0, {}
+        best_item = database[rows[0]]
+        return best_item.get("label", "unknown"), float(similarities[0]), best_item
 
     log_line = (log_line or "").strip()
     if not log_line:
@@ -146,5 +181,7 @@ def classify_log_line(log_line: str, db_path: str = ".emb", _state={"model_pipel
 
 
 __all__ = [
+    "build_embedding_matrix",
     "classify_log_line",
+    "nearest_rows",
 ]
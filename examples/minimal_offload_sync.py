@@ -88,7 +88,12 @@ WRONG_KEY_REQS = {
 
 try:
     # Instantiate a device Device Runtime
-    my_device_runtime = device_runtime.DeviceRuntime("./examples/cognit-template.yml")
+    # With the ADAPTIVE policy, cheap functions such as sum run on the device once
+    # their offloading is measured to be slower than running them locally
+    my_device_runtime = device_runtime.DeviceRuntime(
+        "./examples/cognit-template.yml",
+        execution_policy=device_runtime.ExecutionPolicy.ADAPTIVE
+    )
     my_device_runtime.init(REQS_INIT)
     # Offload and execute a function
     return_code, result = my_device_runtime.call(sum, 100, 10)
@@ -115,6 +120,8 @@ try:
     print("Status code: " + str(return_code))
     print("Predicted Y: " + str(result))
     print(f"Execution time: {(end_time-start_time):.6f} seconds")
+    # How each call was routed
+    print("Execution stats: " + str(my_device_runtime.get_execution_stats()))
     
     # # Test all reqs are OK:
     # reqs_list = [REQS_INIT, REQS_NEW, ERROR_REQS_NO_GEOLOCATION, WRONG_KEY_REQS, SIMPLE_REQS]
@@ -0,0 +1,13 @@
+"""Caches kept by the process that runs an offloaded function.
+
+A ProcessCache is a dict that is pickled empty: offloaded functions that read
+it as a global ship an empty cache, which then fills up in the serverless
+runtime process and is reused by its later calls.
+"""
+
+
+class ProcessCache(dict):
+    """Cache of the current process, pickled empty with the functions that use it"""
+
+    def __reduce__(self):
+        return (dict, ())
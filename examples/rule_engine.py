@@ -0,0 +1,87 @@
+"""Rules of the anomaly detection compiled into lookup tables.
+
+The rules (see rules.yml) list the known users with the hours they are allowed
+to log in at, and the allowed IP addresses or subnets. Compiled rules answer
+"is this user known", "is this hour allowed" and "is this IP allowed" in
+constant time, whatever the number of users and IPs, and are plain data so
+they can be passed to the offloaded functions and reused across calls.
+"""
+import ipaddress
+
+# Bit h set: hour h of the day is allowed
+ALL_HOURS = (1 << 24) - 1
+
+def hour_mask(start_hour, end_hour):
+    """Bitmask of the hours of the day in [start_hour, end_hour]."""
+    mask = 0
+    for hour in range(24):
+        if start_hour <= hour <= end_hour:
+            mask |= 1 << hour
+    return mask
+
+def is_compiled(rules):
+    return isinstance(rules, dict) and "user_hours" in rules
+
+def compile_rules(rules):
+    """Compile the rules into lookup tables. Compiled rules are returned as they are.
+
+    Args:
+        rules: Rules configuration, with the users and their time ranges and the allowed IPs
+
+    Returns:
+        Dictionary with:
+        user_hours: Bitmask of the allowed hours by user. A login outside any of
+        the time ranges of the user is not allowed, as are the ranges of a user
+        listed several times.
+        ip_set: Allowed addresses, matched as strings
+        networks: Allowed subnets by IP version, as a list of (shift, set of
+        network prefixes) with one entry per prefix length
+    """
+    if is_compiled(rules):
+        return rules
+    rules = rules or {}
+    user_hours = {}
+    for user_rule in rules.get('users') or []:
+        mask = ALL_HOURS
+        for time_range in user_rule.get('time_ranges') or []:
+            mask &= hour_mask(time_range.get('start_hour', 0), time_range.get('end_hour', 24))
+        user = user_rule.get('user')
+        user_hours[user] = user_hours.get(user, ALL_HOURS) & mask
+
+    ip_set = set()
+    prefixes = {}
+    for entry in rules.get('ips') or []:
+        entry = str(entry)
+        if "/" not in entry:
+            ip_set.add(entry)
+            continue
+        try:
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            # Kept as a plain string, as it was matched before subnets were supported
+            ip_set.add(entry)
+            continue
+        shift = network.max_prefixlen - network.prefixlen
+        prefixes.setdefault(network.version, {}).setdefault(shift, set()).add(int(network.network_address) >> shift)
+    networks = {
+        version: sorted((shift, frozenset(values)) for shift, values in by_shift.items())
+        for version, by_shift in prefixes.items()
+    }
+    return {"user_hours": user_hours, "ip_set": frozenset(ip_set), "networks": networks}
+
+def is_allowed_ip(compiled_rules, ip_address):
+    """Check if an IP address is allowed by the compiled rules, directly or by one of the subnets."""
+    if ip_address in compiled_rules["ip_set"]:
+        return True
+    networks = compiled_rules["networks"]
+    if not networks:
+        return False
+    try:
+        address = ipaddress.ip_address(ip_address)
+    except ValueError:
+        return False
+    value = int(address)
+    for shift, values in networks.get(address.version, ()):
+        if value >> shift in values:
+            return True
+    return False
@@ -0,0 +1,224 @@
+"""Streaming detection of authentication failure bursts in auth logs.
+
+The decision tree and the IsolationForest analyze every batch of new lines on
+its own, so a burst of failures split across batches goes unnoticed. The
+StreamingDetector keeps sliding-window counters of the failures by user and by
+IP across batches, and a moving average of the failure rate. It keeps state
+between calls, so it runs on the device next to the offloaded analyses.
+
+Usage:
+    detector = StreamingDetector()
+    result = detector.process(new_lines)
+    # result["events"] has the same format as the events of log_analyzer
+"""
+import datetime
+import math
+from collections import OrderedDict
+
+from decisionTree import (
+    KIND_AUTH_FAILURE,
+    KIND_FAILED_PASSWORD,
+    KIND_INVALID_USER,
+    KIND_NOT_IN_SUDOERS,
+    KIND_REPEATED_FAILURES,
+    tokenize_auth_log,
+)
+
+# Message classes counted as authentication failures
+FAILURE_KINDS = frozenset([
+    KIND_INVALID_USER,
+    KIND_REPEATED_FAILURES,
+    KIND_NOT_IN_SUDOERS,
+    KIND_FAILED_PASSWORD,
+    KIND_AUTH_FAILURE,
+])
+
+
+class SlidingWindowCounter:
+    """
+    Number of occurrences in the last window, counted in a ring of time buckets
+    """
+
+    __slots__ = ("bucket_ids", "counts", "newest")
+
+    def __init__(self, buckets: int):
+        self.bucket_ids = [-1] * buckets
+        self.counts = [0] * buckets
+        self.newest = -1
+
+    def add(self, bucket: int) -> bool:
+        """Counts an occurrence in the bucket. Returns False if the bucket already left the window."""
+        if bucket <= self.newest - len(self.counts):
+            return False
+        self.newest = max(self.newest, bucket)
+        slot = bucket % len(self.counts)
+        if self.bucket_ids[slot] > bucket:
+            return False
+        if self.bucket_ids[slot] < bucket:
+            self.bucket_ids[slot] = bucket
+            self.counts[slot] = 0
+        self.counts[slot] += 1
+        return True
+
+    def total(self, bucket: int) -> int:
+        """Occurrences in the window that ends with the bucket"""
+        oldest = bucket - len(self.counts)
+        return sum(count for bucket_id, count in zip(self.bucket_ids, self.counts) if oldest < bucket_id <= bucket)
+
+
+class StreamingDetector:
+    """
+    Detects bursts of authentication failures by user and by IP, and spikes of
+    the overall failure rate, over a sliding window spanning the batches
+    """
+
+    def __init__(
+        self,
+        window: float = 300.0,
+        buckets: int = 6,
+        user_threshold: int = 5,
+        ip_threshold: int = 10,
+        max_keys: int = 10000,
+        rate_sigmas: float = 4.0,
+        rate_min_failures: int = 20,
+        rate_smoothing: float = 0.1
+    ):
+        """
+        Args:
+            window (float): Length of the sliding window in seconds
+            buckets (int): Number of time buckets of the window
+            user_threshold (int): Failures of a user in the window that trigger an event
+            ip_threshold (int): Failures from an IP in the window that trigger an event
+            max_keys (int): Users and IPs tracked at most, the least recently seen are evicted
+            rate_sigmas (float): Standard deviations above the average failures per bucket
+            that make a rate anomaly
+            rate_min_failures (int): Failures in a bucket below which there is no rate anomaly
+            rate_smoothing (float): Weight of the last bucket in the moving average of the rate
+        """
+        self.bucket_width = window / buckets
+        self.buckets = buckets
+        self.thresholds = {"user": user_threshold, "ip": ip_threshold}
+        self.max_keys = max_keys
+        self.rate_sigmas = rate_sigmas
+        self.rate_min_failures = rate_min_failures
+        self.rate_smoothing = rate_smoothing
+        # {(kind, value): SlidingWindowCounter}, in order of last use
+        self.counters = OrderedDict()
+        # Bucket of the last event by key, no new event is emitted for a key during a window
+        self.last_events = OrderedDict()
+        # Failures of the current bucket and moving average and variance of the previous ones
+        self.rate_bucket = None
+        self.rate_count = 0
+        self.rate_mean = 0.0
+        self.rate_var = 0.0
+        self.rate_buckets_seen = 0
+        self.rate_alerted_bucket = None
+
+    def process(self, lines: list) -> dict:
+        """
+        Updates the counters with new log lines
+
+        Args:
+            lines (list): New lines of the log
+
+        Returns:
+            Dictionary with a message, the rate anomalies and the events of the
+            bursts of failures
+        """
+        columns = tokenize_auth_log(lines)
+        events, anomalies = [], []
+        failures = 0
+        for i, (kind, unix_time) in enumerate(zip(columns["kind"].tolist(), columns["unix_time"].tolist())):
+            if kind not in FAILURE_KINDS:
+                continue
+            failures += 1
+            bucket = int(unix_time // self.bucket_width)
+            user = columns["user"][i]
+            ip = columns["ip"][i]
+            anomaly = self._update_rate(bucket, unix_time)
+            if anomaly is not None:
+                anomaly["log_entry"] = columns["message"][i]
+                anomalies.append(anomaly)
+            for key_kind, value in (("user", user), ("ip", ip)):
+                if value == "UNKNOWN":
+                    continue
+                total = self._count((key_kind, value), bucket)
+                if total >= self.thresholds[key_kind] and self._should_emit((key_kind, value), bucket):
+                    # The failures of the window come from several lines, only the
+                    # key of the burst identifies them all
+                    events.append({
+                        "user": value if key_kind == "user" else None,
+                        "severity": 3,
+                        "ip": value if key_kind == "ip" else None,
+                        "timestamp": datetime.datetime.fromtimestamp(unix_time).isoformat(),
+                        "reason": f"{total} authentication failures of the {key_kind} {value} "
+                                  f"in {self.bucket_width * self.buckets:g}s",
+                    })
+        if events or anomalies:
+            message = f"Detected {len(events)} failure bursts and {len(anomalies)} rate anomalies"
+        else:
+            message = f"No failure bursts found in {failures} authentication failures"
+        return {"message": message, "anomalies": anomalies, "events": events}
+
+    def _count(self, key: tuple, bucket: int) -> int:
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = SlidingWindowCounter(self.buckets)
+            if len(self.counters) > self.max_keys:
+                evicted, _ = self.counters.popitem(last=False)
+                self.last_events.pop(evicted, None)
+        else:
+            self.counters.move_to_end(key)
+        if not counter.add(bucket):
+            # Late line older than the window
+            return 0
+        return counter.total(bucket)
+
+    def _should_emit(self, key: tuple, bucket: int) -> bool:
+        last = self.last_events.get(key)
+        if last is not None and bucket - last < self.buckets:
+            return False
+        self.last_events[key] = bucket
+        self.last_events.move_to_end(key)
+        if len(self.last_events) > self.max_keys:
+            self.last_events.popitem(last=False)
+        return True
+
+    def _update_rate(self, bucket: int, unix_time: float):
+        """Counts a failure in the overall rate, returns an anomaly if the bucket is a spike"""
+        if self.rate_bucket is None:
+            self.rate_bucket = bucket
+        elif bucket > self.rate_bucket:
+            # Closed buckets, the empty ones in between count as no failures
+            self._fold_rate(self.rate_count)
+            for _ in range(min(bucket - self.rate_bucket - 1, self.buckets)):
+                self._fold_rate(0)
+            self.rate_bucket = bucket
+            self.rate_count = 0
+        elif bucket < self.rate_bucket:
+            # Late line, only counted by the sliding windows
+            return None
+        self.rate_count += 1
+        if self.rate_buckets_seen < self.buckets or self.rate_alerted_bucket == bucket \
+                or self.rate_count < self.rate_min_failures:
+            return None
+        limit = self.rate_mean + self.rate_sigmas * math.sqrt(self.rate_var)
+        if self.rate_count <= limit:
+            return None
+        self.rate_alerted_bucket = bucket
+        return {
+            "timestamp": datetime.datetime.fromtimestamp(unix_time).isoformat(),
+            "failures": self.rate_count,
+            "expected": round(self.rate_mean, 2),
+            "reason": "Authentication failure rate anomaly",
+        }
+
+    def _fold_rate(self, count: int):
+        """Updates the moving average and variance of the failures per bucket with a closed bucket"""
+        self.rate_buckets_seen += 1
+        if self.rate_buckets_seen == 1:
+            self.rate_mean = float(count)
+            return
+        delta = count - self.rate_mean
+        self.rate_mean += self.rate_smoothing * delta
+        self.rate_var = (1 - self.rate_smoothing) * (self.rate_var + self.rate_smoothing * delta * delta)
@@ -0,0 +1,205 @@
+"""Online mining of log templates with a fixed-depth parse tree (Drain).
+
+Auth log lines of the same event only differ in their PIDs, ports, IPs and
+user names. The TemplateMiner maps every line to the template of its event,
+e.g. "sshd[<*>]: Failed password for <*> from <*> port <*> ssh2", and to the
+parameters that fill it, so that the analyses can work per template instead
+of per raw line. Templates are learnt incrementally and their number is
+bounded: the least recently matched ones are evicted.
+
+Usage:
+    miner = TemplateMiner()
+    cluster, parameters = miner.add_line(line)
+    print(cluster.cluster_id, cluster.template, parameters)
+
+The masking of the variable tokens (mask_tokens) is stateless, log_analyzer
+uses it for the message features of the IsolationForest.
+"""
+import re
+from collections import OrderedDict
+
+PARAM = "<*>"
+# Timestamp and host of a syslog line, not part of the message
+HEADER = re.compile(r"^\w+ +\d+ \d+:\d+:\d+ \S+ ")
+# Tokens that are parameters whatever the template: IPs, numbers and hexadecimal values
+VARIABLE_TOKEN = re.compile(r"^(?:\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?|\d+|0x[0-9a-fA-F]+)$")
+# Process ids inside a token, e.g. sshd[1234]:
+PID = re.compile(r"\[\d+\]")
+DIGIT = re.compile(r"\d")
+
+
+def mask_tokens(line: str) -> tuple:
+    """
+    Tokens of the message of a line, raw and with the variable parts masked
+    """
+    tokens = HEADER.sub("", line.strip(), count=1).split()
+    masked = []
+    for token in tokens:
+        if VARIABLE_TOKEN.match(token):
+            masked.append(PARAM)
+        else:
+            masked.append(PID.sub(f"[{PARAM}]", token))
+    return tokens, masked
+
+
+def template_parameters(tokens: list, template_tokens: list) -> list:
+    """
+    Raw values of the <*> of a template, in order, including the ones inside
+    a token such as sshd[<*>]:
+    """
+    parameters = []
+    for token, template_token in zip(tokens, template_tokens):
+        if template_token == PARAM:
+            parameters.append(token)
+        elif PARAM in template_token:
+            pattern = "(.*?)".join(re.escape(part) for part in template_token.split(PARAM))
+            match = re.fullmatch(pattern, token)
+            if match is not None:
+                parameters.extend(match.groups())
+    return parameters
+
+
+class LogCluster:
+    """
+    Lines of the same template
+    """
+
+    __slots__ = ("cluster_id", "template_tokens", "size")
+
+    def __init__(self, cluster_id: int, template_tokens: list):
+        self.cluster_id = cluster_id
+        self.template_tokens = template_tokens
+        self.size = 1
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.template_tokens)
+
+    def __repr__(self):
+        return f"LogCluster({self.cluster_id}, {self.template!r}, size={self.size})"
+
+
+class TemplateMiner:
+    """
+    Drain parse tree: lines are routed by their number of tokens and their
+    first tokens to a leaf, where they join the most similar template or
+    start a new one
+    """
+
+    def __init__(
+        self,
+        depth: int = 4,
+        similarity_threshold: float = 0.4,
+        max_children: int = 100,
+        max_clusters: int = 1000
+    ):
+        """
+        Args:
+            depth (int): Depth of the tree, the first depth - 2 tokens route the lines. Lines
+            with different routing tokens never share a template (e.g. Failed and Accepted
+            password), at the cost of one template per user for the sudo lines.
+            similarity_threshold (float): Share of equal tokens needed to join a template
+            max_children (int): Children of a node at most, other tokens go to the <*> child
+            max_clusters (int): Templates kept at most, the least recently matched are evicted
+        """
+        if depth < 3:
+            raise ValueError("The depth of the tree must be at least 3")
+        self.depth = depth
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        # {number of tokens: nested {token: ...} dicts, with lists of clusters as leaves}
+        self.root = {}
+        # {cluster id: (cluster, leaf)}, in order of last match
+        self.clusters = OrderedDict()
+        self.next_id = 1
+
+    def tokenize(self, line: str) -> tuple:
+        """
+        Tokens of the message of a line, raw and with the variable parts masked
+        """
+        return mask_tokens(line)
+
+    def add_line(self, line: str) -> tuple:
+        """
+        Matches a line to a template, learning or generalizing it if needed
+
+        Args:
+            line (str): Log line
+
+        Returns:
+            Tuple (LogCluster, list of parameters), the parameters are the raw
+            values of the line in the <*> positions of the template, so the
+            message is the template with its <*> replaced by them in order
+        """
+        tokens, masked = self.tokenize(line)
+        leaf = self._leaf(masked)
+        cluster = self._best_cluster(leaf, masked)
+        if cluster is None:
+            cluster = LogCluster(self.next_id, masked)
+            self.next_id += 1
+            leaf.append(cluster)
+            self.clusters[cluster.cluster_id] = (cluster, leaf)
+            if len(self.clusters) > self.max_clusters:
+                evicted, evicted_leaf = self.clusters.popitem(last=False)[1]
+                evicted_leaf.remove(evicted)
+        else:
+            cluster.size += 1
+            cluster.template_tokens = [
+                template_token if template_token == token else PARAM
+                for template_token, token in zip(cluster.template_tokens, masked)
+            ]
+            self.clusters.move_to_end(cluster.cluster_id)
+        return cluster, template_parameters(tokens, cluster.template_tokens)
+
+    def match(self, line: str):
+        """
+        Template of a line without learning, None if the line matches none
+        """
+        _, masked = self.tokenize(line)
+        node = self.root.get(len(masked))
+        for token in masked[:self.depth - 2]:
+            if node is None:
+                return None
+            node = node.get(token, node.get(PARAM))
+        if node is None:
+            return None
+        return self._best_cluster(node, masked)
+
+    def get_cluster(self, cluster_id: int):
+        entry = self.clusters.get(cluster_id)
+        return entry[0] if entry is not None else None
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def _leaf(self, masked: list) -> list:
+        """Leaf of the tree for the tokens, created if needed"""
+        prefix = masked[:self.depth - 2]
+        node = self.root.setdefault(len(masked), {} if prefix else [])
+        for i, token in enumerate(prefix):
+            last = i == len(prefix) - 1
+            if token not in node:
+                # Tokens with digits are likely parameters, they do not get their own branch
+                if PARAM in token or DIGIT.search(token) or len(node) >= self.max_children - (PARAM not in node):
+                    token = PARAM
+            if token not in node:
+                node[token] = [] if last else {}
+            node = node[token]
+        return node
+
+    def _best_cluster(self, leaf: list, masked: list):
+        best, best_similarity, best_params = None, -1.0, -1
+        for cluster in leaf:
+            equal = params = 0
+            for template_token, token in zip(cluster.template_tokens, masked):
+                if template_token == PARAM:
+                    params += 1
+                elif template_token == token:
+                    equal += 1
+            similarity = equal / len(masked) if masked else 1.0
+            if similarity > best_similarity or (similarity == best_similarity and params > best_params):
+                best, best_similarity, best_params = cluster, similarity, params
+        if best is not None and best_similarity >= self.similarity_threshold:
+            return best
+        return None
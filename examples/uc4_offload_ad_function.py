@@ -4,6 +4,7 @@ sys.path.append(".")
 
 import time
 import json
+from collections import Counter
 from pathlib import Path
 import yaml
 from watchdog.observers import Observer
@@ -15,12 +16,16 @@ from cognit.modules.dashboard_client import DashboardClient
 
 from decisionTree import get_authentication_failures
 from log_embedding_function import classify_log_line
+from rule_engine import compile_rules
+from streaming_detector import StreamingDetector
+from template_miner import TemplateMiner
 
 LOG_FILE_PATH = "/cognit/examples/auth.log"
 DEVICE_RUNTIME_CONFIG_PATH = "/cognit/examples/cognit-template.yml"
 REQUIREMENTS_FILE_PATH = "/cognit/examples/faas_requirements.yml"
 RULES_FILE_PATH = "/cognit/examples/rules.yml"
 QUEUE_FILE_PATH = "/cognit/queue/queue.json"
+OUTBOX_FILE_PATH = "/cognit/queue/outbox.jsonl"
 DASHBOARD_CONFIG_PATH = "/cognit/examples/config-dashboard.yml"
 
 def load_requirements(requirements_path: str) -> dict:
@@ -75,7 +80,14 @@ class LogHandler(FileSystemEventHandler):
         self.log_path = f"{Path(log_path)}"
         self.device_runtime = dr
         self.last_position = Path(log_path).stat().st_size if Path(log_path).exists() else 0
-        self.rules = rules
+        # Compiled once, instead of scanning the rules for every log line of every call
+        self.rules = compile_rules(rules)
+        # Keeps counters across batches, so it runs on the device
+        self.streaming_detector = StreamingDetector()
+        # Counts the new lines by template across batches, to report unseen kinds of
+        # messages. Embedding results are not reused per template: the labels depend
+        # on the masked parameters.
+        self.template_miner = TemplateMiner()
         self.requirements = None
         self.queue_path = queue_path
 
@@ -112,7 +124,7 @@ class LogHandler(FileSystemEventHandler):
         for event in events:
             # Create a unique key to identify this event
             user = event.get('user')
-            ip = event.get('ip', 'global')
+            ip = event.get('ip') or 'global'
                 
             # Add the event to the queue
             try:
@@ -130,6 +142,92 @@ class LogHandler(FileSystemEventHandler):
         
         return events_count
 
+    def handle_dt_result(self, result):
+        """Handle the result of the decision tree analysis.
+
+        Args:
+            result: Result of get_authentication_failures
+        """
+        print(f"[DT] Processed new log entries. Results: {str(result)}", flush=True)
+
+        # Send results to dashboard
+        if isinstance(result, dict):
+            dashboard = DashboardClient()
+            message = result.get('message', 'Anomalies processed')
+            anomalies = result.get('anomalies', [])
+            if anomalies:
+                dashboard.push_anomaly_result(message, anomalies)
+
+        # Process events and add them to the queue
+        count = self.process_events(result if isinstance(result, dict) else {})
+
+        if count > 0:
+            print(f"[DT] Added {count} events to the queue")
+        elif isinstance(result, dict) and 'message' in result:
+            print(f"[DT] Analysis result: {result['message']}")
+
+    def handle_stream_result(self, result):
+        """Handle the result of the streaming detector.
+
+        Args:
+            result: Result of StreamingDetector.process
+        """
+        count = self.process_events(result)
+
+        if count > 0:
+            print(f"[SD] Added {count} events to the queue")
+        if result.get('anomalies'):
+            print(f"[SD] {result['message']}: {result['anomalies']}", flush=True)
+
+    def handle_templates(self, new_lines):
+        """Count the new lines by template and report the templates seen for the first time.
+
+        Args:
+            new_lines: New lines of the log
+
+        Returns:
+            Number of lines by template id
+        """
+        first_new_id = self.template_miner.next_id
+        counts = Counter(self.template_miner.add_line(line)[0].cluster_id for line in new_lines)
+        for cluster_id, count in counts.items():
+            if cluster_id >= first_new_id:
+                cluster = self.template_miner.get_cluster(cluster_id)
+                template = cluster.template if cluster is not None else "evicted"
+                print(f"[TM] New log template {cluster_id} ({count} lines): {template}", flush=True)
+        print(f"[TM] {len(new_lines)} log entries of {len(counts)} templates", flush=True)
+        return counts
+
+    def handle_em_result(self, result):
+        """Handle the result of the embedding analysis.
+
+        Args:
+            result: Result of classify_log_line
+        """
+        print(f"[EM] Processed new log entry. Results: {str(result)}", flush=True)
+
+        if isinstance(result, dict) and 'message' in result:
+            print(f"[EM] Analysis result: {result['message']}")
+
+    def on_queued_result(self, function, entry_id, ret_code, result):
+        """Handle the result of an offload that was queued while disconnected.
+
+        Runs on a drainer thread of the device runtime, one result at a time.
+
+        Args:
+            function: Offloaded function
+            entry_id: Identifier of the outbox entry
+            ret_code: Execution return code
+            result: Result or error description
+        """
+        name = getattr(function, '__name__', '')
+        if ret_code != ExecReturnCode.SUCCESS:
+            print(f"Error processing queued entry {entry_id} of {name}: {str(result)}", flush=True)
+        elif name == get_authentication_failures.__name__:
+            self.handle_dt_result(result)
+        elif name == classify_log_line.__name__:
+            self.handle_em_result(result)
+
     def on_modified(self, event):
         """Handle file modification events."""
 
@@ -148,55 +246,41 @@ class LogHandler(FileSystemEventHandler):
                     new_lines = f.readlines()
 
                     if new_lines:
+                        # Bursts of failures spanning several batches
+                        self.handle_stream_result(self.streaming_detector.process(new_lines))
+                        # Kinds of messages never seen before
+                        self.handle_templates(new_lines)
+
                         # Decision Tree analysis
                         # Process new lines through the COGNIT runtime
-                        response = self.device_runtime.call(
+                        ret_code, result = self.device_runtime.call(
                             get_authentication_failures, new_lines, self.rules
                         )
-                        ret_code = response.ret_code
-                        result = response.res
-                        err = response.err
 
                         if ret_code == ExecReturnCode.SUCCESS:
                             self.last_position = f.tell()
-                            print(f"[DT] Processed new log entries. Results: {str(result)}", flush=True)
-                                
-                            # Send results to dashboard
-                            if isinstance(result, dict):
-                                dashboard = DashboardClient()
-                                message = result.get('message', 'Anomalies processed')
-                                anomalies = result.get('anomalies', [])
-                                if anomalies:
-                                    dashboard.push_anomaly_result(message, anomalies)
-                            
-                            # Process events and add them to the queue
-                            count = self.process_events(result if isinstance(result, dict) else {})
-                            
-                            if count > 0:
-                                print(f"[DT] Added {count} events to the queue")
-                            elif isinstance(result, dict) and 'message' in result:
-                                print(f"[DT] Analysis result: {result['message']}")
+                            self.handle_dt_result(result)
+                        elif ret_code == ExecReturnCode.QUEUED:
+                            # Stored in the outbox, the result is handled by on_queued_result
+                            self.last_position = f.tell()
+                            print(f"[DT] Runtime disconnected, log entries queued (entry {result})", flush=True)
                         else:
-                            print(f"[DT] Error processing log entries: {str(err)}", flush=True)
+                            print(f"[DT] Error processing log entries: {str(result)}", flush=True)
                         
                         
                         # Embedding analysis
                         for new_line in new_lines:
-                            response = self.device_runtime.call(
+                            ret_code, result = self.device_runtime.call(
                                 classify_log_line, new_line
                             )
-                            ret_code = response.ret_code
-                            result = response.res
-                            err = response.err
                             print(f"[EM] Log entry sent to embedding function")
 
                             if ret_code == ExecReturnCode.SUCCESS:
-                                print(f"[EM] Processed new log entry. Results: {str(result)}", flush=True)
-
-                                if isinstance(result, dict) and 'message' in result:
-                                    print(f"[EM] Analysis result: {result['message']}")
+                                self.handle_em_result(result)
+                            elif ret_code == ExecReturnCode.QUEUED:
+                                print(f"[EM] Runtime disconnected, log entry queued (entry {result})", flush=True)
                             else:
-                                print(f"[EM] Error processing log entries: {str(err)}", flush=True)
+                                print(f"[EM] Error processing log entries: {str(result)}", flush=True)
             
             except FileNotFoundError:
                 print(f"Log file {self.log_path} not found, waiting for it to be created")
@@ -249,13 +333,18 @@ def main():
             print(f"Warning: Could not initialize Dashboard Client: {e}")
             print("Continuing without dashboard integration...")
 
-        # Initialize the device runtime
-        dr = device_runtime.DeviceRuntime(DEVICE_RUNTIME_CONFIG_PATH)
+        # Initialize the device runtime. Offloads are kept in the outbox
+        # while the runtime is disconnected
+        dr = device_runtime.DeviceRuntime(
+            DEVICE_RUNTIME_CONFIG_PATH,
+            outbox=device_runtime.Outbox(OUTBOX_FILE_PATH)
+        )
         dr.init(requirements)
 
         # Set up the log file observer
         log_observer = Observer()
         log_handler = LogHandler(LOG_FILE_PATH, dr, rules, QUEUE_FILE_PATH)
+        dr.on_queued_result = log_handler.on_queued_result
         log_observer.schedule(
             log_handler, path=str(Path(LOG_FILE_PATH)), recursive=False
         )